@@ -1,315 +1,170 @@
-import requests
-from bs4 import BeautifulSoup
-import re
 import sys
-import sqlite3
 import os
-from datetime import datetime
 import time
-import subprocess
-import shutil
 import traceback
-import subprocess
 import ast
 import importlib
-from config import BLOCK_HEIGHT, THRESHOLD, BASE_URL, SHOW_RESULT, SCAN_INTERVAL, DB_FILE, SCAN_TRUE
+import json
+import queue
+import threading
+from config import BLOCK_HEIGHT, THRESHOLD, BASE_URL, SHOW_RESULT, DB_FILE, SCAN_TRUE, SCAN_WORKERS, \
+    PARSE_WORKERS, PIPELINE_QUEUE_SIZE, FOLLOW_POLL_INTERVAL, REORG_MAX_DEPTH
+import metrics
+from http_client import FetchError, backoff_delay
+from data_source import RpcError, collect_tx_outputs, get_source
+from export_dashboard_data import export_dashboard_data
+from page_cache import CacheMiss
+from balance_refresh import mark_dirty, refresh_pending, store_balance
+from balance_cache import get_balance_cache
+from batch_lookup import ADDRESS, BLOCK, TX, classify_query, run_batch
+from scash_db import address_ids, get_writer, init_schema, load_scan_state, rebuild_transfers, save_scan_state, to_sat, \
+    txid_blob, write_block_summary
 
 
 def init_db():
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        # 區塊表：block_height 主鍵，txids 為 JSON 字串
-        c.execute('''CREATE TABLE IF NOT EXISTS block (
-            block_height INTEGER PRIMARY KEY,
-            txids TEXT
-        )''')
-        # 交易表：每一筆 address/amount/transfer_time 都是一列
-        c.execute('''CREATE TABLE IF NOT EXISTS tx (
-            txid TEXT,
-            block_height INTEGER,
-            address TEXT,
-            amount REAL,
-            transfer_time TEXT,
-            PRIMARY KEY (txid, address),
-            FOREIGN KEY (block_height) REFERENCES block(block_height)
-        )''')
-        # 地址餘額表
-        c.execute('''CREATE TABLE IF NOT EXISTS scash_address_balances (
-            address TEXT PRIMARY KEY,
-            balance REAL,
-            scan_time TEXT,
-            update_time TEXT,
-            update_count INTEGER,
-            change_str TEXT
-        )''')
-        conn.commit()
-
-
-def fetch_html(url, retries=10, retry_interval=3):
-    for attempt in range(1, retries + 1):
-        try:
-            resp = requests.get(url, timeout=10)
-            resp.raise_for_status()
-            resp.encoding = 'utf-8'
-            return BeautifulSoup(resp.text, 'html.parser')
-        except requests.RequestException as e:
-            print(f"HTTP 請求失敗: {e} (第 {attempt} 次)")
-            if attempt < retries:
-                time.sleep(retry_interval)
-            else:
-                sys.exit(1)
+    init_schema(get_writer().conn)
+
+
+def load_resume_height(name='main'):
+    """回傳掃描範圍 name 已連續提交的最高區塊，沒有紀錄時回傳 None。"""
+    writer = get_writer()
+    with writer.lock:
+        state = load_scan_state(writer.conn, name)
+    return state[2] if state else None
 
 
-def get_timestamp(soup):
-    time_div = soup.find("div", class_="fw-bold", string="Time")
-    if not time_div:
+def fetch_block(block_height):
+    """透過目前的資料來源取得並解析單一區塊。"""
+    source = get_source()
+    with metrics.timer('stage_seconds', stage='fetch'):
+        raw = source.fetch_blocks([block_height])[0]
+    if isinstance(raw, Exception):
+        raise raw
+    return source.parse_block(block_height, raw)
+
+
+def get_timestamp(page):
+    if page.time_str is None:
         print("找不到時間區塊")
-        return None
-    parent_div = time_div.find_parent("div", class_="ms-2 me-auto")
-    if not parent_div:
-        print("找不到時間父區塊")
-        return None
-    text = parent_div.get_text(separator=" ", strip=True)
-    return text.replace("Time", "", 1).strip()
-
-
-def get_total_output_amount(soup):
-    elem = soup.find(string=re.compile("Total amount in all outputs"))
-    if not elem:
-        print("無法找到總輸出金額")
-        raise Exception("無法找到總輸出金額")
-    parent = elem.find_parent("li")
-    div = parent.find("div", class_="ms-2 me-auto") if parent else None
-    if not div:
-        print("無法找到金額區塊")
-        raise Exception("無法找到金額區塊")
-    match = re.search(r"([\d'\.]+)\s*SCASH",
-                      div.get_text(separator=" ", strip=True))
-    if not match:
-        print("無法解析 SCASH 數值")
-        raise Exception("無法解析 SCASH 數值")
-    return float(match.group(1).replace("'", ""))
-
-
-def find_txids_by_amount(soup, total_amount):
+    return page.time_str
+
+
+def get_total_output_amount(page):
+    if page.total_error:
+        print(page.total_error)
+        raise Exception(page.total_error)
+    return page.total_amount
+
+
+def find_txids_by_amount(page, total_amount):
     """
     優先找整數位相同的轉帳txid，再找所有大於閾值的轉帳txid，回傳所有txid(不重複，優先順序)。
     """
-    list_items = [
-        li for li in soup.find_all("li", class_="list-group-item")
-        if not (
-            (div := li.find("div", class_="text-truncate")) and
-            div.get_text(strip=True).startswith("1.")
-        )
+    # 排除第 1 筆（coinbase）與 50 SCASH 的挖礦獎勵，其餘依頁面順序保留
+    candidates = [
+        (amount, txid) for first, amount, txid in page.items
+        if not first and amount is not None and abs(amount - 50) >= 1e-6
+        and amount >= THRESHOLD and txid is not None
     ]
+    total_int = int(total_amount)
     txids = []
     seen = set()
-    # 1. 優先找整數位相同的轉帳
-    total_int = int(total_amount)
-    for li in list_items:
-        badge = li.find(
-            "span", class_=lambda x: x and "badge" in x and "bg-primary" in x)
-        if not badge:
-            continue
-        match = re.search(r"([\d\.]+)\s*SCASH", badge.get_text(strip=True))
-        if not match:
-            continue
-        amount = float(match.group(1))
-        if abs(amount - 50) < 1e-6:
-            continue
-        if int(amount) == total_int and amount >= THRESHOLD:
-            txid_a = li.find("a", href=re.compile(r"^/tx/"))
-            if txid_a:
-                txid = txid_a.get_text(strip=True)
-                if txid not in seen:
-                    txids.append(txid)
-                    seen.add(txid)
-    # 2. 其他大於閾值的轉帳
-    for li in list_items:
-        badge = li.find(
-            "span", class_=lambda x: x and "badge" in x and "bg-primary" in x)
-        if not badge:
-            continue
-        match = re.search(r"([\d\.]+)\s*SCASH", badge.get_text(strip=True))
-        if not match:
-            continue
-        amount = float(match.group(1))
-        if abs(amount - 50) < 1e-6:
-            continue
-        if amount >= THRESHOLD:
-            a_tag = li.find("a", href=re.compile(r"^/tx/"))
-            if a_tag:
-                txid = a_tag.get_text(strip=True)
-                if txid not in seen:
-                    txids.append(txid)
-                    seen.add(txid)
+    # 1. 優先找整數位相同的轉帳，2. 其他大於閾值的轉帳
+    for amount, txid in [c for c in candidates if int(c[0]) == total_int] + candidates:
+        if txid not in seen:
+            txids.append(txid)
+            seen.add(txid)
     if not txids:
         print(f"找不到任何大於閾值 {THRESHOLD} SCASH 的轉帳")
     return txids
 
 
-def get_tx_outputs(txid):
-    tx_url = f"{BASE_URL}/tx/{txid}"
-    tx_soup = fetch_html(tx_url)
-    outputs = []
-    total_outputs_li = tx_soup.find(
-        "div", class_="fw-bold", string=re.compile(r"Total outputs"))
-    if total_outputs_li:
-        parent_li = total_outputs_li.find_parent("li")
-        if parent_li:
-            amount_div = parent_li.find("div", class_="ms-2 me-auto")
-            if amount_div:
-                match = re.search(
-                    r"([\d'\.]+)\s*SCASH", amount_div.get_text(separator=" ", strip=True))
-                if match and float(match.group(1).replace("'", "")) >= THRESHOLD:
-                    for item in tx_soup.find_all("li", class_="list-group-item"):
-                        addr_a = item.find(
-                            "a", href=re.compile(r"^/\?&search=scash1"))
-                        if addr_a:
-                            address = re.search(
-                                r"search=(scash1[0-9a-zA-Z]+)", addr_a['href'])
-                            full_address = address.group(
-                                1) if address else addr_a.get_text(strip=True)
-                            amount_span = item.find(
-                                "span", class_="text-muted")
-                            if amount_span:
-                                amount_match = re.search(
-                                    r"([\d'\.]+)\s*SCASH", amount_span.get_text(strip=True))
-                                if amount_match:
-                                    amount = float(
-                                        amount_match.group(1).replace("'", ""))
-                                    outputs.append((full_address, amount))
+def get_tx_outputs(txid, block=None):
+    total_outputs, outputs = get_source().get_tx_outputs(txid, block)
+    if total_outputs is None or total_outputs < THRESHOLD:
+        return []
     return outputs
 
 
 def get_address_balance(address):
-    url = f"{BASE_URL}/?search={address}&utxolookup=1"
-    soup = fetch_html(url)
-    total_div = soup.find("div", class_="totalamount")
-    if not total_div:
-        print("找不到總餘額區塊")
-        return None
-    match = re.search(
-        r"Total unspent SCASH:\s*([\d\.]+)", total_div.get_text())
-    if not match:
-        print("無法解析總餘額")
-        return None
-    return float(match.group(1))
+    metrics.inc('addresses_total')
+    balance, error = get_source().get_address_balance(address)
+    if error:
+        print(error)
+    return balance
 
 
 def write_transfer_db(rows):
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        for row in rows:
-            c.execute('''INSERT INTO scash_transfer_records (block_height, txid, address, amount, transfer_time)
-                         VALUES (?, ?, ?, ?, ?)''', row)
-        conn.commit()
+    writer = get_writer()
+    writer.executemany('''INSERT INTO scash_transfer_records (block_height, txid, address, amount, transfer_time)
+                          VALUES (?, ?, ?, ?, ?)''', rows)
+    writer.maybe_commit()
 
 
 def write_address_balance_db(address, balance, conn=None):
     if balance < THRESHOLD:
         return
-    now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    close_conn = False
+    # conn 為 None 時寫入共用的 BatchWriter，由它決定何時提交
+    c = get_writer() if conn is None else conn
+    store_balance(c, address, balance, THRESHOLD)
     if conn is None:
-        conn = sqlite3.connect(DB_FILE)
-        close_conn = True
-    c = conn.cursor()
-    c.execute('SELECT balance, scan_time, update_time, update_count FROM scash_address_balances WHERE address=?', (address,))
-    row = c.fetchone()
-    if row:
-        last_balance, scan_time, update_time, update_count = row
-        diff = balance - last_balance if last_balance is not None else 0
-        if abs(diff) > 1e-8:
-            # diff > 0 顯示 +，diff < 0 顯示 -
-            if diff > 0:
-                change_str = f"+{diff:.8f}"
-            else:
-                change_str = f"{diff:.8f}"
-            update_time = now_str
-            update_count = (update_count or 0) + 1
-            c.execute('''UPDATE scash_address_balances SET balance=?, update_time=?, update_count=?, change_str=? WHERE address=?''',
-                      (balance, update_time, update_count, change_str, address))
-    else:
-        # 新增
-        c.execute('''INSERT INTO scash_address_balances (address, balance, scan_time, update_time, update_count, change_str)
-                     VALUES (?, ?, ?, ?, ?, ?)''',
-                  (address, balance, now_str, '', 0, ''))
-    if close_conn:
-        conn.commit()
-        conn.close()
+        c.maybe_commit()
 
 
-# 自動查詢所有已知地址餘額並自動更新
+# 更新新交易涉及的地址餘額，並補查一批久未查詢的地址
 def auto_update_all_address_balances():
-    print("\n自動查詢所有地址餘額...")
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        c.execute(
-            'SELECT address, balance, update_count FROM scash_address_balances')
-        rows = c.fetchall()
-        total = len(rows)
-        updated_count = 0
-        for idx, (address, old_balance, old_update_count) in enumerate(rows, 1):
-            new_balance = get_address_balance(address)
-            if new_balance is not None and abs(new_balance - old_balance) > 1e-8:
-                now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                diff = new_balance - old_balance
-                change_str = f"+{diff:.8f}" if diff > 0 else f"{diff:.8f}"
-                new_update_count = (old_update_count or 0) + 1
-                c.execute('''UPDATE scash_address_balances SET balance=?, update_time=?, update_count=?, change_str=? WHERE address=?''',
-                          (new_balance, now_str, new_update_count, change_str, address))
-                updated_count += 1
-            # 只顯示進度條
-            bar_len = 30
-            filled_len = int(bar_len * idx // total)
-            bar = '█' * filled_len + '-' * (bar_len - filled_len)
-            print(f"\r[{bar}] {idx}/{total} 已查詢...", end='')
-            sys.stdout.flush()
+    print("\n更新地址餘額...")
+
+    def progress(done, total):
+        bar_len = 30
+        filled_len = int(bar_len * done // total)
+        bar = '█' * filled_len + '-' * (bar_len - filled_len)
+        print(f"\r[{bar}] {done}/{total} 已查詢...", end='')
+        sys.stdout.flush()
+
+    checked, updated = refresh_pending(progress=progress)
+    if checked:
         print()  # 換行
-        conn.commit()
-        print(f"\n共更新 {updated_count} 個地址餘額。\n")
-    run_export_dashboard_data()
+    print(f"共查詢 {checked} 個、更新 {updated} 個地址餘額。\n")
+    if updated:
+        run_export_dashboard_data()
 
 
-def record_address_balance(address, address_balance_set, conn=None):
-    """查詢並記錄唯一地址餘額。"""
-    if address_balance_set is not None and address not in address_balance_set:
+def record_address_balance(address, balance_cache, conn=None):
+    """查詢並記錄地址餘額，ADDRESS_REFRESH_TTL 內查詢過的地址不重複查詢。"""
+    if balance_cache is not None and address not in balance_cache:
         balance = get_address_balance(address)
+        if balance is not None:
+            balance_cache.mark(address, conn or get_writer())
         if balance is not None and balance >= THRESHOLD:
-            address_balance_set.add(address)
             write_address_balance_db(address, balance, conn)
 
 
-def run_export_dashboard_data():
+def run_export_dashboard_data(force=False):
+    """在同一個行程內增量匯出 assets/dashboard_data.js，資料沒有變動時不寫檔。"""
+    # 先提交累積中的寫入，匯出才讀得到最新資料
+    get_writer().flush()
     while True:
         try:
-            subprocess.run(
-                [sys.executable, 'export_dashboard_data.py'], check=True)
-            # 移動 dashboard_data.js 到 assets 目錄
-            src = os.path.join(os.path.dirname(__file__), 'dashboard_data.js')
-            dst_dir = os.path.join(os.path.dirname(__file__), 'assets')
-            dst = os.path.join(dst_dir, 'dashboard_data.js')
-            if os.path.exists(src):
-                # 確保目標資料夾存在
-                os.makedirs(dst_dir, exist_ok=True)
-                shutil.move(src, dst)
-                print(f"dashboard_data.js 已移動到 {dst}")
+            if export_dashboard_data(force):
+                print("已匯出 assets/dashboard_data.js")
             break
         except Exception as e:
             print(
-                f"執行 export_dashboard_data.py 發生錯誤: {e}，3秒後重試... (Ctrl+C 可中止)")
+                f"匯出 dashboard_data.js 發生錯誤: {e}，3秒後重試... (Ctrl+C 可中止)")
         try:
             time.sleep(3)
         except KeyboardInterrupt:
-            print("已中止 export_dashboard_data.py 重試。")
+            print("已中止 dashboard_data.js 匯出重試。")
             break
 
 
 def auto_query_mode(start_height, end_height=None):
     height = start_height
-    address_balance_set = set()
+    balance_cache = get_balance_cache()
+    checkpoint = ('main', start_height, end_height)
     scanned_count = 0
+    failures = 0  # 目前區塊連續失敗的次數，決定退避秒數
     while True:
         try:
             # 若有設定結束高度，查到即結束；否則永遠不會自動結束，需手動 Ctrl+C 停止
@@ -321,7 +176,10 @@ def auto_query_mode(start_height, end_height=None):
             else:
                 print(f"查詢區塊高度: {height}", end='\r')
             try:
-                result = process_and_record_block(height, address_balance_set)
+                result = process_and_record_block(height, balance_cache, checkpoint)
+            except CacheMiss as e:
+                print(f"\n{e}，離線重播結束。")
+                break
             except Exception as e:
                 # 只顯示簡訊息，不顯示 traceback
                 print(f"查詢區塊 {height} 發生錯誤: {e}")
@@ -329,68 +187,475 @@ def auto_query_mode(start_height, end_height=None):
             if result:
                 height += 1
                 scanned_count += 1
+                failures = 0
                 if scanned_count % 10 == 0:
                     run_export_dashboard_data()
             else:
-                print("查詢失敗或查不到，10秒後重試本區塊...")
-                # 根據設定決定是否自動查詢所有地址餘額
+                failures += 1
+                # 根據設定決定是否利用等待時間更新地址餘額
                 if SCAN_TRUE:
-                    auto_update_all_address_balances()  # 更新一次地址餘額
-                for i in range(10, 0, -1):
-                    print(f"  等待 {i:02d} 秒後重試...", end='\r')
-                    time.sleep(1)
-                print("\n重新嘗試掃描本區塊...")
+                    auto_update_all_address_balances()
+                wait_before_retry(height, failures)
+                print("重新嘗試掃描本區塊...")
         except KeyboardInterrupt:
             print("\n偵測到中斷 (Ctrl+C)，將完成本區塊查詢與寫入後結束。")
             break
         except Exception as e:
             print(f"查詢區塊 {height} 發生未預期錯誤: {e}")
+            get_writer().flush()
             return False
+    get_writer().flush()
 
 
-def process_and_record_block(block_height, address_balance_set):
-    """查詢區塊、記錄轉帳與地址餘額，回傳True/False代表是否繼續。"""
-    import json
-    import traceback
-    try:
-        block_url = f"{BASE_URL}/?search={block_height}"
-        soup = fetch_html(block_url)
-        total_amount = get_total_output_amount(soup)
-        time_str = get_timestamp(soup)
-        if total_amount < THRESHOLD:
-            if SHOW_RESULT:
-                print(
-                    f"總轉帳金額 {total_amount} SCASH 未達閾值 {THRESHOLD} SCASH，跳過後續查詢。")
-            else:
-                print(f"區塊高度: {block_height}", end='\r')
-            return True
+def fetch_block_data(block_height, balance_cache=None):
+    """抓取並解析區塊、轉帳輸出與新地址餘額（不寫入資料庫），供逐塊與平行掃描共用。"""
+    return parse_block_data(fetch_block(block_height), balance_cache)
+
+
+def parse_block_data(page, balance_cache=None):
+    """
+    由已解析的區塊查詢其中轉帳的輸出與新地址餘額。
+    頁面解析的耗時記錄在 data_source 的 stage_seconds{stage="parse"}，交易頁與餘額查詢的網路時間由
+    http_request_seconds 記錄，這裡不另外計時。
+    """
+    block_height = page.height
+    total_amount = get_total_output_amount(page)
+    data = {
+        'block_height': block_height,
+        'block_hash': page.block_hash,
+        'time_str': get_timestamp(page),
+        'total_amount': total_amount,
+        'txids': [],
+        'outputs': {},
+        'balances': {},
+        'summary_outputs': [],
+    }
+    # 不論閾值，記錄區塊內每筆轉帳（coinbase 除外）的所有輸出到 block_output，
+    # 之後調整 THRESHOLD 只需 rebuild_transfer_tables，不必重新連網
+    for txid, tx_amount, tx_total, outputs in collect_tx_outputs(page):
+        for address, amount in outputs:
+            data['summary_outputs'].append((txid, tx_amount, address, amount))
+        if tx_total is not None and tx_total >= THRESHOLD:
+            data['outputs'][txid] = [(a, v) for a, v in outputs if v >= THRESHOLD]
+    if total_amount < THRESHOLD:
+        return data
+    data['txids'] = find_txids_by_amount(page, total_amount)
+    for txid in data['txids']:
+        outputs = data['outputs'].setdefault(txid, [])
+        for address, _ in outputs:
+            if balance_cache is None or address in balance_cache or address in data['balances']:
+                continue
+            data['balances'][address] = get_address_balance(address)
+    return data
+
+
+def record_block_data(data, balance_cache=None, checkpoint=None):
+    """
+    將 fetch_block_data 的結果寫入 block_summary、block、tx 與地址餘額表。
+    寫入期間持有 writer 鎖，批次提交只會發生在區塊之間，不會留下寫到一半的區塊。
+    checkpoint 為 (掃描名稱, 起始高度, 結束高度)，掃描進度與區塊資料在同一次提交中寫入。
+    """
+    with metrics.timer('stage_seconds', stage='write'):
+        _record_block_data(data, balance_cache, checkpoint)
+    metrics.inc('blocks_total')
+
+
+def _record_block_data(data, balance_cache, checkpoint):
+    block_height = data['block_height']
+    writer = get_writer()
+    with writer.lock:
+        # 整個區塊在同一個 SAVEPOINT 內寫入，任一步失敗都整塊回復；掃描進度最後寫入，不會超過已寫入的區塊
+        with writer.atomic():
+            refreshed = _write_block_rows(data, writer)
+            if checkpoint is not None:
+                save_scan_state(writer, *checkpoint, block_height)
+        if balance_cache is not None:
+            for address in refreshed:
+                balance_cache.mark(address, writer)
+        writer.maybe_commit()
+
+
+def _write_block_rows(data, writer):
+    """寫入一個區塊的摘要、block、tx 與新查詢的地址餘額，回傳已寫入餘額的地址。"""
+    block_height = data['block_height']
+    total_amount = data['total_amount']
+    write_block_summary(writer, data)
+    if total_amount < THRESHOLD:
         if SHOW_RESULT:
-            print(f"區塊高度: {block_height}")
+            print(
+                f"總轉帳金額 {total_amount} SCASH 未達閾值 {THRESHOLD} SCASH，跳過後續查詢。")
         else:
             print(f"區塊高度: {block_height}", end='\r')
-        txids = find_txids_by_amount(soup, total_amount)
-        if not txids:
-            if SHOW_RESULT:
-                print("未找到對應的 txid，無法查詢地址")
-            return True
-        # 寫入 block、tx、address_balance 都共用同一個 conn
-        with sqlite3.connect(DB_FILE) as conn:
-            c = conn.cursor()
-            c.execute('INSERT OR REPLACE INTO block (block_height, txids) VALUES (?, ?)',
-                      (block_height, json.dumps(txids)))
-            for txid in txids:
-                if SHOW_RESULT:
-                    print(f"轉帳 TxID: {txid}")
-                outputs = get_tx_outputs(txid)
-                for address, amount in outputs:
-                    if amount < THRESHOLD:
-                        continue
-                    record_address_balance(address, address_balance_set, conn)
-                    c.execute('''INSERT OR REPLACE INTO tx (txid, block_height, address, amount, transfer_time)
-                                 VALUES (?, ?, ?, ?, ?)''',
-                              (txid, block_height, address, amount, time_str))
-            conn.commit()
+        return []
+    if SHOW_RESULT:
+        print(f"區塊高度: {block_height}")
+    else:
+        print(f"區塊高度: {block_height}", end='\r')
+    if not data['txids']:
+        if SHOW_RESULT:
+            print("未找到對應的 txid，無法查詢地址")
+        return []
+    writer.execute('INSERT OR REPLACE INTO block (block_height, txids) VALUES (?, ?)',
+                   (block_height, json.dumps(data['txids'])))
+    tx_rows = []
+    refreshed = []
+    for txid in data['txids']:
+        if SHOW_RESULT:
+            print(f"轉帳 TxID: {txid}")
+        for address, amount in data['outputs'].get(txid, []):
+            balance = data['balances'].get(address)
+            if balance is not None:
+                write_address_balance_db(address, balance, writer)
+                refreshed.append(address)
+            tx_rows.append((txid, block_height, address, amount, data['time_str']))
+    ids = address_ids(writer, [row[2] for row in tx_rows])
+    writer.executemany('''INSERT OR REPLACE INTO tx (txid, block_height, address_id, amount, transfer_time)
+                          VALUES (?, ?, ?, ?, ?)''',
+                       [(txid_blob(txid), h, ids[address], to_sat(amount), t)
+                        for txid, h, address, amount, t in tx_rows])
+    # 本區塊沒有重新查詢餘額的地址，交由 balance_refresh 稍後更新
+    mark_dirty(writer, {row[2] for row in tx_rows if row[2] not in data['balances']}, block_height)
+    return refreshed
+
+
+def rebuild_transfer_tables(threshold=None):
+    """依 block_summary/block_output 以新的閾值重建 block 與 tx 表，完全不連網。"""
+    threshold = THRESHOLD if threshold is None else threshold
+    writer = get_writer()
+    with writer.lock:
+        writer.flush()
+        blocks = rebuild_transfers(writer.conn, threshold)
+        writer.flush()
+        tx_count = writer.query('SELECT COUNT(*) FROM tx')[0][0]
+    print(f"已依閾值 {threshold} SCASH 重建 {blocks} 個區塊、共 {tx_count} 筆轉帳紀錄。")
+
+
+def rollback_blocks(from_height, checkpoint=None):
+    """
+    分叉回滾：刪除 from_height 以上的 block、tx 與區塊摘要，涉及的地址標記為待更新餘額，
+    並將掃描進度退回 from_height - 1。
+    """
+    writer = get_writer()
+    with writer.lock:
+        addresses = [row[0] for row in writer.query(
+            '''SELECT DISTINCT a.address FROM tx JOIN address a ON a.id = tx.address_id
+               WHERE tx.block_height >= ?''', (from_height,))]
+        heights = [row[0] for row in writer.query(
+            'SELECT block_height FROM block_summary WHERE block_height >= ?', (from_height,))]
+        for table in ('tx', 'block', 'block_summary', 'block_output', 'block_hash'):
+            writer.execute(f'DELETE FROM {table} WHERE block_height >= ?', (from_height,))
+        mark_dirty(writer, addresses, from_height)
+        if checkpoint is not None:
+            save_scan_state(writer, checkpoint[0], checkpoint[1], checkpoint[2], from_height - 1)
+        writer.flush()
+    get_source().invalidate_blocks(heights)
+    print(f"\n偵測到分叉，已回滾區塊 {from_height} 以上共 {len(heights)} 個區塊的資料。")
+
+
+def find_fork_height(block):
+    """
+    檢查 block 是否接在資料庫中前一個區塊之後；若不是，往回找出仍相同的最高區塊，
+    回傳需要回滾的起始高度，沒有分叉時回傳 None。
+    """
+    source = get_source()
+    writer = get_writer()
+
+    def stored_hash(height):
+        rows = writer.query('SELECT hash FROM block_hash WHERE block_height=?', (height,))
+        return rows[0][0] if rows else None
+
+    prev_height = block.height - 1
+    stored = stored_hash(prev_height)
+    if stored is None:
+        return None
+    # RPC 區塊帶有 previousblockhash；網頁來源需要重新查詢前一塊的雜湊（每個新區塊一次）
+    remote = block.prev_hash or source.get_block_hash(prev_height)
+    if remote is None or remote == stored:
+        return None
+    height = prev_height - 1
+    while height > block.height - 1 - REORG_MAX_DEPTH:
+        stored = stored_hash(height)
+        if stored is None or source.get_block_hash(height) == stored:
+            break
+        height -= 1
+    return height + 1
+
+
+def wait_for_block(block_height, interval=None):
+    """輪詢直到 block_height 出塊並回傳 BlockInfo；每次只做一次輕量查詢，Ctrl+C 可中止。"""
+    interval = interval or FOLLOW_POLL_INTERVAL
+    source = get_source()
+    while True:
+        try:
+            block = source.poll_block(block_height)
+        except CacheMiss:
+            raise
+        except (FetchError, RpcError) as e:
+            print(f"\n輪詢區塊 {block_height} 失敗: {e}")
+            block = None
+        if block is not None:
+            return block
+        time.sleep(interval)
+
+
+def wait_before_retry(block_height, failures):
+    """
+    區塊查詢失敗後的等待：尚未出塊時輕量輪詢到出塊為止；區塊已存在（網路或解析錯誤）時
+    依連續失敗次數 failures 以 backoff_delay 退避。請求本身的節奏由 rate_limiter 控制。
+    """
+    started = time.monotonic()
+    print(f"查詢失敗或查不到，等待區塊 {block_height} 出塊後重試...")
+    try:
+        wait_for_block(block_height)
+    except CacheMiss:
+        return  # 離線重播由重試時的 CacheMiss 結束
+    if time.monotonic() - started < FOLLOW_POLL_INTERVAL:
+        delay = backoff_delay(failures)
+        print(f"  區塊已存在，{delay:.1f} 秒後重試...")
+        time.sleep(delay)
+
+
+def follow_tip_mode(start_height):
+    """
+    追蹤鏈頂模式：每 FOLLOW_POLL_INTERVAL 秒輕量查詢一次下一個區塊是否已出塊，
+    出塊後立即寫入並提交；寫入前比對前一塊的雜湊，發生分叉時先回滾再重新掃描。
+    追上鏈頂、進入等待時才更新地址餘額與匯出 dashboard_data.js。
+    """
+    source = get_source()
+    balance_cache = get_balance_cache()
+    checkpoint = ('main', start_height, None)
+    height = start_height
+    new_blocks = 0
+    print(f"開始追蹤鏈頂，由區塊 {height} 開始 (Ctrl+C 停止)...")
+    try:
+        while True:
+            try:
+                block = source.poll_block(height)
+            except CacheMiss as e:
+                print(f"\n{e}，離線重播結束。")
+                break
+            except (FetchError, RpcError) as e:
+                print(f"\n輪詢區塊 {height} 失敗: {e}")
+                block = None
+            if block is None:
+                if new_blocks:
+                    # 已追上鏈頂，利用等待時間更新餘額與匯出
+                    if SCAN_TRUE:
+                        auto_update_all_address_balances()
+                    run_export_dashboard_data()
+                    new_blocks = 0
+                print(f"等待區塊 {height} 出塊...", end='\r')
+                time.sleep(FOLLOW_POLL_INTERVAL)
+                continue
+            fork_height = find_fork_height(block)
+            if fork_height is not None:
+                rollback_blocks(fork_height, checkpoint)
+                height = fork_height
+                continue
+            try:
+                data = parse_block_data(block, balance_cache)
+            except (FetchError, RpcError) as e:
+                print(f"\n查詢區塊 {height} 網路錯誤: {e}")
+                time.sleep(FOLLOW_POLL_INTERVAL)
+                continue
+            record_block_data(data, balance_cache, checkpoint)
+            get_writer().flush()  # 新區塊立即提交，匯出與 API 馬上讀得到
+            if data['txids']:
+                print(f"\n區塊 {height}：{len(data['txids'])} 筆大額轉帳")
+            height += 1
+            new_blocks += 1
+    except KeyboardInterrupt:
+        print("\n偵測到中斷 (Ctrl+C)，結束追蹤鏈頂模式。")
+    finally:
+        get_writer().flush()
+    print(f"已連續寫入至區塊高度 {height - 1}，下次可由 {height} 繼續掃描。")
+    return height - 1
+
+
+class StageStats:
+    """管線單一階段的吞吐量統計（處理筆數與實際忙碌秒數）。"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds, count=1):
+        with self.lock:
+            self.count += count
+            self.busy += seconds
+
+    def summary(self, elapsed, workers):
+        rate = self.count / elapsed if elapsed > 0 else 0
+        usage = self.busy / (elapsed * workers) * 100 if elapsed > 0 else 0
+        return f"{self.name} {rate:.2f} 塊/秒 (忙碌 {usage:.0f}%)"
+
+
+def parallel_query_mode(start_height, end_height=None, workers=None, parse_workers=None):
+    """
+    管線掃描模式：fetch 階段預先下載區塊頁面，parse 階段解析總額/txid 並查詢轉帳輸出，
+    單一 writer（主執行緒）依高度順序寫入資料庫。階段之間以有界佇列串接形成背壓；
+    watermark 為已連續寫入的最高區塊，Ctrl+C 中止後從 watermark + 1 繼續即不會漏塊。
+    """
+    workers = max(1, workers or SCAN_WORKERS)
+    parse_workers = max(1, parse_workers or PARSE_WORKERS)
+    window = max(PIPELINE_QUEUE_SIZE, workers + parse_workers) * 2
+    balance_cache = get_balance_cache()
+    checkpoint = ('main', start_height, end_height)
+    source = get_source()
+    fetch_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    write_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    # 在途區塊數上限：writer 每寫入一塊才釋放一個名額，避免在鏈頂不斷預抓不存在的區塊
+    slots = threading.Semaphore(window)
+    stop = threading.Event()
+    stats = {name: StageStats(name) for name in ('fetch', 'parse', 'write')}
+    next_height = [start_height]
+    height_lock = threading.Lock()
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def claim_heights():
+        """取得下一批要下載的高度（RPC 來源一次多塊以便批次請求），每塊佔一個在途名額。"""
+        while not slots.acquire(timeout=0.5):
+            if stop.is_set():
+                return []
+        count = 1
+        while count < source.batch_size and slots.acquire(blocking=False):
+            count += 1
+        with height_lock:
+            start = next_height[0]
+            if end_height is not None and start + count - 1 > end_height:
+                keep = max(0, end_height - start + 1)
+                for _ in range(count - keep):
+                    slots.release()
+                count = keep
+            next_height[0] += count
+        return list(range(start, start + count))
+
+    def fetch_worker():
+        while not stop.is_set():
+            heights = claim_heights()
+            if not heights:
+                return
+            t0 = time.perf_counter()
+            try:
+                raws = source.fetch_blocks(heights)
+            except Exception as e:
+                raws = [e] * len(heights)
+            elapsed = time.perf_counter() - t0
+            stats['fetch'].add(elapsed, len(heights))
+            metrics.observe('stage_seconds', elapsed / len(heights), stage='fetch')
+            for height, raw in zip(heights, raws):
+                if isinstance(raw, Exception):
+                    put(fetch_q, (height, None, raw))
+                else:
+                    put(fetch_q, (height, raw, None))
+
+    def parse_worker():
+        while not stop.is_set():
+            try:
+                height, raw, error = fetch_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            t0 = time.perf_counter()
+            data = None
+            if error is None:
+                try:
+                    data = parse_block_data(source.parse_block(height, raw), balance_cache)
+                except Exception as e:
+                    error = e
+            stats['parse'].add(time.perf_counter() - t0)
+            put(write_q, (height, data, error))
+
+    threads = [threading.Thread(target=fetch_worker, daemon=True) for _ in range(workers)]
+    threads += [threading.Thread(target=parse_worker, daemon=True) for _ in range(parse_workers)]
+    for t in threads:
+        t.start()
+
+    def report():
+        elapsed = time.perf_counter() - started
+        print(f"\n[管線] {stats['fetch'].summary(elapsed, workers)} | "
+              f"{stats['parse'].summary(elapsed, parse_workers)} | "
+              f"{stats['write'].summary(elapsed, 1)} | "
+              f"佇列 fetch→parse {fetch_q.qsize()}/{fetch_q.maxsize}, "
+              f"parse→write {write_q.qsize()}/{write_q.maxsize}")
+
+    watermark = start_height - 1
+    ready = {}  # 已解析但尚未輪到寫入的區塊（依高度重排）
+    scanned_count = 0
+    started = last_report = time.perf_counter()
+    try:
+        while end_height is None or watermark < end_height:
+            height = watermark + 1
+            while height not in ready:
+                try:
+                    h, data, error = write_q.get(timeout=0.5)
+                    ready[h] = (data, error)
+                except queue.Empty:
+                    continue
+            data, error = ready.pop(height)
+            if isinstance(error, CacheMiss):
+                print(f"\n{error}，離線重播結束。")
+                break
+            # 失敗的區塊（多半是尚未出塊）由 writer 直接重試，成功前不會前進 watermark
+            failures = 0
+            while error is not None:
+                print(f"查詢區塊 {height} 發生錯誤: {error}")
+                try:
+                    data = fetch_block_data(height, balance_cache)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+                failures += 1
+                if SCAN_TRUE:
+                    auto_update_all_address_balances()
+                wait_before_retry(height, failures)
+                print("重新嘗試掃描本區塊...")
+            t0 = time.perf_counter()
+            record_block_data(data, balance_cache, checkpoint)
+            stats['write'].add(time.perf_counter() - t0)
+            watermark = height
+            slots.release()
+            scanned_count += 1
+            if scanned_count % 10 == 0:
+                run_export_dashboard_data()
+            if time.perf_counter() - last_report >= 30:
+                report()
+                last_report = time.perf_counter()
+        print("已達結束區塊高度，結束平行查詢模式。")
+    except KeyboardInterrupt:
+        print("\n偵測到中斷 (Ctrl+C)，捨棄尚未寫入的區塊後結束。")
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=15)
+        get_writer().flush()
+    report()
+    print(f"已連續寫入至區塊高度 {watermark}，下次可由 {watermark + 1} 繼續掃描。")
+    return watermark
+
+
+def process_and_record_block(block_height, balance_cache, checkpoint=None):
+    """查詢區塊、記錄轉帳與地址餘額，回傳True/False代表是否繼續。PROFILE_MODE 開啟時剖析整個區塊的處理。"""
+    try:
+        with metrics.profiled():
+            data = fetch_block_data(block_height, balance_cache)
+            record_block_data(data, balance_cache, checkpoint)
         return True
+    except CacheMiss:
+        raise
+    except FetchError as e:
+        # 網路錯誤不印 traceback，由呼叫端等待後重試
+        print(f"查詢區塊 {block_height} 網路錯誤: {e}")
+        return False
     except Exception as e:
         print(f"查詢區塊 {block_height} 發生錯誤: {e}")
         traceback.print_exc()
@@ -398,28 +663,46 @@ def process_and_record_block(block_height, address_balance_set):
 
 
 def manual_query_mode():
-    address_balance_set = set()
+    balance_cache = get_balance_cache()
     while True:
         user_input = input("\n請輸入區塊高度、地址或TxID (輸入 exit 結束): ").strip()
         if user_input.lower() == "exit":
             break
-        if user_input.isdigit():
-            process_and_record_block(int(user_input), address_balance_set)
-        elif user_input.startswith("scash1"):
-            record_address_balance(user_input, address_balance_set, None)
-            process_address(user_input)
-        elif re.fullmatch(r"[0-9a-fA-F]{64}", user_input):
+        kind, value = classify_query(user_input)
+        if kind == BLOCK:
+            process_and_record_block(value, balance_cache)
+        elif kind == ADDRESS:
+            record_address_balance(value, balance_cache, None)
+            process_address(value)
+        elif kind == TX:
             process_txid(user_input)
         else:
             print("輸入格式錯誤，請重新輸入。")
+        get_writer().flush()
 
 
-def process_block(block_height, address_balance_set=None):
+def batch_query_mode():
+    """從檔案讀取查詢清單，同時查詢並將結果寫成 JSON lines（不寫入資料庫）。"""
+    path = input("請輸入查詢清單檔案 (每行一個區塊高度、地址或TxID): ").strip()
+    if not os.path.isfile(path):
+        print(f"找不到檔案 {path}")
+        return
+    out_path = input("請輸入結果檔名 (預設 batch_result.jsonl): ").strip() or "batch_result.jsonl"
+    get_writer().flush()  # 讓批次查詢的唯讀連線看得到剛寫入的資料
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    started = time.time()
+    with open(out_path, 'w', encoding='utf-8') as out:
+        counts = run_batch(lines, out)
+    print(f"完成 {sum(counts.values())} 筆（資料庫 {counts['db']}、資料來源 {counts['fetch']}、錯誤 {counts['error']}），"
+          f"耗時 {time.time() - started:.1f} 秒，結果已寫入 {out_path}")
+
+
+def process_block(block_height, balance_cache=None):
     try:
-        block_url = f"{BASE_URL}/?search={block_height}"
-        soup = fetch_html(block_url)
-        total_amount = get_total_output_amount(soup)
-        time_str = get_timestamp(soup)
+        page = fetch_block(block_height)
+        total_amount = get_total_output_amount(page)
+        time_str = get_timestamp(page)
         if total_amount < THRESHOLD:
             if SHOW_RESULT:
                 print(
@@ -427,7 +710,7 @@ def process_block(block_height, address_balance_set=None):
             return True
         if SHOW_RESULT:
             print(f"區塊高度: {block_height}")
-        txids = find_txids_by_amount(soup, total_amount)
+        txids = find_txids_by_amount(page, total_amount)
         if not txids:
             if SHOW_RESULT:
                 print("未找到對應的 txid，無法查詢地址")
@@ -436,17 +719,18 @@ def process_block(block_height, address_balance_set=None):
         for txid in txids:
             if SHOW_RESULT:
                 print(f"轉帳 TxID: {txid}")
-            outputs = get_tx_outputs(txid)
+            outputs = get_tx_outputs(txid, page)
             rows_to_write = []
             for address, amount in outputs:
                 if amount < THRESHOLD:
                     continue
                 # 查詢地址餘額並記錄唯一地址
-                if address_balance_set is not None:
-                    if address not in address_balance_set:
+                if balance_cache is not None:
+                    if address not in balance_cache:
                         balance = get_address_balance(address)
+                        if balance is not None:
+                            balance_cache.mark(address, get_writer())
                         if balance is not None and balance >= THRESHOLD:
-                            address_balance_set.add(address)
                             write_address_balance_db(address, balance)
                 # 寫入轉帳紀錄
                 rows_to_write.append([
@@ -486,34 +770,70 @@ def process_txid(txid):
 
 def main():
     init_db()
+    metrics.start()
     while True:
         print("\n選擇模式：")
         print("1. 自動查詢模式 (可指定起始/結束區塊高度，直到手動停止)")
         print("2. 手動查詢模式 (輸入區塊高度/地址/TxID)")
         print("3. 設定檔設定模式 (修改 config.py 參數)")
         print("4. 匯出 dashboard_data.js 檔案")
+        print("5. 以新的閾值重建轉帳資料 (使用區塊摘要，不連網)")
+        print("6. 追蹤鏈頂模式 (由上次進度繼續，新區塊出塊後立即寫入)")
+        print("7. 批次查詢模式 (從檔案讀取大量區塊高度/地址/TxID，同時查詢)")
         print("0. 離開")
-        mode = input("請輸入模式編號 (1/2/3/4/0): ").strip()
+        mode = input("請輸入模式編號 (1/2/3/4/5/6/7/0): ").strip()
         if mode == "1":
-            # 讀取 config.py 的 BLOCK_HEIGHT 作為預設值
-            try:
-                default_start = BLOCK_HEIGHT
-            except Exception:
-                default_start = 1
+            # 有掃描紀錄時由上次連續寫入的下一塊繼續，否則使用 config.py 的 BLOCK_HEIGHT
+            last_height = load_resume_height()
+            if last_height is not None:
+                default_start = last_height + 1
+                print(f"上次已連續寫入至區塊高度 {last_height}，預設由 {default_start} 繼續。")
+            else:
+                try:
+                    default_start = BLOCK_HEIGHT
+                except Exception:
+                    default_start = 1
             start = input(f"請輸入起始區塊高度 (預設 {default_start}): ").strip()
             if not start:
                 start = default_start
             end = input("請輸入結束區塊高度 (留空則查到失敗為止): ").strip()
             start_height = int(start) if str(start).isdigit() else 1
             end_height = int(end) if end.isdigit() else None
-            auto_query_mode(start_height, end_height)
+            if SCAN_WORKERS > 1:
+                parallel_query_mode(start_height, end_height)
+            else:
+                auto_query_mode(start_height, end_height)
         elif mode == "2":
             manual_query_mode()
         elif mode == "3":
             config_setting_mode()
         elif mode == "4":
             print("開始匯出 dashboard_data.js ...")
-            run_export_dashboard_data()
+            run_export_dashboard_data(force=True)
+        elif mode == "5":
+            value = input(f"請輸入新的閾值 (預設 {THRESHOLD}): ").strip()
+            try:
+                rebuild_transfer_tables(float(value) if value else None)
+            except ValueError:
+                print("輸入錯誤，請重新輸入。")
+        elif mode == "6":
+            last_height = load_resume_height()
+            default_start = last_height + 1 if last_height is not None else BLOCK_HEIGHT
+            start = input(f"請輸入起始區塊高度 (預設 {default_start}): ").strip()
+            start_height = int(start) if start.isdigit() else default_start
+            # 落後很多且可取得鏈高度時，先用平行管線追上再切換為追蹤
+            try:
+                tip = get_source().get_block_count()
+            except NotImplementedError:
+                tip = None
+            except (FetchError, RpcError) as e:
+                print(f"無法取得鏈高度: {e}")
+                tip = None
+            if tip is not None and SCAN_WORKERS > 1 and tip - start_height > PIPELINE_QUEUE_SIZE:
+                start_height = parallel_query_mode(start_height, tip) + 1
+            follow_tip_mode(start_height)
+        elif mode == "7":
+            batch_query_mode()
         elif mode == "0":
             print("程式結束。")
             break
@@ -533,8 +853,55 @@ def config_setting_mode():
         'BASE_URL': 'SCASH 區塊鏈的基礎 URL',
         'DB_FILE': '資料儲存用 SQLite 檔案名稱',
         'SHOW_RESULT': '是否顯示查詢結果',
-        'SCAN_INTERVAL': '自動查詢間隔秒數',
-        'SCAN_TRUE': '自動查詢模式是否自動更新所有地址餘額'
+        'SCAN_TRUE': '自動查詢模式等待新區塊時是否更新地址餘額',
+        'SCAN_WORKERS': '平行掃描的工作執行緒數（1 為逐塊掃描）',
+        'PARSE_WORKERS': '平行掃描時解析階段的執行緒數',
+        'PIPELINE_QUEUE_SIZE': '平行掃描各階段之間的佇列上限',
+        'HTTP_POOL_SIZE': 'HTTP 連線池大小',
+        'HTTP_TIMEOUT': '單次 HTTP 請求逾時秒數',
+        'HTTP_RETRIES': 'HTTP 請求最多嘗試次數',
+        'HTTP_BACKOFF_BASE': '重試退避的起始秒數（指數成長並加入隨機抖動）',
+        'HTTP_BACKOFF_MAX': '重試退避的最長等待秒數',
+        'DATA_SOURCE': "區塊資料來源：'explorer'（爬取網頁）或 'rpc'（本機節點 JSON-RPC）",
+        'RPC_URL': '節點 JSON-RPC 位址',
+        'RPC_USER': '節點 JSON-RPC 使用者名稱',
+        'RPC_PASSWORD': '節點 JSON-RPC 密碼',
+        'RPC_BATCH_SIZE': '單次 JSON-RPC 批次請求的區塊數',
+        'PAGE_CACHE_FILE': "區塊/交易頁面快取檔（'' 表示停用）",
+        'PAGE_CACHE_MAX_MB': '頁面快取大小上限（MB），超過時淘汰最久未使用的頁面',
+        'PAGE_CACHE_TIP_MARGIN': '距最高區塊幾塊以內的頁面不寫入快取',
+        'CACHE_ONLY': '離線重播模式：只從快取讀取頁面，不連網',
+        'WRITER_BATCH_ROWS': '資料庫累積多少列寫入才提交一次',
+        'WRITER_BATCH_SECONDS': '距上次提交超過幾秒就提交',
+        'ADDRESS_REFRESH_TTL': '地址餘額查詢後幾秒內不再重複查詢（跨重新啟動）',
+        'BALANCE_REFRESH_WORKERS': '同時查詢地址餘額的執行緒數',
+        'BALANCE_REFRESH_BATCH': '地址餘額每批寫入並提交的地址數',
+        'BALANCE_SWEEP_BATCH': '每次等待新區塊時補查的久未查詢地址數',
+        'BALANCE_SWEEP_MIN_AGE': '地址餘額距上次查詢超過幾秒才會被補查',
+        'FOLLOW_POLL_INTERVAL': '追蹤鏈頂模式輪詢新區塊的間隔秒數',
+        'REORG_MAX_DEPTH': '偵測到分叉時最多往回比對幾個區塊',
+        'DASHBOARD_TX_PAGE_SIZE': '儀表板大額轉帳每個分頁檔的筆數',
+        'DASHBOARD_RANK_TOP_N': '儀表板排行榜匯出的名次數',
+        'API_HOST': '查詢 API（api_server.py）監聽位址',
+        'API_PORT': '查詢 API 監聽埠',
+        'API_PAGE_SIZE': '查詢 API 列表端點預設每頁筆數',
+        'API_MAX_PAGE_SIZE': '查詢 API 每頁筆數上限',
+        'API_POOL_SIZE': '查詢 API 的唯讀資料庫連線數',
+        'API_CACHE_SIZE': '查詢 API 在記憶體快取的查詢結果數',
+        'BACKFILL_WORKERS': '歷史回補（backfill.py）的工作行程數',
+        'BACKFILL_DIR': '歷史回補各工作行程的分片資料庫目錄',
+        'HTTP_RATE_INITIAL': '對區塊鏈瀏覽器的起始請求速率（次/秒），之後依回應自動調整',
+        'HTTP_RATE_MIN': '被限流時請求速率最低降到多少（次/秒）',
+        'HTTP_RATE_MAX': '請求速率上限（次/秒）',
+        'HTTP_CONCURRENCY_INITIAL': '起始同時請求數，上限為 HTTP_POOL_SIZE',
+        'HTTP_LATENCY_TARGET': '回應延遲低於幾秒才繼續加速',
+        'BALANCE_CACHE_SIZE': '記憶體內保留的地址餘額查詢紀錄筆數上限（超過時淘汰最久未使用者）',
+        'METRICS_PORT': "Prometheus 指標端點的埠號（0 表示停用）",
+        'METRICS_FILE': "定期寫入的 JSON 統計檔（'' 表示停用）",
+        'METRICS_INTERVAL': 'JSON 統計檔的寫入間隔秒數',
+        'PROFILE_MODE': "逐塊剖析：'cprofile'、'tracemalloc' 或 ''（停用）",
+        'PROFILE_FILE': '剖析結果的檔名（不含副檔名）',
+        'BATCH_LOOKUP_WORKERS': '批次查詢同時查詢的執行緒數'
     }
     # 讀取現有設定與預設值
     with open(config_path, 'r', encoding='utf-8') as f:
@@ -587,14 +954,19 @@ def config_setting_mode():
             # 重新 import config 並更新全域變數
             import config as _config
             importlib.reload(_config)
-            global BLOCK_HEIGHT, THRESHOLD, BASE_URL, SHOW_RESULT, SCAN_INTERVAL, DB_FILE, SCAN_TRUE
+            global BLOCK_HEIGHT, THRESHOLD, BASE_URL, SHOW_RESULT, DB_FILE, SCAN_TRUE, SCAN_WORKERS
+            global PARSE_WORKERS, PIPELINE_QUEUE_SIZE, FOLLOW_POLL_INTERVAL, REORG_MAX_DEPTH
             BLOCK_HEIGHT = _config.BLOCK_HEIGHT
             THRESHOLD = _config.THRESHOLD
             BASE_URL = _config.BASE_URL
             SHOW_RESULT = _config.SHOW_RESULT
-            SCAN_INTERVAL = _config.SCAN_INTERVAL
             DB_FILE = _config.DB_FILE
             SCAN_TRUE = _config.SCAN_TRUE
+            SCAN_WORKERS = _config.SCAN_WORKERS
+            PARSE_WORKERS = _config.PARSE_WORKERS
+            PIPELINE_QUEUE_SIZE = _config.PIPELINE_QUEUE_SIZE
+            FOLLOW_POLL_INTERVAL = _config.FOLLOW_POLL_INTERVAL
+            REORG_MAX_DEPTH = _config.REORG_MAX_DEPTH
             print("設定已重新載入。返回主選單。\n")
             break
         try:
@@ -619,43 +991,29 @@ def config_setting_mode():
             print("輸入錯誤，請重新輸入。")
 
 
-def find_total_output_amount_until_found(block_height, retry_minutes=10):
+def find_total_output_amount_until_found(block_height):
     """
-    持續查找指定區塊的總輸出金額，找不到時每 retry_minutes 分鐘自動重試，直到找到或手動停止。
+    持續查找指定區塊的總輸出金額，尚未出塊時每 FOLLOW_POLL_INTERVAL 秒輕量輪詢一次，直到找到或手動停止；
+    錯誤時依連續失敗次數以 backoff_delay 退避後重試。
     """
+    print(f"查詢區塊 {block_height} 的總輸出金額...")
+    failures = 0
     while True:
         try:
-            print(f"查詢區塊 {block_height} 的總輸出金額...")
-            block_url = f"{BASE_URL}/?search={block_height}"
-            soup = fetch_html(block_url)
-            amount = None
-            try:
-                amount = get_total_output_amount(soup)
-            except SystemExit:
-                amount = None
-            if amount is not None:
-                print(f"區塊 {block_height} 的總輸出金額為: {amount} SCASH")
-                return amount
-            else:
-                print(
-                    f"無法找到區塊 {block_height} 的總輸出金額，{retry_minutes} 分鐘後自動重試...")
-                for i in range(retry_minutes*60, 0, -1):
-                    print(
-                        f"  等待 {i//60:02d}:{i%60:02d} 後重試... (Ctrl+C 可中止)", end='\r')
-                    time.sleep(1)
-                print("\n重新嘗試...")
+            amount = get_total_output_amount(wait_for_block(block_height))
+            print(f"區塊 {block_height} 的總輸出金額為: {amount} SCASH")
+            return amount
         except KeyboardInterrupt:
             print("\n偵測到中斷 (Ctrl+C)，已停止自動查詢。")
             break
         except Exception as e:
             print(f"查詢過程發生錯誤: {e}")
             traceback.print_exc()
-            print(f"{retry_minutes} 分鐘後自動重試...")
-            for i in range(retry_minutes*60, 0, -1):
-                print(
-                    f"  等待 {i//60:02d}:{i%60:02d} 後重試... (Ctrl+C 可中止)", end='\r')
-                time.sleep(1)
-            print("\n重新嘗試...")
+            failures += 1
+            delay = backoff_delay(failures)
+            print(f"{delay:.1f} 秒後自動重試... (Ctrl+C 可中止)")
+            time.sleep(delay)
+            print("重新嘗試...")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,386 @@
+"""
+scash_data.db 的本機唯讀 JSON 查詢 API。
+
+用法：
+    python api_server.py [--host 127.0.0.1] [--port 8800]
+
+端點（皆為 GET，列表類端點支援 limit / offset 分頁，回傳 next_offset 供取下一頁）：
+- /api/stats                              儀表板總計與已掃描的最高區塊
+- /api/balances                           地址餘額排行
+- /api/transfers?from=&to=&min_amount=    區塊範圍內的轉帳
+- /api/receivers?order=&days=             轉入排行（order 為 amount / tx_count / large_count，days 為最近幾天）
+- /api/address/<地址>                      單一地址的餘額與轉入統計
+- /api/address/<地址>/transfers            地址的轉帳紀錄（新到舊）
+- /api/address/<地址>/history              地址的餘額變動紀錄（新到舊）
+- /api/tx/<txid>                           交易的轉帳與所有輸出
+
+- 以唯讀連線池查詢，可與掃描程式同時執行
+- 查詢結果依網址快取在記憶體；資料庫有新的提交（PRAGMA data_version 改變）時整個清空
+- 回應帶 ETag，用戶端送 If-None-Match 命中時回 304；用戶端支援時以 gzip 壓縮
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import queue
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import config
+from scash_db import connect, find_address_id, from_sat, load_dashboard_stats, to_sat, txid_blob, txid_hex
+
+GZIP_MIN_BYTES = 512  # 小於此大小的回應不壓縮
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ConnectionPool:
+    """固定數量的唯讀連線，每個請求借用一條，用完歸還。"""
+
+    def __init__(self, path=None, size=4):
+        self.path = path or config.DB_FILE
+        self.pool = queue.LifoQueue()
+        for _ in range(size):
+            self.pool.put(connect(self.path, readonly=True))
+
+    @contextmanager
+    def acquire(self):
+        conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def close(self):
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+
+
+class ResultCache:
+    """
+    以網址為鍵的 LRU 快取，存放 (ETag, 原始 JSON, gzip 後 JSON)。
+    另開一條連線監看 PRAGMA data_version，掃描程式提交後第一個請求就會清空快取。
+    get() 同時回傳查詢前的版本，put() 時版本已改變（查詢期間有新的提交）就不存入，避免放回舊結果。
+    """
+
+    def __init__(self, path=None, size=256):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.watch = connect(path or config.DB_FILE, readonly=True)
+        self.data_version = None
+
+    def _check_version(self):
+        version = self.watch.execute('PRAGMA data_version').fetchone()[0]
+        if version != self.data_version:
+            self.data_version = version
+            self.items.clear()
+
+    def get(self, key):
+        """回傳 (快取項目或 None, 目前的 data_version)。"""
+        with self.lock:
+            self._check_version()
+            entry = self.items.get(key)
+            if entry is not None:
+                self.items.move_to_end(key)
+            return entry, self.data_version
+
+    def put(self, key, body, version):
+        """version 為查詢前由 get() 取得的版本，與目前版本不同時只回傳項目、不存入快取。"""
+        entry = (f'"{hashlib.sha1(body).hexdigest()}"', body, gzip.compress(body, 6))
+        with self.lock:
+            self._check_version()
+            if version != self.data_version:
+                return entry
+            self.items[key] = entry
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+        return entry
+
+
+def _int_arg(args, name, default=None, minimum=0, maximum=None):
+    value = args.get(name, [None])[0]
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f'{name} 必須是整數')
+    if value < minimum:
+        raise ApiError(400, f'{name} 不可小於 {minimum}')
+    return min(value, maximum) if maximum is not None else value
+
+
+def _float_arg(args, name, default):
+    value = args.get(name, [None])[0]
+    if value in (None, ''):
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        raise ApiError(400, f'{name} 必須是數字')
+    if not math.isfinite(value):
+        raise ApiError(400, f'{name} 必須是有限的數字')
+    return value
+
+
+def _page(args):
+    limit = _int_arg(args, 'limit', config.API_PAGE_SIZE, minimum=1, maximum=config.API_MAX_PAGE_SIZE)
+    return limit, _int_arg(args, 'offset', 0)
+
+
+def _rows(conn, sql, params, convert, limit, offset):
+    """執行分頁查詢（多取一列判斷是否還有下一頁），以 convert 將每列轉為 dict，回傳列表回應。"""
+    rows = conn.execute(f'{sql} LIMIT ? OFFSET ?', params + (limit + 1, offset)).fetchall()
+    more = len(rows) > limit
+    return {
+        'data': [convert(row) for row in rows[:limit]],
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if more else None,
+    }
+
+
+_TX_SELECT = '''SELECT t.block_height, t.txid, a.address, t.amount, t.transfer_time
+               FROM tx t JOIN address a ON a.id = t.address_id'''
+_BALANCE_SELECT = '''SELECT a.address, b.balance, b.change_str, b.update_count, b.scan_time, b.update_time
+                    FROM scash_address_balances b JOIN address a ON a.id = b.address_id'''
+
+
+def _tx_row(row):
+    return {'block_height': row[0], 'txid': txid_hex(row[1]), 'address': row[2],
+            'amount': from_sat(row[3]), 'transfer_time': row[4]}
+
+
+def _balance_row(row):
+    return {'address': row[0], 'balance': from_sat(row[1]), 'change_str': row[2],
+            'update_count': row[3], 'scan_time': row[4], 'update_time': row[5]}
+
+
+def _flow_fields(row):
+    return {'tx_count': row[0], 'amount': from_sat(row[1]), 'large_count': row[2],
+            'large_amount': from_sat(row[3]), 'first_block': row[4], 'last_block': row[5]}
+
+
+def _flow_row(row):
+    return {'address': row[0], **_flow_fields(row[1:])}
+
+
+def _history_row(row):
+    return {'balance': from_sat(row[0]), 'change': from_sat(row[1]), 'update_time': row[2]}
+
+
+STATS_COUNTS = ('address_count', 'tx_count', 'tx_large_count')  # dashboard_stats 中的筆數，以整數回傳
+
+
+def api_stats(conn, args):
+    stats = load_dashboard_stats(conn)
+    stats.pop('balance_changes', None)  # 匯出用的內部變動計數
+    for name in STATS_COUNTS:
+        if name in stats:
+            stats[name] = int(stats[name])
+    stats['max_block'] = conn.execute('''SELECT COALESCE((SELECT MAX(block_height) FROM block_summary),
+                                                         (SELECT MAX(block_height) FROM tx))''').fetchone()[0]
+    return stats
+
+
+def api_balances(conn, args):
+    limit, offset = _page(args)
+    min_balance = _float_arg(args, 'min_balance', None)
+    where, params = ('WHERE b.balance >= ?', (to_sat(min_balance),)) if min_balance is not None else ('', ())
+    return _rows(conn, f'{_BALANCE_SELECT} {where} ORDER BY b.balance DESC, b.address_id',
+                 params, _balance_row, limit, offset)
+
+
+def api_transfers(conn, args):
+    limit, offset = _page(args)
+    start = _int_arg(args, 'from', 0)
+    end = _int_arg(args, 'to')
+    if end is None:
+        end = conn.execute('SELECT COALESCE(MAX(block_height), 0) FROM tx').fetchone()[0]
+    if end < start:
+        raise ApiError(400, 'to 不可小於 from')
+    min_amount = _float_arg(args, 'min_amount', 0)
+    return _rows(conn, f'''{_TX_SELECT} WHERE t.block_height BETWEEN ? AND ? AND t.amount >= ?
+                          ORDER BY t.block_height, t.txid, t.address_id''',
+                 (start, end, to_sat(min_amount)), _tx_row, limit, offset)
+
+
+RECEIVER_ORDERS = ('amount', 'tx_count', 'large_count')  # /api/receivers 可用的排序欄位
+
+
+def api_receivers(conn, args):
+    limit, offset = _page(args)
+    order = args.get('order', ['amount'])[0] or 'amount'
+    if order not in RECEIVER_ORDERS:
+        raise ApiError(400, f"order 必須是 {' / '.join(RECEIVER_ORDERS)}")
+    days = _int_arg(args, 'days', minimum=1)
+    if days is None:
+        # 全部期間：address_flow 的索引反向掃描，取前 N 名不需排序
+        return _rows(conn, f'''SELECT a.address, f.tx_count, f.amount, f.large_count, f.large_amount,
+                                      f.first_block, f.last_block
+                               FROM address_flow f JOIN address a ON a.id = f.address_id
+                               ORDER BY f.{order} DESC, f.address_id DESC''', (), _flow_row, limit, offset)
+    # 最近 days 天（以資料中最新的一天起算）：由 address_flow_daily 依日期範圍加總
+    result = _rows(conn, f'''SELECT a.address, SUM(d.tx_count), SUM(d.amount), SUM(d.large_count)
+                             FROM address_flow_daily d JOIN address a ON a.id = d.address_id
+                             WHERE d.day > date((SELECT MAX(day) FROM address_flow_daily), ?)
+                             GROUP BY d.address_id
+                             ORDER BY SUM(d.{order}) DESC, d.address_id DESC''', (f'-{days} days',),
+                   lambda row: {'address': row[0], 'tx_count': row[1], 'amount': from_sat(row[2]),
+                                'large_count': row[3]}, limit, offset)
+    result['days'] = days
+    return result
+
+
+def api_address(conn, args, address):
+    address_id = find_address_id(conn, address)
+    row = flow = None
+    if address_id is not None:
+        row = conn.execute(f'{_BALANCE_SELECT} WHERE b.address_id=?', (address_id,)).fetchone()
+        flow = conn.execute('''SELECT tx_count, amount, large_count, large_amount, first_block, last_block
+                               FROM address_flow WHERE address_id=?''', (address_id,)).fetchone()
+    refresh = conn.execute('SELECT refresh_time FROM address_refresh WHERE address=?', (address,)).fetchone()
+    if row is None and refresh is None and flow is None:
+        raise ApiError(404, '資料庫中沒有這個地址的餘額紀錄')
+    result = _balance_row(row) if row else {'address': address, 'balance': None}
+    result['refresh_time'] = refresh[0] if refresh else None
+    # 轉入統計（只含高於 THRESHOLD 而記錄在 tx 的轉帳），沒有轉入紀錄時為 None
+    result['flow'] = _flow_fields(flow) if flow else None
+    return result
+
+
+def api_address_transfers(conn, args, address):
+    limit, offset = _page(args)
+    # 不存在的地址以 -1 查詢，回傳空的分頁
+    address_id = find_address_id(conn, address)
+    return _rows(conn, f'''{_TX_SELECT} WHERE t.address_id=?
+                          ORDER BY t.block_height DESC, t.txid''',
+                 (-1 if address_id is None else address_id,), _tx_row, limit, offset)
+
+
+def api_address_history(conn, args, address):
+    limit, offset = _page(args)
+    address_id = find_address_id(conn, address)
+    return _rows(conn, '''SELECT balance, change, update_time FROM balance_history WHERE address_id=?
+                          ORDER BY rowid DESC''', (-1 if address_id is None else address_id,),
+                 _history_row, limit, offset)
+
+
+def api_tx(conn, args, txid):
+    key = txid_blob(txid.lower())
+    transfers = conn.execute(f'{_TX_SELECT} WHERE t.txid=? ORDER BY a.address', (key,)).fetchall()
+    outputs = conn.execute('''SELECT a.address, o.block_height, o.tx_amount, o.amount
+                              FROM block_output o JOIN address a ON a.id = o.address_id
+                              WHERE o.txid=? ORDER BY a.address''', (key,)).fetchall()
+    if not transfers and not outputs:
+        raise ApiError(404, '資料庫中沒有這筆交易')
+    return {
+        'txid': txid.lower(),
+        'block_height': transfers[0][0] if transfers else outputs[0][1],
+        'tx_amount': from_sat(outputs[0][2]) if outputs else None,
+        'transfers': [_tx_row(row) for row in transfers],
+        'outputs': [{'address': row[0], 'amount': from_sat(row[3])} for row in outputs],
+    }
+
+
+ROUTES = [
+    (re.compile(r'/api/stats'), api_stats),
+    (re.compile(r'/api/balances'), api_balances),
+    (re.compile(r'/api/transfers'), api_transfers),
+    (re.compile(r'/api/receivers'), api_receivers),
+    (re.compile(r'/api/address/([^/]+)'), api_address),
+    (re.compile(r'/api/address/([^/]+)/transfers'), api_address_transfers),
+    (re.compile(r'/api/address/([^/]+)/history'), api_address_history),
+    (re.compile(r'/api/tx/([0-9a-fA-F]{64})'), api_tx),
+]
+
+
+def make_handler(pool, cache):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            key = url.path + '?' + url.query
+            entry, version = cache.get(key)
+            if entry is None:
+                try:
+                    body = self._dispatch(url)
+                except ApiError as e:
+                    return self._send(e.status, json.dumps({'error': str(e)}, ensure_ascii=False).encode())
+                except Exception as e:
+                    # 其他錯誤（例如資料庫鎖定）也回傳 JSON，不讓連線直接中斷
+                    print(f"API 請求 {self.path} 發生錯誤: {e}")
+                    return self._send(500, json.dumps({'error': f'伺服器錯誤: {e}'}, ensure_ascii=False).encode())
+                entry = cache.put(key, body, version)
+            etag, body, gzipped = entry
+            if etag in (self.headers.get('If-None-Match') or ''):
+                return self._send(304, b'', etag)
+            if len(body) >= GZIP_MIN_BYTES and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                return self._send(200, gzipped, etag, 'gzip')
+            self._send(200, body, etag)
+
+        def _dispatch(self, url):
+            path = url.path.rstrip('/')
+            for pattern, func in ROUTES:
+                match = pattern.fullmatch(path)
+                if match:
+                    args = parse_qs(url.query)
+                    with pool.acquire() as conn:
+                        result = func(conn, args, *(unquote(g) for g in match.groups()))
+                    return json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode()
+            raise ApiError(404, f'沒有這個端點: {url.path}')
+
+        def _send(self, status, data, etag=None, encoding=None):
+            self.send_response(status)
+            if status != 304:
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+            if etag:
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            if status != 304:
+                self.wfile.write(data)
+    return Handler
+
+
+def make_server(host=None, port=None, db_file=None):
+    pool = ConnectionPool(db_file, config.API_POOL_SIZE)
+    cache = ResultCache(db_file, config.API_CACHE_SIZE)
+    host = host or config.API_HOST
+    port = config.API_PORT if port is None else port
+    return ThreadingHTTPServer((host, port), make_handler(pool, cache))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=config.API_HOST)
+    parser.add_argument('--port', type=int, default=config.API_PORT)
+    parser.add_argument('--db', default=config.DB_FILE, help='SQLite 資料庫檔')
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.db)
+    print(f"查詢 API 已啟動: http://{args.host}:{server.server_address[1]}/api/stats（資料庫 {args.db}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
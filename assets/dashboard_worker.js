@@ -0,0 +1,86 @@
+// ========== 儀表板表格格式化（Web Worker） ========== //
+// 在背景執行緒把排行榜與大額轉帳的原始資料轉成每列的 HTML：地址縮寫、金額與時間格式化、分頁反轉。
+// 回傳 [{ key, html }]，主執行緒只把捲動範圍內的列放進 DOM，html 沒變的列不會重寫。
+// 同一個表格上次格式化過且內容沒變的列直接沿用快取，每 10 分鐘刷新時不必全部重算。
+// 無法建立 Worker 時（例如以 file:// 開啟頁面），index.html 會以一般 script 載入本檔並直接呼叫 dashboardFormat。
+const formatCache = {};
+
+function formatUpdateTime(updateTime) {
+  // 轉換格式 yyyy-MM-dd HH:mm:ss -> yyyy/MM/dd HH:mm
+  if (!updateTime) return "";
+  const dt = updateTime.split(" ");
+  if (dt.length === 2) {
+    const d = dt[0].replace(/-/g, "/");
+    const t = dt[1].slice(0, 5);
+    return `${d} ${t}`;
+  }
+  return updateTime.replace(/-/g, "/");
+}
+
+function rankHtml(x, rank) {
+  // 地址顯示前12...後10
+  const shortAddr =
+    x.address.length > 12
+      ? `${x.address.slice(0, 12)}...${x.address.slice(-10)}`
+      : x.address;
+  const addrLink = `<a href='https://scash.one/?search=${x.address}' target='_blank' rel='noopener' title='${x.address}' style='word-break:break-all;max-width:700px;display:inline-block;'>${shortAddr}</a>`;
+  let changeCell = "±0";
+  const updateDate = formatUpdateTime(x.update_time || x.scan_time || "");
+  let updateTimeCell = updateDate;
+  if (x.change_str && x.change_str !== "0" && x.update_time) {
+    const num = parseFloat(x.change_str);
+    let str = (Math.round(num * 100) / 100).toFixed(2);
+    if (num > 0) str = "+" + str;
+    changeCell = str;
+    updateTimeCell = `<span style='color:#7c4dff;'>${updateDate}</span>`;
+  }
+  const balance = (Math.round(x.balance * 100) / 100).toFixed(2);
+  return `<td class='rank-col'>${rank}</td><td class="address-col">${addrLink}</td><td class="balance-col">${balance}</td><td class="change-col">${changeCell}</td><td class="update-time-col">${updateTimeCell}</td>`;
+}
+
+function txHtml(x) {
+  const blockLink = `<a href='https://scash.one/?search=${x.block_height}' target='_blank' rel='noopener'>${x.block_height}</a>`;
+  let txidShort = x.txid;
+  if (txidShort.length > 20) {
+    txidShort = `${x.txid.slice(0, 10)}...${x.txid.slice(-10)}`;
+  }
+  const txidLink = `<a href='https://scash.one/?search=${x.txid}' target='_blank' rel='noopener'>${txidShort}</a>`;
+  const addrLink = `<a href='https://scash.one/?search=${x.address}' target='_blank' rel='noopener' style='text-align:left;display:inline-block;width:100%;'>${x.address}</a>`;
+  const amount = (Math.round(x.amount * 100) / 100).toFixed(2);
+  return `<td class='height-col'>${blockLink}</td><td class='txid-col'>${txidLink}</td><td class='tx-address-col' style='text-align:left;'>${addrLink}</td><td class='amount-col' style='text-align:center;'>${amount}</td><td class='time-col'>${x.transfer_time}</td>`;
+}
+
+// msg: { table, kind: "rank" | "tx", rows, start（排行榜起始名次）, reverse（轉帳分頁由舊到新，顯示時反轉） }
+function dashboardFormat(msg) {
+  const rows = msg.reverse ? msg.rows.slice().reverse() : msg.rows;
+  const cache = formatCache[msg.table] || new Map();
+  const next = new Map();
+  const seen = new Map();
+  const result = rows.map((x, i) => {
+    let key = msg.kind === "rank" ? x.address : `${x.txid}:${x.address}`;
+    const n = (seen.get(key) || 0) + 1;
+    seen.set(key, n);
+    if (n > 1) key += "#" + n;
+    const raw =
+      msg.kind === "rank"
+        ? [msg.start + i + 1, x.address, x.balance, x.change_str, x.update_time, x.scan_time].join("|")
+        : [x.block_height, x.txid, x.address, x.amount, x.transfer_time].join("|");
+    const cached = cache.get(key);
+    let html;
+    if (cached && cached.raw === raw) {
+      html = cached.html;
+    } else {
+      html = msg.kind === "rank" ? rankHtml(x, msg.start + i + 1) : txHtml(x);
+    }
+    next.set(key, { raw: raw, html: html });
+    return { key: key, html: html };
+  });
+  formatCache[msg.table] = next; // 只保留目前顯示的列，快取不會無限成長
+  return result;
+}
+
+if (typeof WorkerGlobalScope !== "undefined" && self instanceof WorkerGlobalScope) {
+  self.onmessage = function (e) {
+    self.postMessage({ id: e.data.id, rows: dashboardFormat(e.data) });
+  };
+}
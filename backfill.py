@@ -0,0 +1,271 @@
+"""
+多行程歷史回補：把區塊範圍切成 N 段，各由一個工作行程掃描並寫入自己的分片資料庫，
+全部完成後合併進 DB_FILE。
+
+用法：
+    python backfill.py <起始高度> <結束高度> [--workers 4]
+    python backfill.py <起始高度> <結束高度> --shard 2      # 只重跑第 2 段（從它自己的進度繼續）
+    python backfill.py <起始高度> <結束高度> --merge-only   # 只合併已完成的分片
+
+- 分片存放在 BACKFILL_DIR/shard_<起>_<訖>.db，結構與主資料庫相同（scash_db.init_schema），
+  只寫入不受閾值影響的 block_summary / block_output / block_hash，進度記在分片的 scan_state
+- 工作行程中斷或失敗時重新執行同一個指令即可，每段都從自己的進度繼續；異常結束的行程會自動重啟
+- 合併時依地址重新對應編號，以主鍵去除重複（同一區塊以分片為準），再依目前的 THRESHOLD
+  重建該範圍的 block / tx，新交易涉及的地址交由 balance_refresh 更新餘額
+- 每段各自解析網頁，不受單一行程 GIL 限制，吞吐量隨行程數（與資料來源的承受度）成長；
+  各行程平分 HTTP_RATE_INITIAL / HTTP_RATE_MAX，合計的請求速率不會因行程數增加而超過設定
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import sqlite3
+import time
+
+import config
+from balance_refresh import mark_dirty
+from data_source import collect_tx_outputs, get_source
+from export_dashboard_data import export_dashboard_data
+from page_cache import CacheMiss
+from scash_db import BatchWriter, connect, get_writer, init_schema, load_scan_state, rebuild_transfers, save_scan_state, \
+    write_block_summary
+
+MAX_RESTARTS = 3  # 每個工作行程異常結束後最多自動重啟的次數
+BLOCK_PARSE_RETRIES = 3  # 同一區塊頁面解析失敗（LookupError）的重試次數，超過時結束該分片
+
+
+def plan_shards(start_height, end_height, workers):
+    """將範圍平均切成 workers 段，回傳 [(起始高度, 結束高度, 分片路徑)]。"""
+    total = end_height - start_height + 1
+    workers = max(1, min(workers, total))
+    shards = []
+    for index in range(workers):
+        start = start_height + total * index // workers
+        end = start_height + total * (index + 1) // workers - 1
+        shards.append((start, end, os.path.join(config.BACKFILL_DIR, f'shard_{start}_{end}.db')))
+    return shards
+
+
+def shard_progress(path):
+    """分片已連續寫入的最高區塊，沒有分片或尚未開始時回傳 None。"""
+    if not os.path.exists(path):
+        return None
+    conn = connect(path, readonly=True)
+    try:
+        state = load_scan_state(conn, 'shard')
+    except sqlite3.OperationalError:
+        state = None  # 分片建立到一半，還沒有 scan_state 表
+    finally:
+        conn.close()
+    return state[2] if state else None
+
+
+def block_summary_data(page):
+    """由已解析的區塊整理出 write_block_summary 需要的資料（不受閾值影響，不查詢餘額）。"""
+    if page.total_error:
+        raise LookupError(f'區塊 {page.height} {page.total_error}')
+    return {
+        'block_height': page.height,
+        'block_hash': page.block_hash,
+        'time_str': page.time_str,
+        'total_amount': page.total_amount,
+        'summary_outputs': [(txid, tx_amount, address, amount)
+                            for txid, tx_amount, _, outputs in collect_tx_outputs(page)
+                            for address, amount in outputs],
+    }
+
+
+def run_shard(start_height, end_height, path, progress=None):
+    """掃描一段區塊寫入分片 path，從分片的進度繼續；progress 為回報完成塊數的佇列。"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    writer = BatchWriter(path)
+    try:
+        init_schema(writer.conn)
+        state = load_scan_state(writer.conn, 'shard')
+        height = state[2] + 1 if state else start_height
+        source = get_source()
+        parse_failures = 0
+        while height <= end_height:
+            heights = list(range(height, min(end_height, height + max(1, source.batch_size) - 1) + 1))
+            try:
+                raws = source.fetch_blocks(heights)
+                for block_height, raw in zip(heights, raws):
+                    if isinstance(raw, Exception):
+                        raise raw
+                    data = block_summary_data(source.parse_block(block_height, raw))
+                    with writer.atomic():
+                        write_block_summary(writer, data)
+                        save_scan_state(writer, 'shard', start_height, end_height, block_height)
+                    writer.maybe_commit()
+                    height = block_height + 1
+                    parse_failures = 0
+                    if progress is not None:
+                        progress.put(1)
+            except CacheMiss:
+                raise
+            except LookupError as e:
+                # 頁面取得了但內容無法解析，重試幾次仍失敗時視為無法自動恢復，結束分片交由 run_workers 處理
+                parse_failures += 1
+                if parse_failures > BLOCK_PARSE_RETRIES:
+                    writer.flush()
+                    raise
+                print(f"[分片 {start_height}~{end_height}] {e}，10 秒後重試（{parse_failures}/{BLOCK_PARSE_RETRIES}）")
+                writer.flush()
+                time.sleep(10)
+            except Exception as e:
+                print(f"[分片 {start_height}~{end_height}] 區塊 {height} 發生錯誤: {e}，10 秒後重試")
+                writer.flush()
+                time.sleep(10)
+    finally:
+        writer.close()
+
+
+def _worker(start_height, end_height, path, progress, workers=1):
+    # 每個行程有自己的限速器，平分速率設定
+    config.HTTP_RATE_INITIAL /= workers
+    config.HTTP_RATE_MAX /= workers
+    config.HTTP_RATE_MIN = min(config.HTTP_RATE_MIN, config.HTTP_RATE_MAX)
+    try:
+        run_shard(start_height, end_height, path, progress)
+    except CacheMiss as e:
+        print(f"[分片 {start_height}~{end_height}] {e}，離線重播結束。")
+    except LookupError as e:
+        print(f"[分片 {start_height}~{end_height}] {e}，重試 {BLOCK_PARSE_RETRIES} 次仍失敗，停止此分片。")
+        raise SystemExit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(shards, progress_total):
+    """平行執行未完成的分片，異常結束的行程從自己的進度重啟，回傳是否全部完成。"""
+    progress = multiprocessing.Queue()
+    procs = {}
+    restarts = {}
+    for shard in shards:
+        procs[shard] = multiprocessing.Process(target=_worker, args=(*shard, progress, len(shards)), daemon=True)
+        procs[shard].start()
+    done = 0
+    started = time.monotonic()
+    last_report = started
+    try:
+        while procs:
+            try:
+                done += progress.get(timeout=1)
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            if now - last_report >= 10:
+                last_report = now
+                rate = done / (now - started)
+                print(f"[回補] 已完成 {done}/{progress_total} 塊，{rate:.2f} 塊/秒，{len(procs)} 個行程執行中")
+            for shard, proc in list(procs.items()):
+                if proc.is_alive():
+                    continue
+                del procs[shard]
+                if proc.exitcode == 0:
+                    continue
+                restarts[shard] = restarts.get(shard, 0) + 1
+                if restarts[shard] > MAX_RESTARTS:
+                    print(f"分片 {shard[0]}~{shard[1]} 重啟 {MAX_RESTARTS} 次仍失敗，請稍後以 --shard 重新執行。")
+                    continue
+                print(f"分片 {shard[0]}~{shard[1]} 異常結束（exit {proc.exitcode}），從進度重新啟動...")
+                procs[shard] = multiprocessing.Process(target=_worker, args=(*shard, progress, len(shards)), daemon=True)
+                procs[shard].start()
+    except KeyboardInterrupt:
+        print("\n偵測到中斷 (Ctrl+C)，等待各行程提交已完成的區塊...")
+        for proc in procs.values():
+            proc.join()
+        return False
+    elapsed = time.monotonic() - started
+    print(f"[回補] 共完成 {done} 塊，耗時 {elapsed:.1f} 秒（{done / elapsed if elapsed else 0:.2f} 塊/秒）")
+    return all(shard_progress(path) == end for _, end, path in shards)
+
+
+def merge_shard(writer, path):
+    """將一個分片的區塊資料合併進主資料庫（同一區塊以分片為準），回傳合併的區塊數。"""
+    with writer.lock:
+        writer.flush()
+        conn = writer.conn
+        conn.execute('ATTACH DATABASE ? AS shard', (path,))
+        try:
+            c = conn.cursor()
+            c.execute('INSERT OR IGNORE INTO main.address (address) SELECT address FROM shard.address ORDER BY id')
+            c.execute('''DELETE FROM main.block_output
+                         WHERE block_height IN (SELECT block_height FROM shard.block_summary)''')
+            c.execute('INSERT OR REPLACE INTO main.block_summary SELECT * FROM shard.block_summary')
+            c.execute('INSERT OR REPLACE INTO main.block_hash SELECT * FROM shard.block_hash')
+            # 分片的地址編號與主資料庫不同，依地址字串重新對應
+            c.execute('''INSERT OR REPLACE INTO main.block_output (txid, address_id, block_height, tx_amount, amount)
+                         SELECT o.txid, m.id, o.block_height, o.tx_amount, o.amount
+                         FROM shard.block_output o
+                         JOIN shard.address sa ON sa.id = o.address_id
+                         JOIN main.address m ON m.address = sa.address
+                         ORDER BY o.rowid''')
+            count = c.execute('SELECT COUNT(*) FROM shard.block_summary').fetchone()[0]
+            conn.commit()
+        finally:
+            conn.execute('DETACH DATABASE shard')
+    return count
+
+
+def merge_shards(shards, start_height, end_height, keep=False):
+    """依高度順序合併所有分片，重建該範圍的 block/tx 並標記待更新餘額的地址。"""
+    writer = get_writer()
+    init_schema(writer.conn)
+    for start, end, path in shards:
+        count = merge_shard(writer, path)
+        print(f"已合併分片 {start}~{end}（{count} 塊）")
+    with writer.lock:
+        blocks = rebuild_transfers(writer.conn, config.THRESHOLD, start_height, end_height)
+        addresses = [row[0] for row in writer.query(
+            '''SELECT DISTINCT a.address FROM tx JOIN address a ON a.id = tx.address_id
+               WHERE tx.block_height BETWEEN ? AND ?''', (start_height, end_height))]
+        mark_dirty(writer, addresses, start_height)
+        # 自動查詢模式的進度若正好停在回補範圍之前（或範圍內），直接接到範圍之後
+        state = load_scan_state(writer.conn, 'main')
+        if state and start_height - 1 <= state[2] < end_height:
+            save_scan_state(writer, 'main', state[0], state[1], end_height)
+        writer.flush()
+    print(f"已依閾值 {config.THRESHOLD} SCASH 重建 {blocks} 個區塊，{len(addresses)} 個地址待更新餘額。")
+    if not keep:
+        for _, _, path in shards:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    export_dashboard_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('start', type=int, help='起始區塊高度')
+    parser.add_argument('end', type=int, help='結束區塊高度（含）')
+    parser.add_argument('--workers', type=int, default=config.BACKFILL_WORKERS, help='工作行程數')
+    parser.add_argument('--shard', type=int, help='只在目前行程執行第幾段（從 1 開始），不合併')
+    parser.add_argument('--merge-only', action='store_true', help='不掃描，只合併已完成的分片')
+    parser.add_argument('--keep', action='store_true', help='合併後保留分片檔')
+    args = parser.parse_args()
+    if args.end < args.start:
+        parser.error('結束高度不可小於起始高度')
+    shards = plan_shards(args.start, args.end, args.workers)
+    if args.shard is not None:
+        if not 1 <= args.shard <= len(shards):
+            parser.error(f'--shard 需介於 1 ~ {len(shards)}')
+        start, end, path = shards[args.shard - 1]
+        print(f"執行分片 {start}~{end}（{path}）")
+        run_shard(start, end, path)
+        return
+    pending = [s for s in shards if shard_progress(s[2]) != s[1]]
+    if pending and not args.merge_only:
+        remaining = sum(s[1] - (shard_progress(s[2]) or s[0] - 1) for s in pending)
+        print(f"回補區塊 {args.start}~{args.end}：{len(shards)} 段，尚有 {len(pending)} 段、{remaining} 塊未完成")
+        if not run_workers(pending, remaining):
+            print("仍有分片未完成，重新執行相同指令即可從進度繼續。")
+            return
+    elif pending:
+        print(f"尚有 {len(pending)} 段分片未完成，無法合併。")
+        return
+    merge_shards(shards, args.start, args.end, keep=args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+地址餘額查詢紀錄的共用快取，所有掃描模式與手動查詢共用同一份（get_balance_cache）。
+
+- 記憶體內以 OrderedDict 保存「地址 → 上次查詢時間」，最多 BALANCE_CACHE_SIZE 筆，超過時淘汰最久未使用的地址（LRU）
+- 每筆紀錄 ADDRESS_REFRESH_TTL 秒後過期：每個區塊都會出現的交易所地址，每個 TTL 最多重新查詢一次
+- 查詢時間同時寫入 address_refresh 表，記憶體沒有的地址會回頭查表，重新啟動或被淘汰後仍有效
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import config
+import metrics
+from scash_db import address_refresh_time, get_writer, load_refresh_times, mark_address_refreshed
+
+
+class BalanceCache:
+    """有容量上限與 TTL 的地址查詢時間快取，可跨執行緒共用；`address in cache` 代表餘額仍算新鮮。"""
+
+    def __init__(self, db=None, ttl=None, max_size=None):
+        self.db = db or get_writer()
+        self._ttl = ttl
+        self.max_size = max(1, max_size or config.BALANCE_CACHE_SIZE)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        for address, when in load_refresh_times(self.db, self.ttl, self.max_size):
+            self.entries[address] = when
+
+    @property
+    def ttl(self):
+        # 未指定時每次讀取設定，設定模式修改後立即生效
+        return config.ADDRESS_REFRESH_TTL if self._ttl is None else self._ttl
+
+    def _put(self, address, when):
+        self.entries[address] = when
+        self.entries.move_to_end(address)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def is_fresh(self, address):
+        """address 是否在 TTL 內查詢過餘額。"""
+        now = time.time()
+        with self.lock:
+            when = self.entries.get(address)
+            if when is not None:
+                if now - when < self.ttl:
+                    self.entries.move_to_end(address)
+                    metrics.inc('balance_cache_requests_total', result='hit')
+                    return True
+                del self.entries[address]
+                metrics.inc('balance_cache_requests_total', result='expired')
+                return False
+        # 不在記憶體內：可能被淘汰或由其他行程查詢過，回頭查 address_refresh（不持有快取鎖，避免與寫入鎖互相等待）
+        when = address_refresh_time(self.db, address)
+        if when is None or now - when >= self.ttl:
+            metrics.inc('balance_cache_requests_total', result='miss')
+            return False
+        with self.lock:
+            self._put(address, when)
+        metrics.inc('balance_cache_requests_total', result='db_hit')
+        return True
+
+    __contains__ = is_fresh
+
+    def mark(self, address, db=None, when=None):
+        """記錄 address 剛查詢過餘額；指定 db 時一併寫入 address_refresh（隨呼叫端的批次提交）。"""
+        when = time.time() if when is None else when
+        if db is not None:
+            mark_address_refreshed(db, address, when)
+        with self.lock:
+            self._put(address, when)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_balance_cache():
+    """取得共用的 BalanceCache（第一次呼叫時由 address_refresh 載入最近的紀錄）。"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = BalanceCache()
+        return _cache
@@ -0,0 +1,134 @@
+"""
+地址餘額增量更新。
+
+取代原本每次都逐一查詢所有地址的做法：
+- 新寫入 tx 的地址會記在 address_dirty 表（與區塊同一次提交），優先重新查詢；
+  ADDRESS_REFRESH_TTL 內查過的地址等到過期才查詢
+- 其餘地址以慢速輪詢補查，依「餘額 × 距上次查詢的秒數」排序，大戶與久未查詢的地址優先，
+  BALANCE_SWEEP_MIN_AGE 秒內查過的地址不會再查
+- 以 BALANCE_REFRESH_WORKERS 個執行緒同時查詢，每 BALANCE_REFRESH_BATCH 個地址寫入並提交一次，
+  中途中斷時已完成的批次不會遺失（查詢時間記在 address_refresh 表）
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config
+import metrics
+from balance_cache import get_balance_cache
+from data_source import get_source
+from scash_db import SAT, address_ids, find_address_id, get_writer, to_sat
+
+
+def store_balance(db, address, balance, threshold=None):
+    """
+    寫入地址餘額：已有紀錄時若餘額變動則更新並記錄變化量，
+    沒有紀錄時只新增達到閾值的地址。回傳是否有寫入。
+    餘額以整數聰比較，不需要浮點誤差容忍。
+    """
+    threshold = config.THRESHOLD if threshold is None else threshold
+    now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    balance_sat = to_sat(balance)
+    addr_id = find_address_id(db, address)
+    row = None
+    if addr_id is not None:
+        row = db.execute('SELECT balance, update_count FROM scash_address_balances WHERE address_id=?',
+                         (addr_id,)).fetchone()
+    if row:
+        last_balance, update_count = row
+        diff = balance_sat - last_balance if last_balance is not None else 0
+        if diff == 0:
+            return False
+        # diff > 0 顯示 +，diff < 0 顯示 -
+        change_str = f"{diff / SAT:+.8f}"
+        db.execute('''UPDATE scash_address_balances SET balance=?, update_time=?, update_count=?, change_str=? WHERE address_id=?''',
+                   (balance_sat, now_str, (update_count or 0) + 1, change_str, addr_id))
+        return True
+    if balance < threshold:
+        return False
+    if addr_id is None:
+        addr_id = address_ids(db, [address])[address]
+    db.execute('''INSERT INTO scash_address_balances (address_id, balance, scan_time, update_time, update_count, change_str)
+                  VALUES (?, ?, ?, ?, ?, ?)''',
+               (addr_id, balance_sat, now_str, '', 0, ''))
+    return True
+
+
+def mark_dirty(db, addresses, block_height):
+    """記錄因新交易而需要重新查詢餘額的地址。"""
+    db.executemany('INSERT OR IGNORE INTO address_dirty (address, block_height) VALUES (?, ?)',
+                   [(address, block_height) for address in addresses])
+
+
+def pending_dirty(limit=None):
+    """
+    待重新查詢的地址（依區塊高度）。ADDRESS_REFRESH_TTL 內已查過的地址略過但保留在 address_dirty，
+    過期後才查詢，每個區塊都出現的熱門地址每個 TTL 最多查詢一次。
+    """
+    cache = get_balance_cache()
+    rows = get_writer().query('SELECT address FROM address_dirty ORDER BY block_height')
+    addresses = [row[0] for row in rows if row[0] not in cache]
+    return addresses[:limit] if limit else addresses
+
+
+def pick_stale(limit, min_age=None):
+    """挑出最該補查的地址：餘額越大、越久沒查詢者越優先。"""
+    min_age = config.BALANCE_SWEEP_MIN_AGE if min_age is None else min_age
+    now = time.time()
+    rows = get_writer().query('''SELECT a.address FROM scash_address_balances b
+                                 JOIN address a ON a.id = b.address_id
+                                 LEFT JOIN address_refresh r ON r.address = a.address
+                                 WHERE COALESCE(r.refresh_time, 0) <= ?
+                                 ORDER BY MAX(b.balance, 0) * (? - COALESCE(r.refresh_time, 0)) DESC
+                                 LIMIT ?''', (now - min_age, now, limit))
+    return [row[0] for row in rows]
+
+
+def _fetch_balance(address):
+    metrics.inc('addresses_total')
+    try:
+        balance, error = get_source().get_address_balance(address)
+    except Exception as e:
+        return address, None, str(e)
+    return address, balance, error
+
+
+def refresh_addresses(addresses, workers=None, batch_size=None, progress=None):
+    """
+    同時查詢多個地址的餘額並分批寫入，回傳 (已查詢, 已更新)。
+    查詢失敗的地址保留在 address_dirty，下次再試。
+    """
+    workers = max(1, workers or config.BALANCE_REFRESH_WORKERS)
+    batch_size = max(1, batch_size or config.BALANCE_REFRESH_BATCH)
+    writer = get_writer()
+    checked = updated = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(addresses), batch_size):
+            results = list(pool.map(_fetch_balance, addresses[start:start + batch_size]))
+            with writer.lock:
+                for address, balance, error in results:
+                    if balance is None:
+                        if error:
+                            print(f"查詢地址 {address} 餘額失敗: {error}")
+                        continue
+                    checked += 1
+                    if store_balance(writer, address, balance):
+                        updated += 1
+                    get_balance_cache().mark(address, writer)
+                    writer.execute('DELETE FROM address_dirty WHERE address=?', (address,))
+                writer.flush()
+            if progress:
+                progress(min(start + batch_size, len(addresses)), len(addresses))
+    return checked, updated
+
+
+def refresh_pending(sweep_limit=None, progress=None):
+    """先更新新交易涉及的地址，再補查最多 sweep_limit 個久未查詢的地址，回傳 (已查詢, 已更新)。"""
+    sweep_limit = config.BALANCE_SWEEP_BATCH if sweep_limit is None else sweep_limit
+    addresses = pending_dirty()
+    if sweep_limit > 0:
+        seen = set(addresses)
+        addresses += [a for a in pick_stale(sweep_limit) if a not in seen]
+    if not addresses:
+        return 0, 0
+    return refresh_addresses(addresses, progress=progress)
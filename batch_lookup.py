@@ -0,0 +1,241 @@
+"""
+批次查詢：一次查詢大量區塊高度、TxID 與地址（例如交易所事故後逐一核對），結果以 JSON lines 輸出。
+
+用法：
+    python batch_lookup.py queries.txt [--workers 8] [--out results.jsonl] [--live | --offline]
+    cat txids.txt | python batch_lookup.py -
+
+- 每行一個查詢，可混合；分類方式與手動查詢模式相同（純數字為區塊高度、scash1 開頭為地址、
+  64 位 16 進位為 TxID），空行與 # 開頭的行略過，無法辨識的行輸出一筆 error
+- 先查本機資料庫（block_summary/block_output、tx、scash_address_balances），查不到才經由資料來源查詢
+  （區塊與交易頁會先查頁面快取）；地址在 ADDRESS_REFRESH_TTL 內查過餘額時直接回傳資料庫中的餘額
+- 以 BATCH_LOOKUP_WORKERS 個執行緒同時查詢，連線共用 http_client 的連線池與限速器；
+  每筆查完立即輸出一行，順序與輸入不同，以 line（輸入的行號，由 1 起算）對應；重複的查詢只查一次
+- 只讀取，不寫入資料庫，可與掃描程式同時執行
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+from api_server import ApiError, ConnectionPool, api_address, api_tx
+from data_source import collect_tx_outputs, get_source
+from scash_db import from_sat, txid_hex
+
+BLOCK = 'block'
+TX = 'tx'
+ADDRESS = 'address'
+
+_HEIGHT_RE = re.compile(r'[0-9]+')
+_TXID_RE = re.compile(r'[0-9a-fA-F]{64}')
+
+
+def classify_query(text):
+    """回傳 (類型, 值)：區塊高度為 int，TxID 轉為小寫；無法辨識時類型為 None。"""
+    # 只接受 ASCII 數字；str.isdigit() 對「²」等字元也成立，int() 會失敗
+    if _HEIGHT_RE.fullmatch(text):
+        return BLOCK, int(text)
+    if text.startswith('scash1'):
+        return ADDRESS, text
+    if _TXID_RE.fullmatch(text):
+        return TX, text.lower()
+    return None, text
+
+
+def read_queries(lines):
+    """略過空行與註解，回傳 [(行號, 原始字串)]。"""
+    queries = []
+    for lineno, line in enumerate(lines, 1):
+        text = line.strip()
+        if text and not text.startswith('#'):
+            queries.append((lineno, text))
+    return queries
+
+
+def _db_block(conn, height):
+    row = conn.execute('SELECT block_time, total_amount, tx_count FROM block_summary WHERE block_height=?',
+                       (height,)).fetchone()
+    if row is None:
+        return None
+    txs = {}
+    for txid, address, tx_amount, amount in conn.execute(
+            '''SELECT o.txid, a.address, o.tx_amount, o.amount
+               FROM block_output o JOIN address a ON a.id = o.address_id
+               WHERE o.block_height=? ORDER BY o.rowid''', (height,)):
+        tx = txs.get(txid)
+        if tx is None:
+            tx = txs[txid] = {'txid': txid_hex(txid), 'amount': from_sat(tx_amount), 'outputs': []}
+        tx['outputs'].append({'address': address, 'amount': from_sat(amount)})
+    return {'block_height': height, 'time': row[0], 'total_amount': row[1], 'tx_count': row[2],
+            'txs': list(txs.values())}
+
+
+def _fetch_block(height):
+    source = get_source()
+    raw = source.fetch_blocks([height])[0]
+    if isinstance(raw, Exception):
+        raise raw
+    page = source.parse_block(height, raw)
+    if page.total_error:
+        raise LookupError(page.total_error)
+    txs = [{'txid': txid, 'amount': tx_amount, 'outputs': [{'address': a, 'amount': v} for a, v in outputs]}
+           for txid, tx_amount, _, outputs in collect_tx_outputs(page, source)]
+    return {'block_height': height, 'time': page.time_str, 'total_amount': page.total_amount,
+            'tx_count': len(txs), 'txs': txs}
+
+
+def _db_tx(conn, txid):
+    try:
+        return api_tx(conn, {}, txid)
+    except ApiError:
+        return None
+
+
+def _fetch_tx(txid):
+    total, outputs = get_source().get_tx_outputs(txid)
+    if total is None:
+        raise LookupError('查無此交易')
+    return {'txid': txid, 'tx_amount': total, 'outputs': [{'address': a, 'amount': v} for a, v in outputs]}
+
+
+def _db_address(conn, address, fresh_only):
+    try:
+        result = api_address(conn, {}, address)
+    except ApiError:
+        return None
+    refreshed = result.get('refresh_time')
+    # 只採用 ADDRESS_REFRESH_TTL 內查過的餘額，過期的改為連線查詢
+    if fresh_only and (refreshed is None or time.time() - refreshed > config.ADDRESS_REFRESH_TTL):
+        return None
+    return result
+
+
+def _fetch_address(address):
+    if config.CACHE_ONLY:
+        raise LookupError('資料庫中沒有這個地址，離線時不查詢地址餘額')
+    balance, error = get_source().get_address_balance(address)
+    if balance is None:
+        raise LookupError(error or '查詢失敗，請確認地址正確')
+    return {'address': address, 'balance': balance}
+
+
+def resolve(kind, value, pool=None):
+    """
+    查詢一筆，回傳 (來源, 結果)：來源為 'db'（本機資料庫）或 'fetch'（資料來源，區塊與交易可能來自頁面快取）。
+    pool 為 None 時不查資料庫；CACHE_ONLY 時地址也接受過期的餘額。查詢失敗時拋出例外。
+    """
+    if pool is not None:
+        with pool.acquire() as conn:
+            if kind == BLOCK:
+                result = _db_block(conn, value)
+            elif kind == TX:
+                result = _db_tx(conn, value)
+            else:
+                result = _db_address(conn, value, fresh_only=not config.CACHE_ONLY)
+        if result is not None:
+            return 'db', result
+    if kind == BLOCK:
+        return 'fetch', _fetch_block(value)
+    if kind == TX:
+        return 'fetch', _fetch_tx(value)
+    return 'fetch', _fetch_address(value)
+
+
+def _open_pool(db_file, size):
+    db_file = db_file or config.DB_FILE
+    if not os.path.exists(db_file):
+        return None
+    try:
+        return ConnectionPool(db_file, size)
+    except sqlite3.Error as e:
+        print(f"無法開啟資料庫 {db_file}，只使用連線查詢: {e}", file=sys.stderr)
+        return None
+
+
+def run_batch(lines, out, workers=None, use_db=True, db_file=None):
+    """
+    查詢 lines 中的每一行，每筆完成就以一行 JSON 寫入 out（文字檔物件），回傳各來源的筆數統計。
+    use_db 為 False 時不查資料庫，全部經由資料來源查詢。
+    """
+    workers = workers or config.BATCH_LOOKUP_WORKERS
+    queries = read_queries(lines)
+    pool = _open_pool(db_file, workers) if use_db else None
+    counts = {'db': 0, 'fetch': 0, 'error': 0}
+    lock = threading.Lock()
+
+    def emit(record):
+        with lock:
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+
+    def lookup(key):
+        try:
+            return resolve(*key, pool=pool), None
+        except Exception as e:
+            return None, str(e) or type(e).__name__
+
+    try:
+        pending = {}  # (類型, 值) -> [(行號, 原始字串)]，重複的查詢只查一次
+        for lineno, text in queries:
+            kind, value = classify_query(text)
+            if kind is None:
+                counts['error'] += 1
+                emit({'line': lineno, 'query': text, 'error': '輸入格式錯誤'})
+                continue
+            pending.setdefault((kind, value), []).append((lineno, text))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(lookup, key): key for key in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                found, error = future.result()
+                for lineno, text in pending[key]:
+                    record = {'line': lineno, 'query': text, 'type': key[0]}
+                    if error is None:
+                        record['source'], record['result'] = found
+                        counts[found[0]] += 1
+                    else:
+                        record['error'] = error
+                        counts['error'] += 1
+                    emit(record)
+    finally:
+        if pool is not None:
+            pool.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input', help="查詢清單檔案，每行一個區塊高度、TxID 或地址（'-' 為標準輸入）")
+    parser.add_argument('--out', default='-', help="輸出的 JSON lines 檔案（預設為標準輸出）")
+    parser.add_argument('--workers', type=int, default=None, help='同時查詢的執行緒數（預設 BATCH_LOOKUP_WORKERS）')
+    parser.add_argument('--db', help='資料庫檔（預設為 config.DB_FILE）')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--live', action='store_true', help='不查資料庫，全部連線查詢')
+    group.add_argument('--offline', action='store_true', help='只查資料庫與頁面快取，不連線')
+    args = parser.parse_args()
+
+    if args.offline:
+        config.CACHE_ONLY = True  # 區塊與交易只從頁面快取讀取，地址只查資料庫
+    if args.input == '-':
+        lines = sys.stdin.readlines()
+    else:
+        with open(args.input, encoding='utf-8') as f:
+            lines = f.readlines()
+    started = time.time()
+    if args.out == '-':
+        counts = run_batch(lines, sys.stdout, args.workers, not args.live, args.db)
+    else:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            counts = run_batch(lines, f, args.workers, not args.live, args.db)
+    print(f"完成 {sum(counts.values())} 筆（資料庫 {counts['db']}、資料來源 {counts['fetch']}、錯誤 {counts['error']}），"
+          f"耗時 {time.time() - started:.1f} 秒", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+將 tx 與 scash_address_balances 串流匯出為 NDJSON、CSV 或 Parquet，供分析使用。
+
+用法：
+    python bulk_export.py tx --format csv --out tx.csv [--from 1000] [--to 2000] [--min-amount 100] [--address scash1...]
+    python bulk_export.py balances --format parquet --out balances.parquet [--min-balance 10]
+    python bulk_export.py tx --format ndjson --out tx_new.ndjson.gz --state nightly.json   # 只匯出上次之後的新資料
+
+- 以唯讀連線在單一讀取交易中查詢（與掃描程式同時執行也是一致的快照），每次 fetchmany 一批
+  BULK_CHUNK_ROWS 列就寫出，記憶體用量與資料庫大小無關
+- tx 依區塊高度排序，由 idx_tx_height / idx_tx_address 逐段讀取，不需要整表排序
+- 金額同時輸出整數聰（*_sat，精確值）與 SCASH；txid 輸出為 16 進位字串
+- --since 只匯出該高度之後的轉帳（balances 則為 --updated-since 起新增或有變動的地址，同一秒的列可能重複，請以地址去重）；
+  --state 記錄每次匯出到的高度/時間，下次自動接續，排程每晚只需傳送新增的列
+- 輸出檔先寫入 .tmp 再替換，中斷時不會留下不完整的檔案；檔名以 .gz 結尾時以 gzip 壓縮（NDJSON/CSV）
+- Parquet 需要另外安裝 pyarrow，每批寫成一個 row group
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+from scash_db import connect, find_address_id, from_sat, to_sat, txid_hex
+
+BULK_CHUNK_ROWS = 10000  # 每批讀取與寫出的列數
+
+TX_COLUMNS = ('block_height', 'txid', 'address', 'amount_sat', 'amount', 'transfer_time')
+BALANCE_COLUMNS = ('address', 'balance_sat', 'balance', 'change_str', 'update_count', 'scan_time', 'update_time')
+# Parquet 欄位型別（pyarrow 型別名稱）
+PARQUET_TYPES = {
+    'block_height': 'int64', 'txid': 'string', 'address': 'string', 'amount_sat': 'int64', 'amount': 'float64',
+    'transfer_time': 'string', 'balance_sat': 'int64', 'balance': 'float64', 'change_str': 'string',
+    'update_count': 'int64', 'scan_time': 'string', 'update_time': 'string',
+}
+# CSV 中以固定 8 位小數輸出的欄位，避免極小金額變成科學記號
+DECIMAL_COLUMNS = ('amount', 'balance')
+
+
+def tx_query(conn, start=None, end=None, min_amount=None, address=None):
+    """tx 匯出的 SQL 與參數；address 不在資料庫時回傳 None。"""
+    where = ['t.block_height BETWEEN ? AND ?']
+    params = [start if start is not None else 0, end if end is not None else 2 ** 62]
+    if min_amount is not None:
+        where.append('t.amount >= ?')
+        params.append(to_sat(min_amount))
+    if address is not None:
+        address_id = find_address_id(conn, address)
+        if address_id is None:
+            return None
+        where.append('t.address_id = ?')
+        params.append(address_id)
+    sql = f'''SELECT t.block_height, t.txid, a.address, t.amount, t.transfer_time
+              FROM tx t JOIN address a ON a.id = t.address_id
+              WHERE {' AND '.join(where)}
+              ORDER BY t.block_height, t.txid, t.address_id'''
+    return sql, params
+
+
+def tx_row(row):
+    return (row[0], txid_hex(row[1]), row[2], row[3], from_sat(row[3]), row[4])
+
+
+def balance_query(conn, min_balance=None, address=None, updated_since=None):
+    """balances 匯出的 SQL 與參數；依餘額由大到小排序。"""
+    where = ['1']
+    params = []
+    if min_balance is not None:
+        where.append('b.balance >= ?')
+        params.append(to_sat(min_balance))
+    if address is not None:
+        where.append('a.address = ?')
+        params.append(address)
+    if updated_since:
+        # 新地址只有 scan_time，之後的餘額變動才寫 update_time；時間只到秒，含等號避免漏掉同一秒稍後寫入的列
+        where.append("MAX(COALESCE(b.update_time, ''), COALESCE(b.scan_time, '')) >= ?")
+        params.append(updated_since)
+    sql = f'''SELECT a.address, b.balance, b.change_str, b.update_count, b.scan_time, b.update_time
+              FROM scash_address_balances b JOIN address a ON a.id = b.address_id
+              WHERE {' AND '.join(where)}
+              ORDER BY b.balance DESC, b.address_id'''
+    return sql, params
+
+
+def balance_row(row):
+    return (row[0], row[1], from_sat(row[1]), row[2], row[3], row[4], row[5])
+
+
+def _open_text(path, compress=False):
+    if path is None:
+        return io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='')
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def _close_text(f):
+    if f.buffer is sys.stdout.buffer:
+        f.flush()
+        f.detach()  # 不關閉標準輸出
+    else:
+        f.close()
+
+
+class NdjsonWriter:
+    """每列一個 JSON 物件。path 為 None 時寫到標準輸出。"""
+
+    def __init__(self, path, columns, compress=False):
+        self.f = _open_text(path, compress)
+        self.columns = columns
+
+    def write(self, rows):
+        self.f.write(''.join(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + '\n' for row in rows))
+
+    def close(self):
+        _close_text(self.f)
+
+
+class CsvWriter:
+    """第一列為欄位名稱，金額以固定 8 位小數輸出。"""
+
+    def __init__(self, path, columns, compress=False):
+        self.f = _open_text(path, compress)
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(columns)
+        self.decimals = [i for i, name in enumerate(columns) if name in DECIMAL_COLUMNS]
+
+    def write(self, rows):
+        for row in rows:
+            row = list(row)
+            for i in self.decimals:
+                if row[i] is not None:
+                    row[i] = f'{row[i]:.8f}'
+            self.writer.writerow(row)
+
+    def close(self):
+        _close_text(self.f)
+
+
+class ParquetWriter:
+    """每批寫成一個 row group（Parquet 本身已壓縮，不再另外 gzip）。"""
+
+    def __init__(self, path, columns, compress=False):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit('匯出 Parquet 需要 pyarrow：pip3 install pyarrow')
+        if path is None:
+            raise SystemExit('Parquet 無法輸出到標準輸出，請以 --out 指定檔名')
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(name, getattr(pa, PARQUET_TYPES[name])()) for name in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        arrays = [self.pa.array([row[i] for row in rows], type=field.type)
+                  for i, field in enumerate(self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'ndjson': NdjsonWriter, 'csv': CsvWriter, 'parquet': ParquetWriter}
+
+
+def export_rows(cursor, convert, writer, chunk_rows=None):
+    """逐批讀取查詢結果並寫出，回傳列數。"""
+    chunk_rows = chunk_rows or BULK_CHUNK_ROWS
+    total = 0
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return total
+        writer.write([convert(row) for row in rows])
+        total += len(rows)
+
+
+def bulk_export(table, fmt, out, db_file=None, start=None, end=None, min_amount=None, address=None,
+                updated_since=None, chunk_rows=None):
+    """
+    匯出一個資料表，回傳 (列數, 接續點)：tx 的接續點為這次匯出到的最高區塊，balances 為最新的 scan_time / update_time。
+    out 為 '-' 時寫到標準輸出，否則先寫暫存檔再替換。
+    """
+    conn = connect(db_file, readonly=True)
+    conn.execute('PRAGMA cache_size=-8192')  # 循序讀取用不到大快取，限制為 8 MB，記憶體不隨資料庫成長
+    tmp = None if out == '-' else out + '.tmp'
+    writer = None
+    try:
+        conn.execute('BEGIN')  # 整個匯出在同一個讀取快照中進行
+        if table == 'tx':
+            mark = conn.execute('SELECT COALESCE(MAX(block_height), 0) FROM tx').fetchone()[0]
+            end = mark = mark if end is None else min(end, mark)
+            query = tx_query(conn, start, end, min_amount, address)
+            columns, convert = TX_COLUMNS, tx_row
+        else:
+            mark = conn.execute("""SELECT MAX(MAX(COALESCE(update_time, ''), COALESCE(scan_time, '')))
+                                   FROM scash_address_balances""").fetchone()[0]
+            query = balance_query(conn, min_amount, address, updated_since)
+            columns, convert = BALANCE_COLUMNS, balance_row
+        writer = WRITERS[fmt](tmp, columns, compress=out.endswith('.gz'))
+        total = 0
+        if query is not None:
+            total = export_rows(conn.execute(*query), convert, writer, chunk_rows)
+        writer.close()
+        writer = None
+        if tmp is not None:
+            os.replace(tmp, out)
+        return total, mark
+    finally:
+        if writer is not None:
+            writer.close()
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)  # 匯出失敗時不留下不完整的暫存檔
+        conn.close()
+
+
+def _load_state(path):
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def _save_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('table', choices=('tx', 'balances'), help='要匯出的資料')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='ndjson', help='輸出格式')
+    parser.add_argument('--out', default='-', help="輸出檔名（'-' 為標準輸出，.gz 結尾時壓縮）")
+    parser.add_argument('--db', help='資料庫檔（預設為 config.DB_FILE）')
+    parser.add_argument('--from', dest='start', type=int, help='tx：起始區塊高度（含）')
+    parser.add_argument('--to', dest='end', type=int, help='tx：結束區塊高度（含）')
+    parser.add_argument('--since', type=int, help='tx：只匯出此高度之後（不含）的轉帳')
+    parser.add_argument('--min-amount', type=float, help='tx：最小轉帳金額（SCASH）')
+    parser.add_argument('--min-balance', type=float, help='balances：最小餘額（SCASH）')
+    parser.add_argument('--updated-since', help="balances：只匯出此時間之後新增或有變動的地址（'YYYY-MM-DD HH:MM:SS'）")
+    parser.add_argument('--address', help='只匯出此地址')
+    parser.add_argument('--state', help='增量匯出的狀態檔：讀取上次的接續點，成功後更新')
+    parser.add_argument('--chunk', type=int, default=BULK_CHUNK_ROWS, help='每批讀取與寫出的列數')
+    args = parser.parse_args()
+
+    state = _load_state(args.state)
+    start = args.start
+    updated_since = args.updated_since
+    if args.table == 'tx':
+        since = args.since if args.since is not None else state.get('tx')
+        if since is not None:
+            start = max(start or 0, since + 1)
+        min_amount = args.min_amount
+    else:
+        updated_since = updated_since or state.get('balances')
+        min_amount = args.min_balance
+    total, mark = bulk_export(args.table, args.format, args.out, args.db, start, args.end, min_amount,
+                              args.address, updated_since, args.chunk)
+    if args.state and mark is not None:
+        state[args.table] = max(mark, state.get(args.table, mark))  # 接續點不倒退
+        _save_state(args.state, state)
+    print(f"已匯出 {total} 列 {args.table}（{args.format}）" + (f"，接續點 {state.get(args.table)}" if args.state else ''),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
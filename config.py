@@ -4,5 +4,52 @@ THRESHOLD = 0.01  # 大額轉帳的閾值（單位：SCASH）
 BASE_URL = 'https://scash.one'  # SCASH 區塊鏈的基礎 URL
 DB_FILE = 'scash_data.db'  # 資料儲存用 SQLite 檔案名稱
 SHOW_RESULT = True  # 是否顯示查詢結果
-SCAN_INTERVAL = 0.01  # 自動查詢間隔秒數
-SCAN_TRUE = True  # 自動查詢模式是否自動更新所有地址餘額
+SCAN_TRUE = True  # 自動查詢模式等待新區塊時是否更新地址餘額
+SCAN_WORKERS = 1  # 平行掃描的工作執行緒數（1 為逐塊掃描）
+PARSE_WORKERS = 4  # 平行掃描時解析階段的執行緒數
+PIPELINE_QUEUE_SIZE = 32  # 平行掃描各階段之間的佇列上限
+HTTP_POOL_SIZE = 16  # HTTP 連線池大小
+HTTP_TIMEOUT = 10  # 單次 HTTP 請求逾時秒數
+HTTP_RETRIES = 10  # HTTP 請求最多嘗試次數
+HTTP_BACKOFF_BASE = 1  # 重試退避的起始秒數（指數成長並加入隨機抖動）
+HTTP_BACKOFF_MAX = 60  # 重試退避的最長等待秒數
+DATA_SOURCE = 'explorer'  # 區塊資料來源：'explorer'（爬取網頁）或 'rpc'（本機節點 JSON-RPC）
+RPC_URL = 'http://127.0.0.1:8332'  # 節點 JSON-RPC 位址
+RPC_USER = ''  # 節點 JSON-RPC 使用者名稱
+RPC_PASSWORD = ''  # 節點 JSON-RPC 密碼
+RPC_BATCH_SIZE = 20  # 單次 JSON-RPC 批次請求的區塊數
+PAGE_CACHE_FILE = 'page_cache.db'  # 區塊/交易頁面快取檔（'' 表示停用）
+PAGE_CACHE_MAX_MB = 2048  # 頁面快取大小上限（MB），超過時淘汰最久未使用的頁面
+PAGE_CACHE_TIP_MARGIN = 6  # 距最高區塊幾塊以內的頁面不寫入快取
+CACHE_ONLY = False  # 離線重播模式：只從快取讀取頁面，不連網
+WRITER_BATCH_ROWS = 500  # 資料庫累積多少列寫入才提交一次
+WRITER_BATCH_SECONDS = 2.0  # 距上次提交超過幾秒就提交
+ADDRESS_REFRESH_TTL = 21600  # 地址餘額查詢後幾秒內不再重複查詢（跨重新啟動）
+BALANCE_REFRESH_WORKERS = 4  # 同時查詢地址餘額的執行緒數
+BALANCE_REFRESH_BATCH = 50  # 地址餘額每批寫入並提交的地址數
+BALANCE_SWEEP_BATCH = 50  # 每次等待新區塊時補查的久未查詢地址數
+BALANCE_SWEEP_MIN_AGE = 3600  # 地址餘額距上次查詢超過幾秒才會被補查
+FOLLOW_POLL_INTERVAL = 5  # 追蹤鏈頂模式輪詢新區塊的間隔秒數
+REORG_MAX_DEPTH = 20  # 偵測到分叉時最多往回比對幾個區塊
+DASHBOARD_TX_PAGE_SIZE = 100  # 儀表板大額轉帳每個分頁檔的筆數
+DASHBOARD_RANK_TOP_N = 100  # 儀表板排行榜匯出的名次數
+API_HOST = '127.0.0.1'  # 查詢 API（api_server.py）監聽位址
+API_PORT = 8800  # 查詢 API 監聽埠
+API_PAGE_SIZE = 100  # 查詢 API 列表端點預設每頁筆數
+API_MAX_PAGE_SIZE = 1000  # 查詢 API 每頁筆數上限
+API_POOL_SIZE = 4  # 查詢 API 的唯讀資料庫連線數
+API_CACHE_SIZE = 256  # 查詢 API 在記憶體快取的查詢結果數
+BACKFILL_WORKERS = 4  # 歷史回補（backfill.py）的工作行程數
+BACKFILL_DIR = 'backfill_shards'  # 歷史回補各工作行程的分片資料庫目錄
+HTTP_RATE_INITIAL = 5  # 對區塊鏈瀏覽器的起始請求速率（次/秒），之後依回應自動調整
+HTTP_RATE_MIN = 0.5  # 被限流時請求速率最低降到多少（次/秒）
+HTTP_RATE_MAX = 50  # 請求速率上限（次/秒）
+HTTP_CONCURRENCY_INITIAL = 4  # 起始同時請求數，上限為 HTTP_POOL_SIZE
+HTTP_LATENCY_TARGET = 2.0  # 回應延遲低於幾秒才繼續加速
+BALANCE_CACHE_SIZE = 100000  # 記憶體內保留的地址餘額查詢紀錄筆數上限（超過時淘汰最久未使用者）
+METRICS_PORT = 0  # Prometheus 指標端點的埠號（0 表示停用）
+METRICS_FILE = ''  # 定期寫入的 JSON 統計檔（'' 表示停用）
+METRICS_INTERVAL = 10  # JSON 統計檔的寫入間隔秒數
+PROFILE_MODE = ''  # 逐塊剖析：'cprofile'、'tracemalloc' 或 ''（停用）
+PROFILE_FILE = 'scan_profile'  # 剖析結果的檔名（不含副檔名）
+BATCH_LOOKUP_WORKERS = 8  # 批次查詢同時查詢的執行緒數
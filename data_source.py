@@ -0,0 +1,270 @@
+"""
+區塊資料來源。
+
+掃描程式只透過這裡的介面取得區塊、交易輸出與地址餘額，依 config.DATA_SOURCE 選擇：
+- 'explorer'：爬取 scash.one 網頁（原本的做法，每個區塊 1 + N 個交易頁）
+- 'rpc'：本機 SCASH 節點的 bitcoind 相容 JSON-RPC，getblock 一次取得整個區塊的
+  交易與輸出，並以批次請求在一次 HTTP 往返中取得多個區塊
+
+介面：
+- batch_size：fetch_blocks 一次建議處理的區塊數
+- fetch_blocks(heights)：下載原始資料，回傳與 heights 對應的清單，失敗的位置放 Exception
+- parse_block(height, raw)：轉成 BlockInfo
+- get_tx_outputs(txid, block=None)：回傳 (交易總輸出, [(地址, 金額), ...])
+- get_address_balance(address)：回傳 (餘額, 錯誤訊息)
+- get_block_count()：目前鏈高度
+- poll_block(height)：只嘗試一次、盡量輕量地檢查區塊是否已出塊，已出塊回傳 BlockInfo，否則 None
+- get_block_hash(height)：不經快取取得目前鏈上該高度的區塊雜湊（偵測分叉用）
+- invalidate_blocks(heights)：分叉回滾後丟棄這些高度的快取頁面
+"""
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import config
+import metrics
+from html_extract import parse_address_page, parse_block_page, parse_tx_page
+from http_client import FetchError, fetch_text, post_json
+from page_cache import CacheMiss, get_page_cache
+
+# items 與 html_extract.BlockPage 相同：(是否為第 1 筆, 交易金額, txid)
+# tx_outputs 為 {txid: (交易總輸出, [(地址, 金額), ...])}，爬蟲來源為 None（需另外查詢交易頁）
+# prev_hash 為前一個區塊的雜湊，網頁來源沒有提供時為 None
+BlockInfo = namedtuple(
+    'BlockInfo', 'height block_hash time_str total_amount total_error items tx_outputs prev_hash')
+
+
+class RpcError(Exception):
+    """節點回傳的 JSON-RPC 錯誤。"""
+
+    def __init__(self, method, error):
+        super().__init__(f"RPC {method} 失敗: {error.get('message', error)}")
+        self.method = method
+        self.code = error.get('code')
+
+
+class ExplorerSource:
+    """爬取 scash.one 網頁；區塊與交易頁會經過 page_cache，地址餘額頁不快取。"""
+    name = 'explorer'
+    batch_size = 1
+
+    def __init__(self, base_url=None):
+        self._base_url = base_url
+
+    @property
+    def base_url(self):
+        # 未指定時跟隨 config.BASE_URL（設定模式重新載入後立即生效）
+        return self._base_url or config.BASE_URL
+
+    def _fetch(self, url, kind):
+        cache = get_page_cache()
+        if cache is not None:
+            body = cache.get(url)
+            if body is not None:
+                return body
+        if config.CACHE_ONLY:
+            raise CacheMiss(url)
+        return fetch_text(url, kind=kind)
+
+    def fetch_blocks(self, heights):
+        results = []
+        for height in heights:
+            try:
+                results.append(self._fetch(f"{self.base_url}/?search={height}", 'block'))
+            except FetchError as e:
+                results.append(e)
+        return results
+
+    def parse_block(self, height, raw):
+        with metrics.timer('stage_seconds', stage='parse'):
+            page = parse_block_page(raw)
+        cache = get_page_cache()
+        # 只快取解析成功的區塊頁（尚未出塊的「查無資料」頁面不存）
+        if cache is not None and page.total_error is None:
+            cache.observe_height(height)
+            cache.put(f"{self.base_url}/?search={height}", raw, height)
+        return BlockInfo(height, page.block_hash, page.time_str, page.total_amount,
+                         page.total_error, page.items, None, None)
+
+    def get_tx_outputs(self, txid, block=None):
+        url = f"{self.base_url}/tx/{txid}"
+        raw = self._fetch(url, 'tx')
+        with metrics.timer('stage_seconds', stage='parse'):
+            page = parse_tx_page(raw)
+        cache = get_page_cache()
+        # 只快取已知所屬區塊的交易頁（依鏈頂距離決定何時寫入）；手動或批次查詢的交易不知道高度，
+        # 可能尚未確認或位於將被回滾的區塊，不寫入快取
+        if cache is not None and block is not None and page.total_outputs is not None:
+            cache.put(url, raw, block.height)
+        return page.total_outputs, page.outputs
+
+    def get_address_balance(self, address):
+        if config.CACHE_ONLY:
+            return None, None  # 離線重播不查詢會變動的地址餘額
+        page = parse_address_page(
+            fetch_text(f"{self.base_url}/?search={address}&utxolookup=1", kind='address'))
+        return page.balance, page.error
+
+    def get_block_count(self):
+        raise NotImplementedError("網頁來源無法直接取得鏈高度")
+
+    def poll_block(self, height):
+        # 網頁沒有鏈高度可查，直接試抓下一個區塊頁（只試一次，失敗由呼叫端稍後再輪詢）
+        url = f"{self.base_url}/?search={height}"
+        cache = get_page_cache()
+        raw = cache.get(url) if cache is not None else None
+        if raw is None:
+            if config.CACHE_ONLY:
+                raise CacheMiss(url)
+            raw = fetch_text(url, retries=1, kind='block')
+        block = self.parse_block(height, raw)
+        return None if block.total_error is not None else block
+
+    def get_block_hash(self, height):
+        return parse_block_page(fetch_text(f"{self.base_url}/?search={height}", kind='block')).block_hash
+
+    def invalidate_blocks(self, heights):
+        cache = get_page_cache()
+        if cache is not None:
+            cache.discard([f"{self.base_url}/?search={h}" for h in heights])
+
+
+class RpcSource:
+    """bitcoind 相容的 JSON-RPC 節點（需 getblock verbosity 2）。"""
+    name = 'rpc'
+
+    def __init__(self, url=None, user=None, password=None, batch_size=None):
+        self.url = url or config.RPC_URL
+        user = config.RPC_USER if user is None else user
+        password = config.RPC_PASSWORD if password is None else password
+        self.auth = (user, password) if user else None
+        self.batch_size = max(1, batch_size or config.RPC_BATCH_SIZE)
+        # 節點沒有地址索引，地址餘額仍由網頁查詢
+        self.explorer = ExplorerSource()
+
+    def call_batch(self, calls):
+        """以單一 HTTP 請求送出多個 (method, params)，回傳對應的結果或 RpcError。"""
+        if not calls:
+            return []
+        payload = [{'jsonrpc': '1.0', 'id': i, 'method': method, 'params': params}
+                   for i, (method, params) in enumerate(calls)]
+        replies = post_json(self.url, payload, auth=self.auth)
+        by_id = {reply.get('id'): reply for reply in replies}
+        results = []
+        for i, (method, _) in enumerate(calls):
+            reply = by_id.get(i) or {'error': {'message': '缺少回應'}}
+            if reply.get('error'):
+                results.append(RpcError(method, reply['error']))
+            else:
+                results.append(reply.get('result'))
+        return results
+
+    def call(self, method, *params):
+        result = self.call_batch([(method, list(params))])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def fetch_blocks(self, heights):
+        try:
+            hashes = self.call_batch([('getblockhash', [h]) for h in heights])
+            wanted = [h for h in hashes if not isinstance(h, Exception)]
+            blocks = iter(self.call_batch([('getblock', [h, 2]) for h in wanted]))
+        except FetchError as e:
+            return [e] * len(heights)
+        return [h if isinstance(h, Exception) else next(blocks) for h in hashes]
+
+    @staticmethod
+    def _tx_outputs(tx):
+        outputs = []
+        tx_total = 0.0
+        for vout in tx.get('vout', []):
+            value = float(vout.get('value', 0))
+            tx_total += value
+            script = vout.get('scriptPubKey', {})
+            address = script.get('address') or (script.get('addresses') or [None])[0]
+            if address:
+                outputs.append((address, value))
+        return tx_total, outputs
+
+    def parse_block(self, height, raw):
+        items = []
+        tx_outputs = {}
+        total_amount = 0.0
+        with metrics.timer('stage_seconds', stage='parse'):
+            for index, tx in enumerate(raw.get('tx', [])):
+                tx_total, outputs = self._tx_outputs(tx)
+                total_amount += tx_total
+                items.append((index == 0, tx_total, tx['txid']))
+                tx_outputs[tx['txid']] = (tx_total, outputs)
+        time_str = datetime.fromtimestamp(raw['time'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        return BlockInfo(height, raw.get('hash'), time_str, total_amount, None, items, tx_outputs,
+                         raw.get('previousblockhash'))
+
+    def get_tx_outputs(self, txid, block=None):
+        if block is not None and block.tx_outputs and txid in block.tx_outputs:
+            return block.tx_outputs[txid]
+        # 不在已取得區塊內的交易需要節點開啟 txindex
+        return self._tx_outputs(self.call('getrawtransaction', txid, True))
+
+    def get_address_balance(self, address):
+        return self.explorer.get_address_balance(address)
+
+    def get_block_count(self):
+        return self.call('getblockcount')
+
+    def poll_block(self, height):
+        # getblockcount 很便宜，尚未出塊時不需要再取區塊內容
+        try:
+            tip = self.get_block_count()
+        except RpcError:
+            return None  # 節點仍在啟動（例如 -28 Loading block index），視為尚未出塊
+        if tip < height:
+            return None
+        raw = self.fetch_blocks([height])[0]
+        if isinstance(raw, RpcError):
+            return None  # 查詢之間剛好發生分叉，下次輪詢再試
+        if isinstance(raw, Exception):
+            raise raw
+        return self.parse_block(height, raw)
+
+    def get_block_hash(self, height):
+        try:
+            return self.call('getblockhash', height)
+        except RpcError:
+            return None
+
+    def invalidate_blocks(self, heights):
+        pass  # RPC 結果不經過頁面快取
+
+
+_source = None
+
+
+def get_source():
+    """依 config.DATA_SOURCE 建立（並快取）資料來源。"""
+    global _source
+    if _source is None or _source.name != config.DATA_SOURCE:
+        if config.DATA_SOURCE == 'rpc':
+            _source = RpcSource()
+        elif config.DATA_SOURCE == 'explorer':
+            _source = ExplorerSource()
+        else:
+            raise ValueError(f"未知的資料來源: {config.DATA_SOURCE}")
+    return _source
+
+
+def collect_tx_outputs(page, source=None):
+    """
+    依頁面順序查詢區塊內每筆轉帳（coinbase 除外）的輸出，
+    回傳 [(txid, 徽章金額, 交易總額, [(地址, 金額)])]，同一個 txid 只查一次。
+    """
+    source = source or get_source()
+    result = []
+    seen = set()
+    for first, tx_amount, txid in page.items:
+        if first or not txid or txid in seen:
+            continue
+        seen.add(txid)
+        tx_total, outputs = source.get_tx_outputs(txid, page)
+        result.append((txid, tx_amount, tx_total, outputs))
+    return result
@@ -1,40 +1,281 @@
-import sqlite3
+"""
+將資料庫內容匯出為儀表板使用的資料檔。
+
+- assets/dashboard_data.js：小型摘要（dashboardSummary），包含前 10 名、最新 20 筆大額轉帳、
+  各分頁檔的版本，以及在 SQL 端算好的 stats（前 100 名合計、總量、圓餅圖分組等），
+  首頁只需要載入這個檔案，不必接觸完整資料
+- assets/data/rank_top.js：前 DASHBOARD_RANK_TOP_N 名地址餘額，展開排行榜時才載入
+- assets/data/tx_<n>.js：大額轉帳依區塊高度由舊到新分頁，每頁 DASHBOARD_TX_PAGE_SIZE 筆，
+  最後一頁為最新；新區塊只會改動最後幾頁，較舊的分頁不必重寫
+分頁檔以 dashboardChunk(名稱, 資料) 的形式載入（file:// 開啟也能使用）。
+
+可直接執行，也可由掃描程式 import 後呼叫 export_dashboard_data()：
+- 同一個行程內保留排行榜的序列化結果與上次讀到的 tx_large_change 序號；大額轉帳不保留在記憶體，
+  只從有變動的最低區塊所在的分頁起，以 SQL 逐頁讀取、序列化並寫出
+- 資料庫沒有新的提交時直接略過，不寫檔
+- 每個檔案都先寫入暫存檔再以 os.replace 原子替換，摘要檔最後寫入，前端不會讀到寫一半的資料
+"""
+import glob
+import itertools
 import json
+import os
+import time
+
+import config
+from scash_db import LARGE_TX_SAT, connect, from_sat, load_dashboard_stats, txid_hex
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+SUMMARY_FILE = os.path.join(ASSETS_DIR, 'dashboard_data.js')
+CHUNK_DIR = os.path.join(ASSETS_DIR, 'data')
+TX_LATEST = 20  # 摘要檔內直接顯示的最新轉帳筆數
+RANK_FIRST = 10  # 摘要檔內直接顯示的排行榜名次
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _write_atomic(path, text):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _chunk_text(name, items):
+    """分頁檔內容：items 為已序列化的 JSON 字串。"""
+    return f'dashboardChunk("{name}",[' + ','.join(items) + ']);\n'
+
+
+class DashboardExporter:
+    """保留上次匯出狀態的匯出器，export() 回傳是否有寫檔。"""
+
+    def __init__(self, db_file=None, assets_dir=None):
+        self.db_file = db_file or config.DB_FILE
+        self.summary_file = os.path.join(assets_dir, 'dashboard_data.js') if assets_dir else SUMMARY_FILE
+        self.chunk_dir = os.path.join(assets_dir, 'data') if assets_dir else CHUNK_DIR
+        self.conn = None
+        self.data_version = None
+        # 以毫秒時間戳為起點，重新啟動後的版本號仍會遞增，瀏覽器不會用到舊快取
+        self.generation = int(time.time() * 1000)
+        self.balance_sig = None
+        self.rank_rows = []      # [(原始列, JSON)]，依餘額排序的前 N 名
+        self.rank_rev = 0
+        self.tx_seq = None       # 已處理到的 tx_large_change 序號，None 時全部重寫
+        self.tx_count = 0        # 大額轉帳筆數
+        self.tx_dirty_from = 0   # 從這個索引之後的分頁需要重寫
+        self.tx_latest = []      # 最新 TX_LATEST 筆的 JSON（新到舊）
+        self.page_revs = []
+        self.stats = None
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = connect(self.db_file, readonly=True)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _load_balances(self, c):
+        """
+        地址餘額：以 dashboard_stats 的 balance_changes（觸發器在每次新增、修改、刪除時加一）判斷是否有變動，
+        不必掃描整張表；有變動時只讀前 N 名，並只重新序列化數值改變的列。
+        """
+        sig = c.execute("SELECT value FROM dashboard_stats WHERE name = 'balance_changes'").fetchone()
+        if sig == self.balance_sig:
+            return False
+        self.balance_sig = sig
+        cached = dict(self.rank_rows)
+        rows = []
+        for row in c.execute('''SELECT a.address, b.balance, b.change_str, b.update_count, b.scan_time, b.update_time
+                                FROM scash_address_balances b JOIN address a ON a.id = b.address_id
+                                ORDER BY b.balance DESC LIMIT ?''', (config.DASHBOARD_RANK_TOP_N,)):
+            text = cached.get(row)
+            if text is None:
+                text = _dumps({
+                    'address': row[0],
+                    'balance': from_sat(row[1]),
+                    'change_str': row[2],
+                    'update_count': row[3],
+                    'scan_time': row[4],
+                    'update_time': row[5]
+                })
+            rows.append((row, text))
+        if rows == self.rank_rows:
+            return False
+        self.rank_rows = rows
+        self.rank_rev = self.generation
+        return True
+
+    def _load_tx(self, c):
+        """
+        tx：由 tx_large_change（觸發器在大額轉帳增刪改時以遞增序號標記區塊）找出上次匯出後
+        有變動的最低區塊，從該區塊的第一筆所在位置起重寫分頁；刪除、分叉回滾、重建都會被標記。
+        """
+        seq = c.execute('SELECT COALESCE(MAX(seq), 0) FROM tx_large_change').fetchone()[0]
+        if self.tx_seq is not None:
+            if seq == self.tx_seq:
+                return False
+            dirty_height = c.execute('SELECT MIN(block_height) FROM tx_large_change WHERE seq > ?',
+                                     (self.tx_seq,)).fetchone()[0]
+            # 條件寫成與 idx_tx_large 相同的常數，只計數部分索引
+            dirty_from = c.execute(f'SELECT COUNT(*) FROM tx WHERE amount > {LARGE_TX_SAT} AND block_height < ?',
+                                   (dirty_height,)).fetchone()[0]
+        else:
+            dirty_from = 0
+        self.tx_count = c.execute(f'SELECT COUNT(*) FROM tx WHERE amount > {LARGE_TX_SAT}').fetchone()[0]
+        self.tx_dirty_from = min(self.tx_dirty_from, dirty_from)
+        self.tx_latest = [text for _, text in self._read_tx(c, 'DESC', TX_LATEST, 0)]
+        self.tx_seq = seq
+        return True
+
+    def _read_tx(self, c, order, limit, offset):
+        """依 (區塊高度, 金額, txid, 地址) 排序讀取大額轉帳，回傳 (排序鍵, JSON) 的產生器。"""
+        # amount 條件寫成與 idx_tx_large 相同的常數，可直接走部分索引
+        cursor = c.execute(f'''SELECT t.block_height, t.txid, a.address, t.amount, t.transfer_time, t.address_id
+                               FROM tx t JOIN address a ON a.id = t.address_id
+                               WHERE t.amount > {LARGE_TX_SAT}
+                               ORDER BY t.block_height {order}, t.amount {order}, t.txid {order},
+                                        t.address_id {order}
+                               LIMIT ? OFFSET ?''', (limit, offset))
+        for row in cursor:
+            txid = txid_hex(row[1])
+            yield (row[0], row[3], txid, row[5]), _dumps({
+                'block_height': row[0],
+                'txid': txid,
+                'address': row[2],
+                'amount': from_sat(row[3]),
+                'transfer_time': row[4]
+            })
+
+    def _write_tx_pages(self, c):
+        """從 tx_dirty_from 所在的分頁起，每次只讀取一頁並寫出；須在讀取交易內呼叫。"""
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        size = config.DASHBOARD_TX_PAGE_SIZE
+        pages = (self.tx_count + size - 1) // size
+        del self.page_revs[pages:]
+        first = min(self.tx_dirty_from // size, pages)
+        rows = self._read_tx(c, 'ASC', -1, first * size)
+        for page in range(first, pages):
+            name = f'tx_{page}'
+            _write_atomic(os.path.join(self.chunk_dir, name + '.js'),
+                          _chunk_text(name, [text for _, text in itertools.islice(rows, size)]))
+            if page < len(self.page_revs):
+                self.page_revs[page] = self.generation
+            else:
+                self.page_revs.append(self.generation)
+        rows.close()
+        self.tx_dirty_from = self.tx_count
+        # 移除已不存在的分頁（例如分叉回滾後筆數變少）
+        for path in glob.glob(os.path.join(self.chunk_dir, 'tx_*.js')):
+            index = os.path.basename(path)[3:-3]
+            if index.isdigit() and int(index) >= pages:
+                os.remove(path)
+
+    def _load_stats(self, c):
+        """
+        儀表板的總計數值：計數與合計直接讀 dashboard_stats（觸發器增量維護），
+        依名次分組的合計走餘額索引只讀前 100 列，都不需要掃描完整資料。
+        """
+        totals = load_dashboard_stats(c)
+        top10 = c.execute('''SELECT a.address, b.balance FROM scash_address_balances b
+                             JOIN address a ON a.id = b.address_id
+                             ORDER BY b.balance DESC LIMIT 10''').fetchall()
+        top100, group11_50, group51_100 = c.execute('''
+            SELECT COALESCE(SUM(balance), 0),
+                   COALESCE(SUM(CASE WHEN rank BETWEEN 11 AND 50 THEN balance END), 0),
+                   COALESCE(SUM(CASE WHEN rank BETWEEN 51 AND 100 THEN balance END), 0)
+            FROM (SELECT balance, ROW_NUMBER() OVER (ORDER BY balance DESC) AS rank
+                  FROM (SELECT balance FROM scash_address_balances ORDER BY balance DESC LIMIT 100))''').fetchone()
+        # 總量以已掃描的最高區塊 × 50 估算
+        max_block = c.execute('''SELECT COALESCE((SELECT MAX(block_height) FROM block_summary),
+                                                (SELECT MAX(block_height) FROM tx), 0)''').fetchone()[0]
+        total_supply = max_block * 50
+        top100, group11_50, group51_100 = from_sat(top100), from_sat(group11_50), from_sat(group51_100)
+        return {
+            'maxBlock': max_block,
+            'totalSupply': total_supply,
+            'top100Total': top100,
+            'top100Percent': top100 / total_supply * 100 if total_supply else 0,
+            'pie': {
+                'labels': [address for address, _ in top10],
+                'values': [from_sat(balance) for _, balance in top10] + [group11_50, group51_100],
+            },
+            'addressCount': int(totals.get('address_count', 0)),
+            'balanceTotal': totals.get('balance_total', 0),
+            'txCount': int(totals.get('tx_count', 0)),
+            'txLargeCount': int(totals.get('tx_large_count', 0)),
+            'txLargeVolume': totals.get('tx_large_volume', 0),
+        }
+
+    def export(self, force=False):
+        conn = self._connect()
+        # data_version 只在其他連線提交後改變，沒有任何提交時連查詢都不用做
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if not force and data_version == self.data_version and os.path.exists(self.summary_file):
+            return False
+        self.data_version = data_version
+        self.generation = max(self.generation + 1, int(time.time() * 1000))
+        if force:
+            # 強制匯出時重新讀取並重寫所有檔案
+            self.balance_sig = self.tx_seq = None
+            self.rank_rows = []
+        c = conn.cursor()
+        # 兩個表在同一個讀取交易內讀取，資料一致
+        c.execute('BEGIN')
+        try:
+            rank_changed = self._load_balances(c)
+            tx_changed = self._load_tx(c)
+            stats = self._load_stats(c)
+            if tx_changed:
+                # 分頁在同一個快照內逐頁讀取寫出，與摘要的筆數一致
+                self._write_tx_pages(c)
+        finally:
+            conn.rollback()
+        stats_changed = stats != self.stats
+        self.stats = stats
+        if not (rank_changed or tx_changed or stats_changed or force) and os.path.exists(self.summary_file):
+            return False
+        self._write(rank_changed or force)
+        return True
+
+    def _write(self, rank_changed):
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        if rank_changed:
+            _write_atomic(os.path.join(self.chunk_dir, 'rank_top.js'),
+                          _chunk_text('rank_top', [text for _, text in self.rank_rows]))
+        summary = {
+            'generated': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'txCount': self.tx_count,
+            'txPageSize': config.DASHBOARD_TX_PAGE_SIZE,
+            'txPageRevs': self.page_revs,
+            'rankTopN': len(self.rank_rows),
+            'rankRev': self.rank_rev,
+            'stats': self.stats,
+        }
+        # 摘要檔最後寫入，引用到的分頁檔都已經存在
+        # 以 var 宣告，頁面自動刷新時可重新載入同一個檔案
+        text = 'var dashboardSummary = ' + _dumps(summary)[:-1]
+        text += ',"rankTop":[' + ','.join(t for _, t in self.rank_rows[:RANK_FIRST]) + ']'
+        text += ',"txLatest":[' + ','.join(self.tx_latest) + ']};\n'
+        _write_atomic(self.summary_file, text)
+
+
+_exporter = None
+
+
+def export_dashboard_data(force=False):
+    """匯出儀表板資料檔，回傳是否有寫檔（資料沒有變動時不寫）。"""
+    global _exporter
+    if _exporter is None or _exporter.db_file != config.DB_FILE:
+        if _exporter is not None:
+            _exporter.close()
+        _exporter = DashboardExporter()
+    return _exporter.export(force)
+
 
-DB_FILE = 'scash_data.db'
-
-# 匯出 addressBalances
-addressBalances = []
-with sqlite3.connect(DB_FILE) as conn:
-    c = conn.cursor()
-    for row in c.execute('SELECT address, balance, change_str, update_count, scan_time, update_time FROM scash_address_balances ORDER BY balance DESC'):
-        addressBalances.append({
-            'address': row[0],
-            'balance': row[1],
-            'change_str': row[2],
-            'update_count': row[3],
-            'scan_time': row[4],
-            'update_time': row[5]
-        })
-
-# 匯出 txRecords
-# 只顯示大額（可依需求調整）
-txRecords = []
-with sqlite3.connect(DB_FILE) as conn:
-    c = conn.cursor()
-    for row in c.execute('SELECT block_height, txid, address, amount, transfer_time FROM tx WHERE amount > 500 ORDER BY block_height DESC, amount DESC'):
-        txRecords.append({
-            'block_height': row[0],
-            'txid': row[1],
-            'address': row[2],
-            'amount': row[3],
-            'transfer_time': row[4]
-        })
-
-# 輸出到 dashboard_data.js
-with open('assets/dashboard_data.js', 'w', encoding='utf-8') as f:
-
-    f.write('const addressBalances = ' + json.dumps(addressBalances, ensure_ascii=False, indent=2) + ';\n')
-    f.write('const txRecords = ' + json.dumps(txRecords, ensure_ascii=False, indent=2) + ';\n')
-
-print('已匯出 assets/dashboard_data.js，可直接在 scash_dashboard.html 引入！')
+if __name__ == "__main__":
+    export_dashboard_data(force=True)
+    print('已匯出 assets/dashboard_data.js 與 assets/data/ 分頁檔，可直接在 index.html 引入！')
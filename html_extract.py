@@ -0,0 +1,311 @@
+"""
+scash.one 頁面的快速擷取器。
+
+以單一正規表示式逐一掃過標籤與文字（不建立 DOM 樹），一次取出區塊、交易、地址三種頁面
+需要的欄位，結果與原本 BeautifulSoup 'html.parser' 加上 find/find_all 的寫法一致：
+- 區塊頁：Hash、時間、Total amount in all outputs、每個 list-group-item 的金額徽章與 txid
+- 交易頁：Total outputs 與每個輸出的地址/金額
+- 地址頁：Total unspent SCASH
+"""
+import html
+import re
+from collections import namedtuple
+
+BlockPage = namedtuple('BlockPage', 'time_str total_amount total_error items block_hash')
+BlockPage.__doc__ = """items 為 (是否為第 1 筆, 徽章金額或 None, txid 或 None)，依頁面順序排列；block_hash 找不到時為 None。"""
+TxPage = namedtuple('TxPage', 'total_outputs outputs')
+AddressPage = namedtuple('AddressPage', 'balance error')
+
+_TOKEN_RE = re.compile(
+    r'<(?:!--.*?--|!\[CDATA\[.*?\]\]|[!?][^>]*'
+    r'|(/?)([a-zA-Z][a-zA-Z0-9:-]*)([^>]*))>',
+    re.S)
+_CLASS_RE = re.compile(r'(?:^|\s)class\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>"\']+))', re.I)
+_HREF_RE = re.compile(r'(?:^|\s)href\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>"\']+))', re.I)
+_RAW_TEXT_TAGS = ('script', 'style')
+_RAW_TEXT_END_RE = {tag: re.compile(r'</' + tag + r'\s*>', re.I) for tag in _RAW_TEXT_TAGS}
+_VOID_TAGS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr'))
+
+_TOTAL_LABEL = "Total amount in all outputs"
+_BADGE_AMOUNT_RE = re.compile(r"([\d\.]+)\s*SCASH")
+_SCASH_AMOUNT_RE = re.compile(r"([\d'\.]+)\s*SCASH")
+_TX_HREF_RE = re.compile(r"^/tx/")
+_ADDR_HREF_RE = re.compile(r"^/\?&search=scash1")
+_ADDR_SEARCH_RE = re.compile(r"search=(scash1[0-9a-zA-Z]+)")
+_TOTAL_OUTPUTS_RE = re.compile(r"Total outputs")
+_UNSPENT_RE = re.compile(r"Total unspent SCASH:\s*([\d\.]+)")
+_HASH_RE = re.compile(r"\b([0-9a-fA-F]{64})\b")
+
+
+def _unescape(text):
+    return html.unescape(text) if '&' in text else text
+
+
+def _attr(pattern, raw):
+    m = pattern.search(raw)
+    if m is None:
+        return None
+    value = m.group(1)
+    if value is None:
+        value = m.group(2)
+    if value is None:
+        value = m.group(3)
+    return _unescape(value)
+
+
+def _raw_text_end(doc, tag, pos):
+    """script/style 內容不算文字，直接跳到對應的結束標籤。"""
+    m = _RAW_TEXT_END_RE[tag].search(doc, pos)
+    return m.start() if m else -1
+
+
+def _strip_join(parts, separator):
+    return separator.join(p for p in (p.strip() for p in parts) if p)
+
+
+class _Item:
+    """一個 li.list-group-item 中，各欄位第一個符合的子元素文字。"""
+    __slots__ = ('truncate', 'badge', 'tx_link', 'addr_href', 'addr_link', 'muted')
+
+    def __init__(self):
+        self.truncate = self.badge = self.tx_link = None
+        self.addr_href = self.addr_link = self.muted = None
+
+
+class _Li:
+    """任一 li（find_parent("li") 用），記錄其第一個 div.ms-2.me-auto 的文字。"""
+    __slots__ = ('ms2', 'item')
+
+    def __init__(self, item):
+        self.ms2 = None
+        self.item = item
+
+
+def _scan(doc):
+    """單次掃描整份 HTML，回傳所有頁面類型會用到的原始欄位。"""
+    stack = []        # (tag, 收集中的文字, 標記)
+    lis = []          # 目前開啟中的 li
+    ms2_stack = []    # 目前開啟中的 div.ms-2.me-auto 文字（find_parent 用）
+    capturing = []    # 目前正在收集文字的元素
+    items = []
+    result = {
+        'time': None, 'hash': None, 'total_li': None, 'total_seen': False,
+        'outputs_li': None, 'outputs_seen': False, 'totalamount': None,
+    }
+
+    def close(entry):
+        tag, parts, mark = entry
+        # 元素依堆疊順序關閉，自身的收集清單、li、ms2 必定在最後面
+        if parts is not None:
+            capturing.pop()
+        if mark is None:
+            return
+        if mark == 'li':
+            lis.pop()
+            return
+        if mark == 'ms2':
+            ms2_stack.pop()
+            return
+        if mark[1]:
+            ms2_stack.pop()
+        # 以「只有一個文字節點」近似 BeautifulSoup 的 .string
+        if len(parts) != 1:
+            return
+        string = parts[0]
+        if result['time'] is None and string == "Time":
+            result['time'] = mark[0] if mark[0] is not None else False
+        if result['hash'] is None and string == "Hash":
+            result['hash'] = mark[0] if mark[0] is not None else False
+        if not result['outputs_seen'] and _TOTAL_OUTPUTS_RE.search(string):
+            result['outputs_seen'] = True
+            result['outputs_li'] = lis[-1] if lis else False
+
+    pos = 0
+    skip_to = 0
+    for m in _TOKEN_RE.finditer(doc):
+        start = m.start()
+        if start < skip_to:
+            continue  # script/style 內容
+        if start > pos and (capturing or not result['total_seen']):
+            chunk = doc[pos:start]
+            if '&' in chunk:
+                chunk = html.unescape(chunk)
+            for parts in capturing:
+                parts.append(chunk)
+            if not result['total_seen'] and _TOTAL_LABEL in chunk:
+                result['total_seen'] = True
+                result['total_li'] = lis[-1] if lis else False
+        pos = m.end()
+        closing, tag, raw = m.group(1, 2, 3)
+        if tag is None:
+            continue  # 註解、doctype 等
+        tag = tag.lower()
+        if closing:
+            # 結束標籤：關閉到最近一個同名元素，找不到就忽略
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == tag:
+                    while len(stack) > i:
+                        close(stack.pop())
+                    break
+            continue
+        if tag in _RAW_TEXT_TAGS:
+            end = _raw_text_end(doc, tag, pos)
+            if end == -1:
+                pos = skip_to = len(doc)
+                break
+            pos = skip_to = end
+            continue
+        if tag in _VOID_TAGS or raw.rstrip().endswith('/'):
+            continue
+        parts = None
+        mark = None
+        if tag == 'li':
+            item = None
+            cls = _attr(_CLASS_RE, raw) if 'class' in raw else None
+            if cls and 'list-group-item' in cls.split():
+                item = _Item()
+                items.append(item)
+            lis.append(_Li(item))
+            mark = 'li'
+        elif tag == 'div':
+            cls = _attr(_CLASS_RE, raw) if 'class' in raw else None
+            if cls:
+                classes = cls.split()
+                is_ms2 = ' '.join(classes) == 'ms-2 me-auto'
+                if is_ms2:
+                    parts = []
+                    for li in lis:
+                        if li.ms2 is None:
+                            li.ms2 = parts
+                    mark = 'ms2'
+                if 'fw-bold' in classes:
+                    # find_parent 只往上找，不包含自己
+                    mark = (ms2_stack[-1] if ms2_stack else None, is_ms2)
+                    if parts is None:
+                        parts = []
+                if 'text-truncate' in classes:
+                    for li in lis:
+                        if li.item is not None and li.item.truncate is None:
+                            if parts is None:
+                                parts = []
+                            li.item.truncate = parts
+                if result['totalamount'] is None and 'totalamount' in classes:
+                    if parts is None:
+                        parts = []
+                    result['totalamount'] = parts
+                if is_ms2:
+                    ms2_stack.append(parts)
+        elif tag == 'span':
+            cls = _attr(_CLASS_RE, raw) if 'class' in raw else None
+            if cls:
+                classes = cls.split()
+                joined = ' '.join(classes)
+                if 'badge' in joined and 'bg-primary' in joined:
+                    for li in lis:
+                        if li.item is not None and li.item.badge is None:
+                            if parts is None:
+                                parts = []
+                            li.item.badge = parts
+                if 'text-muted' in classes:
+                    for li in lis:
+                        if li.item is not None and li.item.muted is None:
+                            if parts is None:
+                                parts = []
+                            li.item.muted = parts
+        elif tag == 'a':
+            href = _attr(_HREF_RE, raw) if 'href' in raw else None
+            if href is not None:
+                if _TX_HREF_RE.match(href):
+                    for li in lis:
+                        if li.item is not None and li.item.tx_link is None:
+                            if parts is None:
+                                parts = []
+                            li.item.tx_link = parts
+                if _ADDR_HREF_RE.match(href):
+                    for li in lis:
+                        if li.item is not None and li.item.addr_link is None:
+                            if parts is None:
+                                parts = []
+                            li.item.addr_link = parts
+                            li.item.addr_href = href
+        if parts is not None:
+            capturing.append(parts)
+        stack.append((tag, parts, mark))
+    if pos < len(doc) and capturing:
+        chunk = _unescape(doc[pos:])
+        for parts in capturing:
+            parts.append(chunk)
+    while stack:
+        close(stack.pop())
+    result['items'] = items
+    return result
+
+
+def parse_block_page(doc):
+    """解析區塊頁（/?search=<height>）。"""
+    r = _scan(doc)
+    time_str = None
+    if r['time']:
+        time_str = _strip_join(r['time'], " ").replace("Time", "", 1).strip()
+    total_amount = None
+    total_error = None
+    if not r['total_seen']:
+        total_error = "無法找到總輸出金額"
+    elif not r['total_li'] or r['total_li'].ms2 is None:
+        total_error = "無法找到金額區塊"
+    else:
+        match = _SCASH_AMOUNT_RE.search(_strip_join(r['total_li'].ms2, " "))
+        if match:
+            total_amount = float(match.group(1).replace("'", ""))
+        else:
+            total_error = "無法解析 SCASH 數值"
+    items = []
+    for item in r['items']:
+        first = item.truncate is not None and _strip_join(item.truncate, "").startswith("1.")
+        amount = None
+        if item.badge is not None:
+            match = _BADGE_AMOUNT_RE.search(_strip_join(item.badge, ""))
+            if match:
+                amount = float(match.group(1))
+        txid = _strip_join(item.tx_link, "") if item.tx_link is not None else None
+        items.append((first, amount, txid))
+    block_hash = None
+    if r['hash']:
+        match = _HASH_RE.search(_strip_join(r['hash'], " "))
+        if match:
+            block_hash = match.group(1).lower()
+    return BlockPage(time_str, total_amount, total_error, items, block_hash)
+
+
+def parse_tx_page(doc):
+    """解析交易頁（/tx/<txid>），total_outputs 找不到時為 None。"""
+    r = _scan(doc)
+    total_outputs = None
+    li = r['outputs_li']
+    if li and li.ms2 is not None:
+        match = _SCASH_AMOUNT_RE.search(_strip_join(li.ms2, " "))
+        if match:
+            total_outputs = float(match.group(1).replace("'", ""))
+    outputs = []
+    for item in r['items']:
+        if item.addr_link is None or item.muted is None:
+            continue
+        address = _ADDR_SEARCH_RE.search(item.addr_href)
+        full_address = address.group(1) if address else _strip_join(item.addr_link, "")
+        match = _SCASH_AMOUNT_RE.search(_strip_join(item.muted, ""))
+        if match:
+            outputs.append((full_address, float(match.group(1).replace("'", ""))))
+    return TxPage(total_outputs, outputs)
+
+
+def parse_address_page(doc):
+    """解析地址餘額頁（/?search=<address>&utxolookup=1）。"""
+    r = _scan(doc)
+    if r['totalamount'] is None:
+        return AddressPage(None, "找不到總餘額區塊")
+    match = _UNSPENT_RE.search(''.join(r['totalamount']))
+    if not match:
+        return AddressPage(None, "無法解析總餘額")
+    return AddressPage(float(match.group(1)), None)
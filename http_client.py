@@ -0,0 +1,151 @@
+"""
+共用 HTTP 連線池與重試策略。
+
+所有對 BASE_URL 的請求都透過同一個 requests.Session，維持 keep-alive 連線重複使用，
+失敗時以指數退避加隨機抖動重試，最終失敗時拋出 FetchError，由呼叫端決定如何處理，
+不會直接結束整個程式。對區塊鏈瀏覽器的請求（fetch_text）另經 rate_limiter 依主機限速，
+遇到 429 / 5xx / 逾時會自動放慢並暫停。
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+import metrics
+import rate_limiter
+
+
+class FetchError(Exception):
+    """多次重試後仍無法取得頁面。"""
+
+    def __init__(self, url, attempts, last_error):
+        super().__init__(f"無法取得 {url}（已嘗試 {attempts} 次）: {last_error}")
+        self.url = url
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """取得共用 Session（第一次呼叫時建立），連線池大小由 HTTP_POOL_SIZE 決定。"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4,
+                                      pool_maxsize=config.HTTP_POOL_SIZE,
+                                      max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({
+                    'Accept-Encoding': 'gzip, deflate',
+                    'Connection': 'keep-alive',
+                    'User-Agent': 'SCASH-Transfer-Query',
+                })
+                _session = session
+    return _session
+
+
+def backoff_delay(attempt):
+    """第 attempt 次失敗後的等待秒數：指數成長並以 full jitter 打散，上限 HTTP_BACKOFF_MAX。"""
+    ceiling = min(config.HTTP_BACKOFF_MAX, config.HTTP_BACKOFF_BASE * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def _should_retry(error):
+    # 4xx（429 除外）代表請求本身有問題，重試也不會成功
+    resp = getattr(error, 'response', None)
+    if resp is not None and 400 <= resp.status_code < 500 and resp.status_code != 429:
+        return False
+    return True
+
+
+def _retry_after(resp):
+    # 只處理秒數格式的 Retry-After，HTTP 日期格式交由預設暫停秒數處理
+    try:
+        return min(float(resp.headers['Retry-After']), config.HTTP_BACKOFF_MAX)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _outcome(error):
+    """依錯誤類型判斷限速器該如何調整。"""
+    resp = getattr(error, 'response', None)
+    if resp is not None:
+        if resp.status_code == 429 or resp.status_code >= 500:
+            return rate_limiter.THROTTLED
+        return rate_limiter.FAILED
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return rate_limiter.THROTTLED
+    return rate_limiter.FAILED
+
+
+def _attempt(session, method, url, timeout, kind, **kwargs):
+    """送出一次請求並記錄延遲與結果指標。"""
+    started = time.perf_counter()
+    outcome = rate_limiter.OK
+    try:
+        resp = session.request(method, url, timeout=timeout, **kwargs)
+        resp.raise_for_status()
+        return resp
+    except requests.RequestException as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        metrics.observe('http_request_seconds', time.perf_counter() - started, kind=kind)
+        metrics.inc('http_requests_total', kind=kind, outcome=outcome)
+
+
+def _request(method, url, retries=None, timeout=None, limited=False, kind='page', **kwargs):
+    """
+    共用的重試迴圈，回傳成功的 Response；重試用盡時拋出 FetchError。
+    limited 時每次嘗試都經過主機限速器；kind 為指標中的頁面類型（block / tx / address / rpc）。
+    """
+    retries = retries or config.HTTP_RETRIES
+    timeout = timeout or config.HTTP_TIMEOUT
+    session = get_session()
+    limiter = rate_limiter.get_limiter(url) if limited else None
+    last_error = None
+    for attempt in range(1, retries + 1):
+        if attempt > 1:
+            metrics.inc('http_retries_total', kind=kind)
+        try:
+            if limiter is None:
+                return _attempt(session, method, url, timeout, kind, **kwargs)
+            with limiter.slot() as result:
+                try:
+                    resp = _attempt(session, method, url, timeout, kind, **kwargs)
+                except requests.RequestException as e:
+                    result['outcome'] = _outcome(e)
+                    if e.response is not None:
+                        result['retry_after'] = _retry_after(e.response)
+                    raise
+                result['outcome'] = rate_limiter.OK
+                return resp
+        except requests.RequestException as e:
+            last_error = e
+            print(f"HTTP 請求失敗: {e} (第 {attempt} 次)")
+            if not _should_retry(e):
+                break
+            if attempt < retries:
+                time.sleep(backoff_delay(attempt))
+    raise FetchError(url, attempt, last_error)
+
+
+def fetch_text(url, retries=None, timeout=None, kind='page'):
+    """下載頁面並回傳 UTF-8 文字；重試用盡時拋出 FetchError。"""
+    resp = _request('GET', url, retries, timeout, limited=True, kind=kind)
+    resp.encoding = 'utf-8'
+    return resp.text
+
+
+def post_json(url, payload, auth=None, retries=None, timeout=None):
+    """POST JSON 並回傳解析後的回應（JSON-RPC 用）；重試用盡時拋出 FetchError。"""
+    return _request('POST', url, retries, timeout, kind='rpc', json=payload, auth=auth).json()
@@ -0,0 +1,319 @@
+"""
+掃描程式的內建指標：計數器與延遲直方圖，可用 Prometheus 抓取或定期寫成 JSON 檔。
+
+- inc / observe / timer 記錄指標，名稱自動加上 scash_ 前綴，標籤以關鍵字參數指定
+- register_gauge 註冊在輸出時才讀取的數值（例如頁面快取命中數、限速器目前速率）
+- start() 依 METRICS_PORT 開啟 /metrics（Prometheus 文字格式）與 /metrics.json，
+  依 METRICS_FILE 每 METRICS_INTERVAL 秒寫入 JSON 統計檔（含區塊與地址的每秒處理量）
+- profiled() 依 PROFILE_MODE 以 cProfile 或 tracemalloc 包住單一區塊的處理，結果定期寫到 PROFILE_FILE
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+PREFIX = 'scash_'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # 延遲直方圖的上界（秒）
+PROFILE_DUMP_EVERY = 50  # 每處理幾個區塊寫出一次剖析結果
+
+HELP = {
+    'http_request_seconds': '單次 HTTP 請求延遲（依頁面類型）',
+    'http_requests_total': 'HTTP 請求次數（依頁面類型與結果）',
+    'http_retries_total': 'HTTP 重試次數（依頁面類型）',
+    'stage_seconds': '區塊處理各階段耗時（fetch 下載、parse 解析區塊與交易頁面（每頁一筆，不含網路）、write 寫入）',
+    'db_commit_seconds': '資料庫批次提交耗時',
+    'db_rows_total': '已提交的寫入列數',
+    'blocks_total': '已寫入的區塊數',
+    'addresses_total': '已查詢餘額的地址數',
+    'balance_cache_requests_total': '地址餘額快取查詢次數（hit 表示 TTL 內查過，不必重查）',
+    'page_cache_requests_total': '頁面快取查詢次數',
+    'rate_limit_rate': '各主機目前的請求速率上限（次/秒）',
+    'rate_limit_concurrency': '各主機目前的並行請求上限',
+}
+# JSON 統計檔中換算為每秒處理量的計數器
+RATES = {'blocks_per_second': 'blocks_total', 'addresses_per_second': 'addresses_total'}
+
+_lock = threading.Lock()
+_counters = {}    # name -> {labels: value}
+_histograms = {}  # name -> {labels: [bucket counts..., +Inf count, sum]}
+_gauges = {}      # name -> (type, fn)
+_started = time.time()
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """累加計數器。"""
+    key = _key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """記錄一次耗時到直方圖。"""
+    key = _key(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        data = series.get(key)
+        if data is None:
+            data = series[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                data[i] += 1
+                break
+        else:
+            data[len(BUCKETS)] += 1
+        data[-1] += seconds
+
+
+@contextmanager
+def timer(name, **labels):
+    """以 with 區塊計時並記錄到直方圖（發生例外也會記錄）。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def register_gauge(name, fn, kind='gauge'):
+    """註冊輸出時才讀取的指標；fn 回傳數值或 {標籤 dict 的 tuple: 數值}，kind 為 gauge 或 counter。"""
+    with _lock:
+        _gauges[name] = (kind, fn)
+
+
+def _read_gauges():
+    with _lock:
+        gauges = dict(_gauges)
+    result = {}
+    for name, (kind, fn) in gauges.items():
+        try:
+            value = fn()
+        except Exception:
+            continue  # 指標讀取失敗不影響掃描
+        result[name] = (kind, value if isinstance(value, dict) else {(): value})
+    return result
+
+
+def _quantile(data, q):
+    # 由直方圖估計分位數（取所在區間的上界，超過最大區間時為 '+Inf'）
+    total = sum(data[:-1])
+    if not total:
+        return None
+    target = total * q
+    seen = 0
+    for i, bound in enumerate(BUCKETS):
+        seen += data[i]
+        if seen >= target:
+            return bound
+    return '+Inf'
+
+
+def _label_str(key):
+    return ','.join(f'{k}={v}' for k, v in key)
+
+
+def snapshot():
+    """目前所有指標的 dict（JSON 統計檔與 /metrics.json 使用）。"""
+    with _lock:
+        counters = {name: dict(series) for name, series in _counters.items()}
+        histograms = {name: {k: list(v) for k, v in series.items()} for name, series in _histograms.items()}
+    result = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'uptime': round(time.time() - _started, 1),
+              'counters': {}, 'histograms': {}, 'gauges': {}}
+    for name, series in counters.items():
+        result['counters'][name] = {_label_str(k): v for k, v in series.items()}
+    for name, series in histograms.items():
+        result['histograms'][name] = {
+            _label_str(k): {'count': sum(v[:-1]), 'sum': round(v[-1], 4),
+                            'avg': round(v[-1] / sum(v[:-1]), 4) if sum(v[:-1]) else None,
+                            'p50': _quantile(v, 0.5), 'p95': _quantile(v, 0.95)}
+            for k, v in series.items()}
+    for name, (_, series) in _read_gauges().items():
+        result['gauges'][name] = {_label_str(k): v for k, v in series.items()}
+    return result
+
+
+def _prom_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in items) + '}'
+
+
+def render_prometheus():
+    """Prometheus 文字格式（0.0.4）。"""
+    with _lock:
+        counters = {name: dict(series) for name, series in _counters.items()}
+        histograms = {name: {k: list(v) for k, v in series.items()} for name, series in _histograms.items()}
+    lines = []
+
+    def header(name, kind):
+        lines.append(f'# HELP {PREFIX}{name} {HELP.get(name, name)}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+    for name, series in sorted(counters.items()):
+        header(name, 'counter')
+        for key, value in series.items():
+            lines.append(f'{PREFIX}{name}{_prom_labels(key)} {value}')
+    for name, series in sorted(histograms.items()):
+        header(name, 'histogram')
+        for key, data in series.items():
+            cumulative = 0
+            for i, bound in enumerate(BUCKETS):
+                cumulative += data[i]
+                lines.append(f'{PREFIX}{name}_bucket{_prom_labels(key, [("le", bound)])} {cumulative}')
+            cumulative += data[len(BUCKETS)]
+            lines.append(f'{PREFIX}{name}_bucket{_prom_labels(key, [("le", "+Inf")])} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{_prom_labels(key)} {data[-1]}')
+            lines.append(f'{PREFIX}{name}_count{_prom_labels(key)} {cumulative}')
+    for name, (kind, series) in sorted(_read_gauges().items()):
+        if not series:
+            continue
+        header(name, kind)
+        for key, value in series.items():
+            lines.append(f'{PREFIX}{name}{_prom_labels(key)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body, ctype = render_prometheus().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/metrics.json':
+            body, ctype = json.dumps(snapshot(), ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不在掃描畫面輸出每次抓取
+
+
+def _count_total(snap, name):
+    return sum(snap['counters'].get(name, {}).values())
+
+
+def write_stats_file(path, previous=None):
+    """寫入 JSON 統計檔（先寫暫存檔再取代），回傳這次的快照；previous 為上次快照，用來計算每秒處理量。"""
+    snap = snapshot()
+    now = time.monotonic()
+    snap['rates'] = {}
+    for rate_name, counter in RATES.items():
+        total = _count_total(snap, counter)
+        if previous is not None and now > previous['_at']:
+            snap['rates'][rate_name] = round((total - _count_total(previous, counter)) / (now - previous['_at']), 3)
+        else:
+            snap['rates'][rate_name] = round(total / snap['uptime'], 3) if snap['uptime'] else 0
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(snap, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    snap['_at'] = now
+    return snap
+
+
+_server = None
+_writer_thread = None
+
+
+def start(port=None, path=None, interval=None):
+    """依設定啟動 Prometheus 端點與 JSON 統計檔（都未設定時不做任何事），重複呼叫不會重複啟動。"""
+    global _server, _writer_thread
+    port = config.METRICS_PORT if port is None else port
+    path = config.METRICS_FILE if path is None else path
+    interval = interval or config.METRICS_INTERVAL
+    if port and _server is None:
+        try:
+            _server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        except OSError as e:
+            print(f"無法開啟指標端點 127.0.0.1:{port}: {e}")
+        else:
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            print(f"指標端點：http://127.0.0.1:{port}/metrics")
+    if path and _writer_thread is None:
+        def loop():
+            previous = None
+            while True:
+                time.sleep(interval)
+                try:
+                    previous = write_stats_file(path, previous)
+                except OSError as e:
+                    print(f"寫入指標檔 {path} 失敗: {e}")
+                dump_profile()
+        _writer_thread = threading.Thread(target=loop, daemon=True)
+        _writer_thread.start()
+        atexit.register(lambda: write_stats_file(path))
+
+
+_profile = None
+_profiled_blocks = 0
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profiled():
+    """PROFILE_MODE 為 'cprofile' 或 'tracemalloc' 時剖析 with 區塊，累積結果每 PROFILE_DUMP_EVERY 次寫出。"""
+    global _profile, _profiled_blocks
+    mode = config.PROFILE_MODE
+    if mode not in ('cprofile', 'tracemalloc'):
+        yield
+        return
+    if mode == 'tracemalloc':
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            atexit.register(dump_profile)
+        yield
+    else:
+        import cProfile
+        with _profile_lock:
+            if _profile is None:
+                _profile = cProfile.Profile()
+                atexit.register(dump_profile)
+        # cProfile 同一時間只能有一個啟用中的剖析，巢狀或並行呼叫時只剖析最外層
+        try:
+            _profile.enable()
+        except ValueError:
+            yield
+            return
+        try:
+            yield
+        finally:
+            _profile.disable()
+    with _profile_lock:
+        _profiled_blocks += 1
+        due = _profiled_blocks % PROFILE_DUMP_EVERY == 0
+    if due:
+        dump_profile()
+
+
+def dump_profile():
+    """寫出目前累積的剖析結果：cProfile 為 PROFILE_FILE.prof（pstats 格式），tracemalloc 為 PROFILE_FILE.txt。"""
+    if not config.PROFILE_FILE:
+        return
+    if _profile is not None:
+        with _profile_lock:
+            _profile.dump_stats(config.PROFILE_FILE + '.prof')
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        stats = tracemalloc.take_snapshot().statistics('lineno')
+        current, peak = tracemalloc.get_traced_memory()
+        with open(config.PROFILE_FILE + '.txt', 'w', encoding='utf-8') as f:
+            f.write(f"目前 {current / 1048576:.1f} MB，峰值 {peak / 1048576:.1f} MB\n")
+            for stat in stats[:30]:
+                f.write(f"{stat}\n")
@@ -0,0 +1,187 @@
+"""
+瀏覽器頁面的持久化壓縮快取。
+
+已確認的區塊與交易頁面不會再變動，重新掃描（例如調整 THRESHOLD 或當機後重跑）時直接
+從本機讀取即可。頁面以 URL 為鍵、zlib 壓縮後存在 SQLite 檔（PAGE_CACHE_FILE），
+總大小超過 PAGE_CACHE_MAX_MB 時依最近使用時間淘汰（LRU）。
+
+規則：
+- 地址餘額頁會變動，一律不快取（由呼叫端決定不 put）
+- 不知道所屬區塊高度的交易頁（手動、批次查詢）無法判斷是否已確認，同樣不快取
+- 距離已知最高區塊 PAGE_CACHE_TIP_MARGIN 以內的頁面可能因分叉而改變，先暫存在記憶體，
+  等更高的區塊出現後才寫入磁碟
+"""
+import atexit
+import sqlite3
+import threading
+import time
+import zlib
+
+import config
+import metrics
+from http_client import FetchError
+
+
+class CacheMiss(FetchError):
+    """離線重播模式（CACHE_ONLY）下快取中沒有此頁面。"""
+
+    def __init__(self, url):
+        Exception.__init__(self, f"離線重播模式：快取中沒有 {url}")
+        self.url = url
+        self.attempts = 0
+        self.last_error = None
+
+
+class PageCache:
+    """URL → 壓縮頁面內容的 LRU 快取，可跨執行緒共用。"""
+
+    def __init__(self, path, max_bytes, tip_margin):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.tip_margin = tip_margin
+        self.tip = 0
+        self.pending = {}  # url -> (height, body)，等待確認的近鏈頂頁面
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # backfill.py 的多個行程會共用同一個快取檔，寫入衝突時等待而不是直接失敗
+        self.conn.execute('PRAGMA busy_timeout=10000')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            body BLOB,
+            size INTEGER,
+            atime REAL
+        )''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_atime ON pages(atime)')
+        self.total_bytes = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        self.touched = {}  # url -> atime，批次寫回以免每次讀取都寫入
+        self.dirty = 0
+        self.last_commit = time.monotonic()
+
+    def get(self, url):
+        with self.lock:
+            if url in self.pending:
+                self.hits += 1
+                return self.pending[url][1]
+            row = self.conn.execute('SELECT body FROM pages WHERE url=?', (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.touched[url] = time.time()
+            self._maybe_commit()
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, url, body, height=None):
+        """寫入頁面；height 為頁面所屬區塊高度，距鏈頂太近時先暫存。"""
+        with self.lock:
+            if height is not None and height > self.tip - self.tip_margin:
+                self.pending[url] = (height, body)
+                return
+            self._store(url, body)
+
+    def observe_height(self, height):
+        """告知目前已確認存在的最高區塊，將已足夠深的暫存頁面寫入磁碟。"""
+        with self.lock:
+            if height <= self.tip:
+                return
+            self.tip = height
+            ready = [url for url, (h, _) in self.pending.items() if h <= height - self.tip_margin]
+            for url in ready:
+                self._store(url, self.pending.pop(url)[1])
+
+    def discard(self, urls):
+        """移除指定頁面（分叉回滾後這些區塊頁已不正確）。"""
+        with self.lock:
+            for url in urls:
+                self.pending.pop(url, None)
+                row = self.conn.execute('SELECT size FROM pages WHERE url=?', (url,)).fetchone()
+                if row:
+                    self.conn.execute('DELETE FROM pages WHERE url=?', (url,))
+                    self.total_bytes -= row[0]
+                    self.touched.pop(url, None)
+            self.conn.commit()
+
+    def _store(self, url, body):
+        # 已確認的頁面不會變動，已存在就不再重寫
+        if self.conn.execute('SELECT 1 FROM pages WHERE url=?', (url,)).fetchone():
+            return
+        blob = zlib.compress(body.encode('utf-8'), 6)
+        self.conn.execute('INSERT INTO pages (url, body, size, atime) VALUES (?, ?, ?, ?)',
+                          (url, blob, len(blob), time.time()))
+        self.total_bytes += len(blob)
+        self.dirty += 1
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+        self._maybe_commit()
+
+    def _evict(self):
+        # 淘汰到上限的 90%，避免每寫入一頁就淘汰一次
+        self._flush_touched()
+        target = self.max_bytes * 0.9
+        while self.total_bytes > target:
+            rows = self.conn.execute(
+                'SELECT url, size FROM pages ORDER BY atime LIMIT 500').fetchall()
+            if not rows:
+                break
+            self.conn.executemany('DELETE FROM pages WHERE url=?', [(r[0],) for r in rows])
+            self.total_bytes -= sum(r[1] for r in rows)
+
+    def _flush_touched(self):
+        if self.touched:
+            self.conn.executemany('UPDATE pages SET atime=? WHERE url=?',
+                                  [(t, u) for u, t in self.touched.items()])
+            self.touched.clear()
+
+    def _maybe_commit(self):
+        if self.dirty >= 200 or len(self.touched) >= 200 or time.monotonic() - self.last_commit > 5:
+            self._flush_touched()
+            self.conn.commit()
+            self.dirty = 0
+            self.last_commit = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._flush_touched()
+            self.conn.commit()
+            self.conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _cache_requests():
+    cache = _cache
+    if cache is None:
+        return {}
+    return {(('result', 'hit'),): cache.hits, (('result', 'miss'),): cache.misses}
+
+
+metrics.register_gauge('page_cache_requests_total', _cache_requests, kind='counter')
+
+
+def get_page_cache():
+    """依設定開啟共用快取；PAGE_CACHE_FILE 為空時停用並回傳 None。"""
+    global _cache
+    if not config.PAGE_CACHE_FILE:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.path != config.PAGE_CACHE_FILE:
+            if _cache is not None:
+                _cache.close()
+            _cache = PageCache(config.PAGE_CACHE_FILE, config.PAGE_CACHE_MAX_MB * 1024 * 1024,
+                               config.PAGE_CACHE_TIP_MARGIN)
+    return _cache
+
+
+@atexit.register
+def close_page_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
@@ -0,0 +1,143 @@
+"""
+對外 HTTP 請求的自適應限速。
+
+每個主機（scash.one、本機節點…）各有一個 AdaptiveLimiter，http_client 的每次請求都先取得許可：
+- 令牌桶限制每秒請求數（rate），同時進行的請求數不超過並行上限（concurrency）
+- 加法增加：回應正常且延遲低於 HTTP_LATENCY_TARGET 時，rate 約每秒增加 1 次/秒，
+  concurrency 約每一輪（concurrency 個請求）增加 1
+- 乘法減少：HTTP 429 / 5xx、逾時或連線失敗時 rate 與 concurrency 減半，
+  並暫停該主機所有請求（有 Retry-After 時依其秒數）；延遲偏高時並行上限小幅下降
+- 同一輪內的多次失敗只減少一次，避免一批同時失敗的請求把速率壓到最低
+區塊頁、交易頁與地址餘額頁都經過同一個 BASE_URL 限速器，共用同一套節奏。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import config
+import metrics
+
+OK = 'ok'
+THROTTLED = 'throttled'  # 429 / 5xx / 逾時 / 連線失敗：需要退讓
+FAILED = 'failed'        # 其他 4xx：請求本身有問題，不影響速率
+
+SLOW_FACTOR = 0.9      # 延遲超過目標時並行上限的縮減比例
+THROTTLE_FACTOR = 0.5  # 被限流時速率與並行上限的縮減比例
+PAUSE_SECONDS = 1.0    # 被限流且沒有 Retry-After 時暫停的秒數
+
+
+class AdaptiveLimiter:
+    """令牌桶 + AIMD 並行控制，可跨執行緒共用。"""
+
+    def __init__(self, name, rate=None, min_rate=None, max_rate=None,
+                 concurrency=None, max_concurrency=None, latency_target=None):
+        self.name = name
+        self.min_rate = min_rate or config.HTTP_RATE_MIN
+        self.max_rate = max_rate or config.HTTP_RATE_MAX
+        self.rate = min(self.max_rate, rate or config.HTTP_RATE_INITIAL)
+        self.max_concurrency = max_concurrency or config.HTTP_POOL_SIZE
+        self.concurrency = float(min(self.max_concurrency, concurrency or config.HTTP_CONCURRENCY_INITIAL))
+        self.latency_target = latency_target or config.HTTP_LATENCY_TARGET
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.counts = {OK: 0, THROTTLED: 0, FAILED: 0}
+
+    def _refill(self, now):
+        # 桶容量為一秒份的令牌（至少 1），閒置後不會一次湧出大量請求
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """等到可以送出請求為止。"""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    wait = None  # 等其他請求完成
+                elif self.tokens < 1:
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                self.cond.wait(wait)
+
+    def release(self, outcome, latency=None, retry_after=None):
+        """回報請求結果並調整速率。"""
+        with self.cond:
+            self.in_flight -= 1
+            self.counts[outcome] += 1
+            now = time.monotonic()
+            if outcome == OK:
+                if latency is None or latency <= self.latency_target:
+                    self.rate = min(self.max_rate, self.rate + 1.0 / max(self.rate, 1.0))
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+                elif self._may_decrease(now):
+                    self.concurrency = max(1.0, self.concurrency * SLOW_FACTOR)
+            elif outcome == THROTTLED:
+                pause = retry_after if retry_after is not None else PAUSE_SECONDS
+                self.paused_until = max(self.paused_until, now + pause)
+                if self._may_decrease(now):
+                    self.rate = max(self.min_rate, self.rate * THROTTLE_FACTOR)
+                    self.concurrency = max(1.0, self.concurrency * THROTTLE_FACTOR)
+                    print(f"[限速] {self.name} 回應異常，速率降為 {self.rate:.1f} 次/秒、"
+                          f"並行 {int(self.concurrency)}，暫停 {pause:.0f} 秒")
+            self.cond.notify_all()
+
+    def _may_decrease(self, now):
+        # 一輪（約一個延遲目標的時間）內只減少一次
+        if now - self.last_decrease < self.latency_target:
+            return False
+        self.last_decrease = now
+        return True
+
+    @contextmanager
+    def slot(self):
+        """取得許可並在結束時回報；區塊內以 result.update(outcome=..., retry_after=...) 記錄結果。"""
+        self.acquire()
+        result = {'outcome': THROTTLED, 'retry_after': None}
+        started = time.monotonic()
+        try:
+            yield result
+        finally:
+            self.release(result['outcome'], time.monotonic() - started, result['retry_after'])
+
+    def stats(self):
+        with self.cond:
+            return {'rate': self.rate, 'concurrency': int(self.concurrency), 'in_flight': self.in_flight,
+                    **self.counts}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url):
+    """取得 url 所屬主機的共用限速器。"""
+    host = urlsplit(url).netloc
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = AdaptiveLimiter(host)
+        return limiter
+
+
+def all_stats():
+    """各主機限速器目前的狀態。"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+metrics.register_gauge('rate_limit_rate', lambda: {(('host', host),): round(s['rate'], 3)
+                                                   for host, s in all_stats().items()})
+metrics.register_gauge('rate_limit_concurrency', lambda: {(('host', host),): s['concurrency']
+                                                          for host, s in all_stats().items()})
@@ -0,0 +1,672 @@
+"""
+scash_data.db 的連線、資料表結構與批次寫入器。
+
+- connect()：套用 WAL 與 synchronous=NORMAL 等設定，讀取端（匯出、查詢）可與掃描同時進行
+- init_schema()：建立所有資料表，舊版資料庫會先就地轉換為精簡結構
+- 精簡結構：地址存於 address 表、其他表只存整數編號；txid 存為 32 bytes BLOB；
+  tx / block_output / 地址餘額的金額存為整數聰（1 SCASH = 10^8 聰），讀寫時以
+  to_sat()/from_sat()、txid_blob()/txid_hex()、address_ids() 轉換
+- scan_state / address_refresh：掃描進度與最近查詢過餘額的地址，重新啟動後可從中斷處繼續
+- write_block_summary() / rebuild_transfers()：寫入不受閾值影響的區塊資料，並依閾值重建 block/tx
+- dashboard_stats：儀表板的總計數值，由觸發器隨 tx 與地址餘額表增量維護
+- tx_large_change：大額轉帳有變動的區塊與遞增序號，由觸發器寫入（儀表板匯出據此只重寫變動後的分頁）
+- balance_history：地址餘額的每次變動，同樣由觸發器寫入（供 api_server 查詢）
+- BatchWriter：掃描程式唯一的寫入連線，累積到一定列數或時間才提交一次；
+  get_writer() 取得共用實例，flush() 可在 Ctrl+C 或匯出前強制提交
+"""
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+import metrics
+
+SAT = 100_000_000  # 1 SCASH = 10^8 聰
+LARGE_TX_AMOUNT = 500  # 儀表板「大額轉帳」的門檻（SCASH）
+LARGE_TX_SAT = LARGE_TX_AMOUNT * SAT
+ADDRESS_CACHE_MAX = 200_000  # BatchWriter 快取的地址編號數上限
+
+
+def to_sat(amount):
+    """SCASH 金額轉為整數聰。"""
+    return None if amount is None else int(round(amount * SAT))
+
+
+def from_sat(value):
+    """整數聰轉回 SCASH 金額。"""
+    return None if value is None else value / SAT
+
+
+def txid_blob(txid):
+    """64 位十六進位 txid 轉為 32 bytes；格式不符時原樣保留字串。"""
+    if isinstance(txid, str) and len(txid) == 64:
+        try:
+            return bytes.fromhex(txid)
+        except ValueError:
+            pass
+    return txid
+
+
+def txid_hex(value):
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def _query(db, sql, params=()):
+    # BatchWriter 的 query 會持有寫入鎖；一般連線直接查詢
+    if hasattr(db, 'query'):
+        return db.query(sql, params)
+    return db.execute(sql, params).fetchall()
+
+
+def find_address_id(db, address):
+    """查詢地址編號（不新增），沒有時回傳 None。"""
+    cache = getattr(db, 'address_cache', None)
+    if cache is not None and address in cache:
+        return cache[address]
+    rows = _query(db, 'SELECT id FROM address WHERE address=?', (address,))
+    if not rows:
+        return None
+    if cache is not None:
+        cache[address] = rows[0][0]
+    return rows[0][0]
+
+
+def address_ids(db, addresses):
+    """取得地址編號，沒有的先新增，回傳 {地址: 編號}；db 為 BatchWriter 或可寫入的連線。"""
+    cache = getattr(db, 'address_cache', None)
+    result = {}
+    missing = []
+    for address in set(addresses):
+        if cache is not None and address in cache:
+            result[address] = cache[address]
+        else:
+            missing.append(address)
+    if missing:
+        db.executemany('INSERT OR IGNORE INTO address (address) VALUES (?)', [(a,) for a in missing])
+        for address in missing:
+            result[address] = _query(db, 'SELECT id FROM address WHERE address=?', (address,))[0][0]
+        if cache is not None:
+            if len(cache) + len(missing) > ADDRESS_CACHE_MAX:
+                cache.clear()
+            cache.update((address, result[address]) for address in missing)
+    return result
+
+
+def connect(path=None, readonly=False):
+    """開啟資料庫連線；readonly=True 時以唯讀模式開啟（供匯出與查詢使用）。"""
+    path = path or config.DB_FILE
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # INSERT OR REPLACE 刪除舊列時也要觸發 DELETE 觸發器，dashboard_stats 才會正確
+        conn.execute('PRAGMA recursive_triggers=ON')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=10000')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-65536')  # 64 MB
+    return conn
+
+
+def _create_tables(c):
+    # 區塊表：block_height 主鍵，txids 為 JSON 字串
+    c.execute('''CREATE TABLE IF NOT EXISTS block (
+        block_height INTEGER PRIMARY KEY,
+        txids TEXT
+    )''')
+    # 地址字典：其他表以 id 參照地址
+    c.execute('''CREATE TABLE IF NOT EXISTS address (
+        id INTEGER PRIMARY KEY,
+        address TEXT NOT NULL UNIQUE
+    )''')
+    # 交易表：每一筆 address/amount/transfer_time 都是一列，amount 為聰
+    c.execute('''CREATE TABLE IF NOT EXISTS tx (
+        txid BLOB,
+        block_height INTEGER,
+        address_id INTEGER,
+        amount INTEGER,
+        transfer_time TEXT,
+        PRIMARY KEY (txid, address_id),
+        FOREIGN KEY (block_height) REFERENCES block(block_height)
+    )''')
+    # 依地址、依區塊範圍查詢轉帳（api_server、分叉回滾）
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tx_address ON tx(address_id, block_height)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tx_height ON tx(block_height)')
+    # 匯出的大額轉帳（部分索引只包含 > LARGE_TX_AMOUNT 的列，查詢條件需寫成同樣的常數）
+    c.execute(f'CREATE INDEX IF NOT EXISTS idx_tx_large ON tx(block_height, amount) WHERE amount > {LARGE_TX_SAT}')
+    # 區塊摘要表：不受 THRESHOLD 影響，每個已掃描區塊一列
+    c.execute('''CREATE TABLE IF NOT EXISTS block_summary (
+        block_height INTEGER PRIMARY KEY,
+        block_time TEXT,
+        total_amount REAL,
+        tx_count INTEGER
+    )''')
+    # 區塊輸出表：每筆轉帳（coinbase 除外）的所有輸出，tx_amount 為該交易的金額（皆為聰）
+    c.execute('''CREATE TABLE IF NOT EXISTS block_output (
+        txid BLOB,
+        address_id INTEGER,
+        block_height INTEGER,
+        tx_amount INTEGER,
+        amount INTEGER,
+        PRIMARY KEY (txid, address_id)
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_block_output_height ON block_output(block_height)')
+    # 區塊雜湊：追蹤鏈頂時用來偵測分叉
+    c.execute('''CREATE TABLE IF NOT EXISTS block_hash (
+        block_height INTEGER PRIMARY KEY,
+        hash TEXT
+    )''')
+    # 地址餘額表，balance 為聰
+    c.execute('''CREATE TABLE IF NOT EXISTS scash_address_balances (
+        address_id INTEGER PRIMARY KEY,
+        balance INTEGER,
+        scan_time TEXT,
+        update_time TEXT,
+        update_count INTEGER,
+        change_str TEXT
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_balances_balance ON scash_address_balances(balance)')
+    # 地址餘額變動紀錄：change 為相對上一次的變化量（聰），新增地址時為 NULL
+    c.execute('''CREATE TABLE IF NOT EXISTS balance_history (
+        address_id INTEGER,
+        balance INTEGER,
+        change INTEGER,
+        update_time TEXT
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_balance_history_address ON balance_history(address_id)')
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+# 舊版 → 精簡結構：新表欄位與由舊表（別名 o，地址編號 a.id）取值的運算式
+_COMPACT_COPY = {
+    'tx': ('rowid, txid, block_height, address_id, amount, transfer_time',
+           'o.rowid, txid_blob(o.txid), o.block_height, a.id, to_sat(o.amount), o.transfer_time'),
+    'block_output': ('rowid, txid, address_id, block_height, tx_amount, amount',
+                     'o.rowid, txid_blob(o.txid), a.id, o.block_height, to_sat(o.tx_amount), to_sat(o.amount)'),
+    'scash_address_balances': ('address_id, balance, scan_time, update_time, update_count, change_str',
+                               'a.id, to_sat(o.balance), o.scan_time, o.update_time, o.update_count, o.change_str'),
+    'balance_history': ('rowid, address_id, balance, change, update_time',
+                        'o.rowid, a.id, to_sat(o.balance), to_sat(o.change), o.update_time'),
+}
+
+
+def migrate_compact(conn):
+    """
+    將舊版結構（TEXT 地址、十六進位 txid、REAL 金額）就地轉換為精簡結構，回傳是否有轉換。
+    保留原本的 rowid（匯出與重建 block.txids 依賴寫入順序），轉換完成後 VACUUM 釋放空間。
+    """
+    tables = [t for t in _COMPACT_COPY if 'address' in _columns(conn, t)]
+    if not tables:
+        return False
+    print(f"正在將資料庫轉換為精簡結構（{', '.join(tables)}），資料量大時需要數分鐘...")
+    conn.create_function('txid_blob', 1, txid_blob, deterministic=True)
+    conn.create_function('to_sat', 1, to_sat, deterministic=True)
+    c = conn.cursor()
+    c.execute('BEGIN')
+    # 觸發器與索引引用舊欄位，先移除，轉換後由 init_schema 重建
+    for (name,) in c.execute("SELECT name FROM sqlite_master WHERE type='trigger'").fetchall():
+        c.execute(f'DROP TRIGGER {name}')
+    for table in tables:
+        for (name,) in c.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+                                 (table,)).fetchall():
+            c.execute(f'DROP INDEX {name}')
+        c.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+    _create_tables(c)
+    for table in tables:
+        c.execute(f'INSERT OR IGNORE INTO address (address) SELECT DISTINCT address FROM {table}_old WHERE address IS NOT NULL')
+    for table in tables:
+        columns, values = _COMPACT_COPY[table]
+        c.execute(f'''INSERT OR REPLACE INTO {table} ({columns})
+                      SELECT {values} FROM {table}_old o JOIN address a ON a.address = o.address
+                      ORDER BY o.rowid''')
+        c.execute(f'DROP TABLE {table}_old')
+    c.execute('DROP TABLE IF EXISTS dashboard_stats')
+    c.execute('DROP TABLE IF EXISTS address_flow')
+    c.execute('DROP TABLE IF EXISTS address_flow_daily')
+    c.execute('DROP TABLE IF EXISTS tx_large_change')
+    conn.commit()
+    c.execute('VACUUM')
+    print("資料庫轉換完成。")
+    return True
+
+
+def init_schema(conn):
+    migrate_compact(conn)
+    c = conn.cursor()
+    _create_tables(c)
+    # 儀表板總計：name -> value（金額為聰），由下方觸發器在每次寫入時增量更新
+    c.execute('''CREATE TABLE IF NOT EXISTS dashboard_stats (
+        name TEXT PRIMARY KEY,
+        value REAL
+    )''')
+    # 每個地址的轉入統計與每日彙總（金額為聰），同樣由觸發器隨 tx 的寫入增量維護
+    c.execute('''CREATE TABLE IF NOT EXISTS address_flow (
+        address_id INTEGER PRIMARY KEY,
+        tx_count INTEGER,
+        amount INTEGER,
+        large_count INTEGER,
+        large_amount INTEGER,
+        first_block INTEGER,
+        last_block INTEGER
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_address_flow_amount ON address_flow(amount)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_address_flow_tx_count ON address_flow(tx_count)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_address_flow_large ON address_flow(large_count)')
+    c.execute('''CREATE TABLE IF NOT EXISTS address_flow_daily (
+        address_id INTEGER,
+        day TEXT,
+        tx_count INTEGER,
+        amount INTEGER,
+        large_count INTEGER,
+        PRIMARY KEY (address_id, day)
+    ) WITHOUT ROWID''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_address_flow_daily_day ON address_flow_daily(day)')
+    # 大額轉帳有增刪改的區塊：block_height -> 遞增的變動序號，儀表板匯出以此判斷要從哪一頁重寫
+    # （rowid 會被重複使用，列數與最大 rowid 無法察覺刪除後又寫入相同筆數的情況）
+    c.execute('''CREATE TABLE IF NOT EXISTS tx_large_change (
+        block_height INTEGER PRIMARY KEY,
+        seq INTEGER
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tx_large_change_seq ON tx_large_change(seq)')
+    for sql in _STATS_TRIGGERS + _HISTORY_TRIGGERS + _FLOW_TRIGGERS + _CHANGE_TRIGGERS:
+        c.execute(sql)
+    if c.execute('SELECT COUNT(*) FROM dashboard_stats').fetchone()[0] == 0:
+        rebuild_dashboard_stats(conn)
+    c.execute("INSERT OR IGNORE INTO dashboard_stats (name, value) VALUES ('balance_changes', 0)")
+    conn.commit()
+    # 既有資料庫第一次建立轉入統計時由 tx 計算一次，之後只靠觸發器維護
+    if not c.execute('SELECT EXISTS (SELECT 1 FROM address_flow)').fetchone()[0] \
+            and c.execute('SELECT EXISTS (SELECT 1 FROM tx)').fetchone()[0]:
+        rebuild_address_flow(conn)
+    # 掃描進度：每個掃描範圍一列，last_height 為該範圍已連續提交的最高區塊
+    c.execute('''CREATE TABLE IF NOT EXISTS scan_state (
+        name TEXT PRIMARY KEY,
+        start_height INTEGER,
+        end_height INTEGER,
+        last_height INTEGER,
+        update_time TEXT
+    )''')
+    # 最近查詢過餘額的地址（refresh_time 為 Unix 秒），重新啟動後不必再查一次
+    c.execute('''CREATE TABLE IF NOT EXISTS address_refresh (
+        address TEXT PRIMARY KEY,
+        refresh_time REAL
+    )''')
+    # 因新交易而需要重新查詢餘額的地址，由 balance_refresh 處理後刪除
+    c.execute('''CREATE TABLE IF NOT EXISTS address_dirty (
+        address TEXT PRIMARY KEY,
+        block_height INTEGER
+    )''')
+    conn.commit()
+
+
+_STATS_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_stats_insert AFTER INSERT ON tx BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'tx_count';
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'tx_large_count' AND NEW.amount > {LARGE_TX_SAT};
+        UPDATE dashboard_stats SET value = value + NEW.amount WHERE name = 'tx_large_volume' AND NEW.amount > {LARGE_TX_SAT};
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_stats_delete AFTER DELETE ON tx BEGIN
+        UPDATE dashboard_stats SET value = value - 1 WHERE name = 'tx_count';
+        UPDATE dashboard_stats SET value = value - 1 WHERE name = 'tx_large_count' AND OLD.amount > {LARGE_TX_SAT};
+        UPDATE dashboard_stats SET value = value - OLD.amount WHERE name = 'tx_large_volume' AND OLD.amount > {LARGE_TX_SAT};
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_stats_update AFTER UPDATE OF amount ON tx BEGIN
+        UPDATE dashboard_stats SET value = value - 1 WHERE name = 'tx_large_count' AND OLD.amount > {LARGE_TX_SAT};
+        UPDATE dashboard_stats SET value = value - OLD.amount WHERE name = 'tx_large_volume' AND OLD.amount > {LARGE_TX_SAT};
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'tx_large_count' AND NEW.amount > {LARGE_TX_SAT};
+        UPDATE dashboard_stats SET value = value + NEW.amount WHERE name = 'tx_large_volume' AND NEW.amount > {LARGE_TX_SAT};
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_balance_stats_insert AFTER INSERT ON scash_address_balances BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'address_count';
+        UPDATE dashboard_stats SET value = value + COALESCE(NEW.balance, 0) WHERE name = 'balance_total';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_balance_stats_delete AFTER DELETE ON scash_address_balances BEGIN
+        UPDATE dashboard_stats SET value = value - 1 WHERE name = 'address_count';
+        UPDATE dashboard_stats SET value = value - COALESCE(OLD.balance, 0) WHERE name = 'balance_total';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_balance_stats_update AFTER UPDATE OF balance ON scash_address_balances BEGIN
+        UPDATE dashboard_stats SET value = value + COALESCE(NEW.balance, 0) - COALESCE(OLD.balance, 0)
+            WHERE name = 'balance_total';
+    END''',
+    # balance_changes：地址餘額表任何一列新增、刪除或修改都加一，儀表板匯出只比對這一列即可知道排行榜是否要重讀
+    '''CREATE TRIGGER IF NOT EXISTS trg_balance_change_insert AFTER INSERT ON scash_address_balances BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'balance_changes';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_balance_change_delete AFTER DELETE ON scash_address_balances BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'balance_changes';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_balance_change_update AFTER UPDATE ON scash_address_balances BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'balance_changes';
+    END''',
+]
+
+_HISTORY_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS trg_balance_history_insert AFTER INSERT ON scash_address_balances BEGIN
+        INSERT INTO balance_history (address_id, balance, change, update_time)
+            VALUES (NEW.address_id, NEW.balance, NULL, NEW.scan_time);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_balance_history_update AFTER UPDATE OF balance ON scash_address_balances
+        WHEN NEW.balance IS NOT OLD.balance BEGIN
+        INSERT INTO balance_history (address_id, balance, change, update_time)
+            VALUES (NEW.address_id, NEW.balance, NEW.balance - OLD.balance, NEW.update_time);
+    END''',
+]
+
+
+def _flow_add(row):
+    # 將一筆 tx（NEW）計入地址統計與當日彙總，每個表一個 UPSERT。
+    # 不能寫成 INSERT OR IGNORE 加 UPDATE：觸發器內的 OR IGNORE 會被外層 INSERT OR REPLACE 覆蓋，整列被換掉
+    day = f"COALESCE(substr({row}.transfer_time, 1, 10), '')"
+    large = f'({row}.amount > {LARGE_TX_SAT})'
+    return f'''
+        INSERT INTO address_flow (address_id, tx_count, amount, large_count, large_amount, first_block, last_block)
+            VALUES ({row}.address_id, 1, {row}.amount, {large}, {large} * {row}.amount, {row}.block_height, {row}.block_height)
+            ON CONFLICT (address_id) DO UPDATE SET tx_count = tx_count + 1, amount = amount + excluded.amount,
+                large_count = large_count + excluded.large_count, large_amount = large_amount + excluded.large_amount,
+                first_block = MIN(first_block, excluded.first_block), last_block = MAX(last_block, excluded.last_block);
+        INSERT INTO address_flow_daily (address_id, day, tx_count, amount, large_count)
+            VALUES ({row}.address_id, {day}, 1, {row}.amount, {large})
+            ON CONFLICT (address_id, day) DO UPDATE SET tx_count = tx_count + 1, amount = amount + excluded.amount,
+                large_count = large_count + excluded.large_count;'''
+
+
+def _flow_remove(row):
+    # 將一筆 tx（OLD）自統計扣除：移除的是最早或最晚的區塊時經 idx_tx_address 重新取得，計數歸零的列刪除
+    day = f"COALESCE(substr({row}.transfer_time, 1, 10), '')"
+    large = f'({row}.amount > {LARGE_TX_SAT})'
+    return f'''
+        UPDATE address_flow SET tx_count = tx_count - 1, amount = amount - {row}.amount,
+            large_count = large_count - {large}, large_amount = large_amount - {large} * {row}.amount,
+            first_block = CASE WHEN first_block = {row}.block_height
+                THEN (SELECT MIN(block_height) FROM tx WHERE address_id = {row}.address_id) ELSE first_block END,
+            last_block = CASE WHEN last_block = {row}.block_height
+                THEN (SELECT MAX(block_height) FROM tx WHERE address_id = {row}.address_id) ELSE last_block END
+            WHERE address_id = {row}.address_id;
+        DELETE FROM address_flow WHERE address_id = {row}.address_id AND tx_count <= 0;
+        UPDATE address_flow_daily SET tx_count = tx_count - 1, amount = amount - {row}.amount,
+            large_count = large_count - {large}
+            WHERE address_id = {row}.address_id AND day = {day};
+        DELETE FROM address_flow_daily WHERE address_id = {row}.address_id AND day = {day} AND tx_count <= 0;'''
+
+
+# INSERT OR REPLACE 取代舊列時（recursive_triggers=ON）會先觸發 DELETE 觸發器，不會重複計算
+_FLOW_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_flow_insert AFTER INSERT ON tx BEGIN{_flow_add('NEW')}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_flow_delete AFTER DELETE ON tx BEGIN{_flow_remove('OLD')}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_flow_update
+        AFTER UPDATE OF address_id, block_height, amount, transfer_time ON tx BEGIN{_flow_remove('OLD')}{_flow_add('NEW')}
+    END''',
+]
+
+
+def _mark_change(row):
+    # 以目前最大序號 + 1 標記該區塊（idx_tx_large_change_seq 取最大值）
+    return f'''
+        INSERT INTO tx_large_change (block_height, seq)
+            VALUES ({row}.block_height, (SELECT COALESCE(MAX(seq), 0) + 1 FROM tx_large_change))
+            ON CONFLICT (block_height) DO UPDATE SET seq = excluded.seq;'''
+
+
+_CHANGE_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_change_insert AFTER INSERT ON tx
+        WHEN NEW.amount > {LARGE_TX_SAT} BEGIN{_mark_change('NEW')}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_change_delete AFTER DELETE ON tx
+        WHEN OLD.amount > {LARGE_TX_SAT} BEGIN{_mark_change('OLD')}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_tx_change_update AFTER UPDATE ON tx
+        WHEN OLD.amount > {LARGE_TX_SAT} OR NEW.amount > {LARGE_TX_SAT} BEGIN{_mark_change('OLD')}{_mark_change('NEW')}
+    END''',
+]
+
+_SAT_STATS = ('tx_large_volume', 'balance_total')  # dashboard_stats 中以聰儲存的項目
+
+
+def rebuild_dashboard_stats(conn):
+    """由資料表重新計算 dashboard_stats（建立表格時，或以外部工具改過資料後使用）。"""
+    conn.execute("DELETE FROM dashboard_stats WHERE name != 'balance_changes'")
+    conn.execute(f'''INSERT INTO dashboard_stats (name, value)
+                     SELECT 'tx_count', COUNT(*) FROM tx
+                     UNION ALL SELECT 'tx_large_count', COUNT(*) FROM tx WHERE amount > {LARGE_TX_SAT}
+                     UNION ALL SELECT 'tx_large_volume', COALESCE(SUM(amount), 0) FROM tx WHERE amount > {LARGE_TX_SAT}
+                     UNION ALL SELECT 'address_count', COUNT(*) FROM scash_address_balances
+                     UNION ALL SELECT 'balance_total', COALESCE(SUM(balance), 0) FROM scash_address_balances''')
+    # 變動計數不歸零而是加一，重建也算一次變動，匯出端不會誤以為沒有變化
+    conn.execute('''INSERT INTO dashboard_stats (name, value) VALUES ('balance_changes', 1)
+                    ON CONFLICT (name) DO UPDATE SET value = value + 1''')
+    conn.commit()
+
+
+def rebuild_address_flow(conn):
+    """由 tx 重新計算 address_flow 與 address_flow_daily（既有資料庫第一次建立時，或以外部工具改過 tx 後使用）。"""
+    conn.execute('DELETE FROM address_flow')
+    conn.execute('DELETE FROM address_flow_daily')
+    conn.execute(f'''INSERT INTO address_flow (address_id, tx_count, amount, large_count, large_amount,
+                                               first_block, last_block)
+                     SELECT address_id, COUNT(*), SUM(amount), SUM(amount > {LARGE_TX_SAT}),
+                            SUM(CASE WHEN amount > {LARGE_TX_SAT} THEN amount ELSE 0 END),
+                            MIN(block_height), MAX(block_height)
+                     FROM tx GROUP BY address_id''')
+    conn.execute(f'''INSERT INTO address_flow_daily (address_id, day, tx_count, amount, large_count)
+                     SELECT address_id, COALESCE(substr(transfer_time, 1, 10), ''), COUNT(*), SUM(amount),
+                            SUM(amount > {LARGE_TX_SAT})
+                     FROM tx GROUP BY 1, 2''')
+    conn.commit()
+
+
+def load_dashboard_stats(conn):
+    """讀取 dashboard_stats，金額換算為 SCASH。"""
+    stats = dict(conn.execute('SELECT name, value FROM dashboard_stats'))
+    for name in _SAT_STATS:
+        if name in stats:
+            stats[name] = from_sat(stats[name])
+    return stats
+
+
+def write_block_summary(db, data):
+    """寫入不受閾值影響的區塊摘要、區塊雜湊與所有轉帳輸出（db 為 BatchWriter 或可寫入的連線）。"""
+    block_height = data['block_height']
+    db.execute('''INSERT OR REPLACE INTO block_summary (block_height, block_time, total_amount, tx_count)
+                  VALUES (?, ?, ?, ?)''',
+               (block_height, data['time_str'], data['total_amount'],
+                len({row[0] for row in data['summary_outputs']})))
+    if data.get('block_hash'):
+        db.execute('INSERT OR REPLACE INTO block_hash (block_height, hash) VALUES (?, ?)',
+                   (block_height, data['block_hash']))
+    db.execute('DELETE FROM block_output WHERE block_height=?', (block_height,))
+    ids = address_ids(db, [row[2] for row in data['summary_outputs']])
+    db.executemany('''INSERT OR REPLACE INTO block_output (txid, address_id, block_height, tx_amount, amount)
+                      VALUES (?, ?, ?, ?, ?)''',
+                   [(txid_blob(txid), ids[address], block_height, to_sat(tx_amount), to_sat(amount))
+                    for txid, tx_amount, address, amount in data['summary_outputs']])
+
+
+def rebuild_transfers(conn, threshold, start_height=None, end_height=None):
+    """
+    依 block_summary/block_output 以閾值 threshold 重建 start_height ~ end_height（預設全部）的
+    block 與 tx 列，回傳重建的區塊數；不提交，由呼叫端決定。
+    篩選規則與掃描時相同：區塊總額、交易金額、輸出金額都需達閾值，並排除 50 SCASH 的挖礦獎勵。
+    """
+    # block_summary.total_amount 為 SCASH，block_output 的金額為聰
+    params = {'t': threshold, 't_sat': to_sat(threshold), 'reward': 50 * SAT,
+              'start': -1 if start_height is None else start_height,
+              'end': 1 << 62 if end_height is None else end_height}
+    heights = 'SELECT block_height FROM block_summary WHERE block_height BETWEEN :start AND :end'
+    c = conn.cursor()
+    c.execute(f'DELETE FROM tx WHERE block_height IN ({heights})', params)
+    c.execute(f'DELETE FROM block WHERE block_height IN ({heights})', params)
+    c.execute('''INSERT OR REPLACE INTO tx (txid, block_height, address_id, amount, transfer_time)
+                 SELECT o.txid, o.block_height, o.address_id, o.amount, s.block_time
+                 FROM block_output o JOIN block_summary s ON s.block_height = o.block_height
+                 WHERE s.block_height BETWEEN :start AND :end
+                   AND s.total_amount >= :t AND o.tx_amount >= :t_sat
+                   AND o.tx_amount != :reward AND o.amount >= :t_sat''', params)
+    # block.txids 依掃描時的優先順序：整數位與區塊總額相同的轉帳在前
+    rows = c.execute('''SELECT s.block_height, s.total_amount, o.txid, MAX(o.tx_amount)
+                        FROM block_output o JOIN block_summary s ON s.block_height = o.block_height
+                        WHERE s.block_height BETWEEN :start AND :end
+                          AND s.total_amount >= :t AND o.tx_amount >= :t_sat
+                          AND o.tx_amount != :reward
+                        GROUP BY s.block_height, o.txid
+                        ORDER BY s.block_height, MIN(o.rowid)''', params).fetchall()
+    blocks = {}
+    for block_height, total_amount, txid, tx_amount in rows:
+        blocks.setdefault(block_height, (int(total_amount), [], []))
+        total_int, first, rest = blocks[block_height]
+        (first if tx_amount // SAT == total_int else rest).append(txid_hex(txid))
+    c.executemany('INSERT OR REPLACE INTO block (block_height, txids) VALUES (?, ?)',
+                  [(h, json.dumps(first + rest)) for h, (_, first, rest) in blocks.items()])
+    return len(blocks)
+
+
+def save_scan_state(db, name, start_height, end_height, last_height):
+    """記錄掃描範圍 name 已連續提交到 last_height（db 為 BatchWriter 或連線）。"""
+    db.execute('''INSERT OR REPLACE INTO scan_state (name, start_height, end_height, last_height, update_time)
+                  VALUES (?, ?, ?, ?, ?)''',
+               (name, start_height, end_height, last_height, time.strftime('%Y-%m-%d %H:%M:%S')))
+
+
+def load_scan_state(conn, name):
+    """回傳 (start_height, end_height, last_height)，沒有紀錄時回傳 None。"""
+    return conn.execute('SELECT start_height, end_height, last_height FROM scan_state WHERE name=?',
+                        (name,)).fetchone()
+
+
+def mark_address_refreshed(db, address, when=None):
+    db.execute('INSERT OR REPLACE INTO address_refresh (address, refresh_time) VALUES (?, ?)',
+               (address, time.time() if when is None else when))
+
+
+def load_refresh_times(db, max_age, limit=None):
+    """max_age 秒內查詢過餘額的 [(地址, 查詢時間)]，由舊到新；有 limit 時只取最近的 limit 筆。"""
+    sql = 'SELECT address, refresh_time FROM address_refresh WHERE refresh_time >= ? ORDER BY refresh_time DESC'
+    if limit:
+        sql += f' LIMIT {int(limit)}'
+    return _query(db, sql, (time.time() - max_age,))[::-1]
+
+
+def address_refresh_time(db, address):
+    """地址上次查詢餘額的時間（Unix 秒），沒有紀錄時回傳 None。"""
+    rows = _query(db, 'SELECT refresh_time FROM address_refresh WHERE address=?', (address,))
+    return rows[0][0] if rows else None
+
+
+class BatchWriter:
+    """
+    長駐的單一寫入連線。呼叫端用 execute/executemany 寫入後呼叫 maybe_commit()，
+    累積超過 WRITER_BATCH_ROWS 列或距上次提交超過 WRITER_BATCH_SECONDS 秒才真正提交。
+    每個區塊在 atomic() 內寫入（SAVEPOINT），中途失敗時整個區塊回復，atomic() 期間也不會提交，
+    因此每次提交都只包含完整的區塊；中斷時最多遺失最後一批尚未提交的區塊。
+    """
+
+    def __init__(self, path=None, batch_rows=None, batch_seconds=None):
+        self.path = path or config.DB_FILE
+        self.batch_rows = batch_rows or config.WRITER_BATCH_ROWS
+        self.batch_seconds = batch_seconds if batch_seconds is not None else config.WRITER_BATCH_SECONDS
+        self.conn = connect(self.path)
+        self.lock = threading.RLock()
+        self.pending_rows = 0
+        self.last_commit = time.monotonic()
+        self.commit_hooks = []  # 每次提交後呼叫，例如更新已提交的 watermark
+        self.address_cache = {}  # 地址 -> 編號；atomic() 回復時清空，避免留下已回復的編號
+        self.atomic_depth = 0
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            self.pending_rows += 1
+            return self.conn.execute(sql, params)
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        with self.lock:
+            self.pending_rows += len(rows)
+            return self.conn.executemany(sql, rows)
+
+    def query(self, sql, params=()):
+        """在寫入連線上讀取（可讀到尚未提交的寫入），回傳所有列。"""
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    @contextmanager
+    def atomic(self):
+        """持有寫入鎖並以 SAVEPOINT 包住一段寫入：發生例外時回復這段寫入後再拋出。"""
+        with self.lock:
+            if not self.conn.in_transaction:
+                # 先開啟外層交易，RELEASE 才不會直接提交，仍由批次提交決定時機
+                self.conn.execute('BEGIN')
+            name = f'block_{self.atomic_depth}'
+            pending_rows = self.pending_rows
+            self.conn.execute(f'SAVEPOINT {name}')
+            self.atomic_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.conn.execute(f'ROLLBACK TO {name}')
+                self.conn.execute(f'RELEASE {name}')
+                self.pending_rows = pending_rows
+                self.address_cache.clear()
+                raise
+            else:
+                self.conn.execute(f'RELEASE {name}')
+            finally:
+                self.atomic_depth -= 1
+
+    def maybe_commit(self):
+        with self.lock:
+            if self.atomic_depth:
+                return
+            if self.pending_rows >= self.batch_rows or \
+                    time.monotonic() - self.last_commit >= self.batch_seconds:
+                self.flush()
+
+    def flush(self):
+        """立即提交目前累積的寫入（在 atomic() 內呼叫時延到區塊寫完後的下一次提交）。"""
+        with self.lock:
+            if self.atomic_depth:
+                return
+            if self.conn.in_transaction:
+                with metrics.timer('db_commit_seconds'):
+                    self.conn.commit()
+                metrics.inc('db_rows_total', self.pending_rows)
+            self.pending_rows = 0
+            self.last_commit = time.monotonic()
+            for hook in self.commit_hooks:
+                hook()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """取得共用的 BatchWriter（DB_FILE 變更時重新開啟）。"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.path != config.DB_FILE:
+            if _writer is not None:
+                _writer.close()
+            _writer = BatchWriter()
+    return _writer
+
+
+@atexit.register
+def close_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
@@ -0,0 +1,217 @@
+"""
+離線端對端效能測試：以 tools/stub_explorer.py 的替身瀏覽器模擬不同長度的鏈，量測掃描、餘額更新與匯出。
+
+用法：
+    python tools/benchmark.py [--sizes 100,500,2000] [--latency 0] [--error-rate 0] [--json result.json]
+
+每個鏈長度各在一個全新的子行程與暫存目錄中執行（資料庫、匯出檔都不會動到專案本身），依序量測：
+- scan：逐塊呼叫 process_and_record_block（與自動查詢模式相同的路徑）——blocks/s、pages/s、DB rows/s
+- parse：區塊、交易、地址頁各自的 html_extract 解析毫秒數（不含網路）
+- balances：將所有地址標記為待更新後執行 auto_update_all_address_balances——addresses/s
+- export：export_dashboard_data 完整匯出與沒有變動時的增量匯出秒數
+數據取自 metrics 模組，結果以表格輸出，也可用 --json 存檔後比較不同版本。
+"""
+import argparse
+import importlib
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PARSE_SAMPLES = 20   # 每種頁面取樣幾頁量測解析時間
+PARSE_ROUNDS = 20    # 每頁重複解析次數
+
+COLUMNS = [
+    ('blocks', '區塊數', '{:d}'),
+    ('blocks_per_sec', 'blocks/s', '{:.1f}'),
+    ('pages_per_sec', 'pages/s', '{:.1f}'),
+    ('parse_ms_block', 'parse 區塊 ms', '{:.3f}'),
+    ('parse_ms_tx', 'parse 交易 ms', '{:.3f}'),
+    ('parse_ms_address', 'parse 地址 ms', '{:.3f}'),
+    ('db_rows_per_sec', 'DB rows/s', '{:.0f}'),
+    ('addresses_per_sec', 'addresses/s', '{:.1f}'),
+    ('export_full_sec', '完整匯出 s', '{:.3f}'),
+    ('export_incremental_sec', '增量匯出 s', '{:.4f}'),
+]
+
+
+def _counter(name, **labels):
+    import metrics
+    series = metrics.snapshot()['counters'].get(name, {})
+    want = ','.join(f'{k}={v}' for k, v in sorted(labels.items()))
+    return sum(v for k, v in series.items() if not labels or k == want)
+
+
+def _histogram_sum(name, label):
+    import metrics
+    return metrics.snapshot()['histograms'].get(name, {}).get(label, {}).get('sum', 0.0)
+
+
+def _parse_ms(url, size):
+    """從替身伺服器抓取樣本頁面，量測每頁的解析毫秒數。"""
+    import requests
+    from html_extract import parse_address_page, parse_block_page, parse_tx_page
+    session = requests.Session()
+    step = max(1, size // PARSE_SAMPLES)
+    blocks, txs, addresses = [], [], []
+    for height in range(1, size + 1, step):
+        text = session.get(f'{url}/?search={height}').text
+        blocks.append(text)
+        for first, _, txid in parse_block_page(text).items:
+            if txid and not first and len(txs) < PARSE_SAMPLES:
+                page = session.get(f'{url}/tx/{txid}').text
+                txs.append(page)
+                for address, _ in parse_tx_page(page).outputs[:1]:
+                    addresses.append(session.get(f'{url}/?search={address}&utxolookup=1').text)
+    result = {}
+    for kind, parser, pages in (('block', parse_block_page, blocks), ('tx', parse_tx_page, txs),
+                                ('address', parse_address_page, addresses)):
+        started = time.perf_counter()
+        for _ in range(PARSE_ROUNDS):
+            for page in pages:
+                parser(page)
+        count = PARSE_ROUNDS * len(pages)
+        result[f'parse_ms_{kind}'] = (time.perf_counter() - started) * 1000 / count if count else 0.0
+    return result
+
+
+def run_single(size, url, workdir, rate):
+    """子行程：在 workdir 中以全新的資料庫掃描 1 ~ size，回傳量測結果。"""
+    import config
+    config.BASE_URL = url
+    config.DB_FILE = os.path.join(workdir, 'scash_data.db')
+    config.PAGE_CACHE_FILE = ''
+    config.SHOW_RESULT = False
+    config.SCAN_TRUE = False
+    config.METRICS_PORT = 0
+    config.METRICS_FILE = ''
+    config.PROFILE_MODE = ''
+    # 量測程式本身的吞吐量，限速器直接以上限速率與最大並行數開始
+    config.HTTP_RATE_INITIAL = config.HTTP_RATE_MAX = rate
+    config.HTTP_CONCURRENCY_INITIAL = config.HTTP_POOL_SIZE
+    # 匯出檔寫到暫存目錄，不覆寫專案的 assets/
+    export_module = importlib.import_module('export_dashboard_data')
+    export_module.SUMMARY_FILE = os.path.join(workdir, 'assets', 'dashboard_data.js')
+    export_module.CHUNK_DIR = os.path.join(workdir, 'assets', 'data')
+    scanner = runpy.run_path(os.path.join(ROOT, 'SCASH Transfer.py'), run_name='scash')
+    from balance_refresh import mark_dirty
+    from scash_db import get_writer
+    scanner['init_db']()
+    cache = scanner['get_balance_cache']()
+    result = {'blocks': size}
+
+    started = time.perf_counter()
+    for height in range(1, size + 1):
+        if not scanner['process_and_record_block'](height, cache, ('main', 1, size)):
+            raise RuntimeError(f'區塊 {height} 掃描失敗')
+    get_writer().flush()
+    elapsed = time.perf_counter() - started
+    result['scan_sec'] = elapsed
+    result['blocks_per_sec'] = size / elapsed
+    result['pages_per_sec'] = _counter('http_requests_total') / elapsed
+    write_sec = _histogram_sum('stage_seconds', 'stage=write') + _histogram_sum('db_commit_seconds', '')
+    result['db_rows'] = _counter('db_rows_total')
+    result['db_rows_per_sec'] = result['db_rows'] / write_sec if write_sec else 0.0
+
+    writer = get_writer()
+    # 掃描時剛查過的地址仍在 TTL 內會被略過，量測時讓所有地址都視為過期
+    config.ADDRESS_REFRESH_TTL = 0
+    with writer.lock:
+        addresses = [row[0] for row in writer.query('SELECT address FROM address')]
+        mark_dirty(writer, addresses, 0)
+        writer.flush()
+    started = time.perf_counter()
+    scanner['auto_update_all_address_balances']()
+    elapsed = time.perf_counter() - started
+    result['addresses'] = len(addresses)
+    result['addresses_per_sec'] = len(addresses) / elapsed if elapsed else 0.0
+
+    get_writer().flush()
+    started = time.perf_counter()
+    export_module.export_dashboard_data(force=True)
+    result['export_full_sec'] = time.perf_counter() - started
+    started = time.perf_counter()
+    export_module.export_dashboard_data()
+    result['export_incremental_sec'] = time.perf_counter() - started
+
+    result.update(_parse_ms(url, size))
+    return result
+
+
+def _print_table(results):
+    widths = [max(len(title), 10) for _, title, _ in COLUMNS]
+    print('  '.join(title.rjust(w) for (_, title, _), w in zip(COLUMNS, widths)))
+    for row in results:
+        print('  '.join(fmt.format(row[key]).rjust(w) for (key, _, fmt), w in zip(COLUMNS, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,500,2000', help='以逗號分隔的鏈長度（區塊數）')
+    parser.add_argument('--seed', type=int, default=1, help='假鏈的亂數種子')
+    parser.add_argument('--latency', type=float, default=0, help='替身伺服器每個回應的延遲毫秒數')
+    parser.add_argument('--jitter', type=float, default=0, help='延遲的隨機變動範圍（±毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='替身伺服器回傳 503 的比例')
+    parser.add_argument('--rate', type=float, default=1000, help='掃描程式的請求速率上限（次/秒）')
+    parser.add_argument('--json', help='將結果寫入此 JSON 檔')
+    parser.add_argument('--keep', action='store_true', help='保留各次執行的暫存目錄')
+    parser.add_argument('--verbose', action='store_true', help='顯示掃描程式本身的輸出')
+    # 內部使用：子行程執行單一鏈長度
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_single(args.single, args.url, args.workdir, args.rate)
+        with open(os.path.join(args.workdir, 'result.json'), 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+
+    from stub_explorer import GeneratedChain, StubExplorer, make_server
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    explorer = StubExplorer(GeneratedChain(max(sizes), args.seed), args.latency, args.jitter,
+                            args.error_rate, seed=args.seed)
+    server = make_server(explorer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f"替身瀏覽器: {url}（延遲 {args.latency} ms，錯誤率 {args.error_rate}）")
+    results = []
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix=f'scash_bench_{size}_')
+        print(f"鏈長度 {size}：{workdir}")
+        cmd = [sys.executable, os.path.abspath(__file__), '--single', str(size), '--url', url,
+               '--workdir', workdir, '--rate', str(args.rate)]
+        output = None if args.verbose else subprocess.DEVNULL
+        code = subprocess.call(cmd, cwd=workdir, stdout=output)
+        result_file = os.path.join(workdir, 'result.json')
+        if code != 0 or not os.path.exists(result_file):
+            print(f"鏈長度 {size} 執行失敗（exit {code}），可加上 --verbose 檢視輸出。")
+        else:
+            with open(result_file, encoding='utf-8') as f:
+                results.append(json.load(f))
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    server.shutdown()
+    if not results:
+        sys.exit(1)
+    print()
+    _print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k not in ('single', 'url', 'workdir')},
+                       'results': results}, f, ensure_ascii=False, indent=1)
+        print(f"\n結果已寫入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+比對 html_extract 與原本 BeautifulSoup 寫法的擷取結果並計時。
+
+用法：python tools/check_extractor.py <頁面目錄> [重複次數]
+目錄中的 block_*.html、tx_*.html、address_*.html 分別視為區塊、交易、地址頁。
+需要另外安裝 beautifulsoup4（僅此工具使用）。
+"""
+import glob
+import os
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from html_extract import parse_address_page, parse_block_page, parse_tx_page  # noqa: E402
+
+
+def legacy_block(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    time_str = None
+    time_div = soup.find("div", class_="fw-bold", string="Time")
+    if time_div:
+        parent_div = time_div.find_parent("div", class_="ms-2 me-auto")
+        if parent_div:
+            time_str = parent_div.get_text(separator=" ", strip=True).replace("Time", "", 1).strip()
+    total = None
+    elem = soup.find(string=re.compile("Total amount in all outputs"))
+    if elem:
+        parent = elem.find_parent("li")
+        div = parent.find("div", class_="ms-2 me-auto") if parent else None
+        if div:
+            match = re.search(r"([\d'\.]+)\s*SCASH", div.get_text(separator=" ", strip=True))
+            if match:
+                total = float(match.group(1).replace("'", ""))
+    items = []
+    for li in soup.find_all("li", class_="list-group-item"):
+        div = li.find("div", class_="text-truncate")
+        first = bool(div and div.get_text(strip=True).startswith("1."))
+        amount = None
+        badge = li.find("span", class_=lambda x: x and "badge" in x and "bg-primary" in x)
+        if badge:
+            match = re.search(r"([\d\.]+)\s*SCASH", badge.get_text(strip=True))
+            if match:
+                amount = float(match.group(1))
+        a = li.find("a", href=re.compile(r"^/tx/"))
+        items.append((first, amount, a.get_text(strip=True) if a else None))
+    return time_str, total, items
+
+
+def legacy_tx(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    total = None
+    outputs = []
+    label = soup.find("div", class_="fw-bold", string=re.compile(r"Total outputs"))
+    parent_li = label.find_parent("li") if label else None
+    amount_div = parent_li.find("div", class_="ms-2 me-auto") if parent_li else None
+    if amount_div:
+        match = re.search(r"([\d'\.]+)\s*SCASH", amount_div.get_text(separator=" ", strip=True))
+        if match:
+            total = float(match.group(1).replace("'", ""))
+    for item in soup.find_all("li", class_="list-group-item"):
+        addr_a = item.find("a", href=re.compile(r"^/\?&search=scash1"))
+        if not addr_a:
+            continue
+        address = re.search(r"search=(scash1[0-9a-zA-Z]+)", addr_a['href'])
+        full_address = address.group(1) if address else addr_a.get_text(strip=True)
+        amount_span = item.find("span", class_="text-muted")
+        if amount_span:
+            match = re.search(r"([\d'\.]+)\s*SCASH", amount_span.get_text(strip=True))
+            if match:
+                outputs.append((full_address, float(match.group(1).replace("'", ""))))
+    return total, outputs
+
+
+def legacy_address(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    total_div = soup.find("div", class_="totalamount")
+    match = re.search(r"Total unspent SCASH:\s*([\d\.]+)", total_div.get_text()) if total_div else None
+    return float(match.group(1)) if match else None
+
+
+def fast_block(text):
+    page = parse_block_page(text)
+    return page.time_str, page.total_amount, page.items
+
+
+def fast_tx(text):
+    page = parse_tx_page(text)
+    return page.total_outputs, page.outputs
+
+
+def fast_address(text):
+    return parse_address_page(text).balance
+
+
+KINDS = {
+    'block': (legacy_block, fast_block),
+    'tx': (legacy_tx, fast_tx),
+    'address': (legacy_address, fast_address),
+}
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return 1
+    folder = sys.argv[1]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    failed = 0
+    for kind, (legacy, fast) in KINDS.items():
+        files = sorted(glob.glob(os.path.join(folder, f'{kind}_*.html')))
+        if not files:
+            continue
+        pages = []
+        for path in files:
+            with open(path, encoding='utf-8') as f:
+                pages.append((path, f.read()))
+        for path, text in pages:
+            if legacy(text) != fast(text):
+                failed += 1
+                print(f"結果不一致: {path}")
+        timings = []
+        for func in (legacy, fast):
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                for _, text in pages:
+                    func(text)
+            timings.append((time.perf_counter() - t0) / (repeat * len(pages)) * 1000)
+        print(f"{kind:8s} {len(pages):5d} 頁  BeautifulSoup {timings[0]:8.3f} ms/頁  "
+              f"html_extract {timings[1]:8.3f} ms/頁  ({timings[0] / timings[1]:.1f}x)")
+    print("全部一致" if not failed else f"{failed} 頁結果不一致")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
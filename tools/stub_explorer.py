@@ -0,0 +1,253 @@
+"""
+本機測試用的區塊鏈瀏覽器替身，回傳與 scash.one 相同結構的區塊、交易與地址餘額頁。
+
+用法：
+    python tools/stub_explorer.py [--port 8765] [--blocks 500 | --cache page_cache.db]
+                                  [--latency 50] [--jitter 20] [--error-rate 0.01] [--rate-limit 20]
+
+- 預設依 --seed 產生 --blocks 個假區塊（內容固定，可重現），頁面在請求時才產生，大型鏈也不佔記憶體
+- 指定 --cache 時改為回放 PAGE_CACHE_FILE 中錄下的真實頁面（地址餘額頁不快取，仍以假資料回應）
+- --latency / --jitter 為每個回應的延遲毫秒數，--error-rate 為回傳 HTTP 503 的比例，
+  --rate-limit 為每秒可處理的請求數，超過時回傳 HTTP 429（Retry-After: 1）
+將 config.py 的 BASE_URL 設為 http://127.0.0.1:<port> 即可完全離線掃描；tools/benchmark.py 也使用此伺服器。
+"""
+import argparse
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+BLOCK_TIME = 120         # 假區塊的間隔秒數
+GENESIS_TIME = 1714521600
+NOT_FOUND_PAGE = '<html><body><div class="alert">Nothing found</div></body></html>'
+
+_BLOCK_RE = re.compile(r'^/\?search=(\d+)$')
+_TX_RE = re.compile(r'^/tx/([0-9a-f]{64})$')
+_ADDRESS_RE = re.compile(r'search=(scash1[0-9a-zA-Z]+)')
+
+
+def _item(index, txid, amount):
+    return (f'<li class="list-group-item"><div class="text-truncate">{index}. '
+            f'<a href="/tx/{txid}">{txid}</a></div>'
+            f'<span class="badge bg-primary rounded-pill">{amount:.8f} SCASH</span></li>')
+
+
+def _field(label, value):
+    return (f'<li class="list-group-item"><div class="ms-2 me-auto">'
+            f'<div class="fw-bold">{label}</div>{value}</div></li>')
+
+
+def block_html(block_hash, time_str, txs):
+    """txs 為 [(txid, 金額)]，第一筆為 coinbase。"""
+    total = sum(amount for _, amount in txs)
+    total_str = f"{total:,.8f}".replace(',', "'")
+    return ('<html><body><ul class="list-group">'
+            + _field('Hash', block_hash) + _field('Time', time_str)
+            + _field('Total amount in all outputs', f'{total_str} SCASH')
+            + '</ul><ul class="list-group">'
+            + ''.join(_item(i + 1, txid, amount) for i, (txid, amount) in enumerate(txs))
+            + '</ul></body></html>')
+
+
+def tx_html(outputs):
+    """outputs 為 [(地址, 金額)]。"""
+    total = sum(amount for _, amount in outputs)
+    rows = ''.join(f'<li class="list-group-item"><a href="/?&search={address}">{address[:12]}...</a> '
+                   f'<span class="text-muted">{amount:.8f} SCASH</span></li>'
+                   for address, amount in outputs)
+    return ('<html><body><ul class="list-group">' + _field('Total outputs', f'{total:.8f} SCASH')
+            + '</ul><ul class="list-group">' + rows + '</ul></body></html>')
+
+
+def address_html(balance):
+    return f'<html><body><div class="totalamount">Total unspent SCASH: {balance:.8f}</div></body></html>'
+
+
+class GeneratedChain:
+    """以固定亂數種子產生的假鏈；txid 內含高度與序號，交易頁可直接還原，不需事先產生。"""
+
+    def __init__(self, blocks, seed=1, addresses=None):
+        self.tip = blocks
+        self.seed = seed
+        self.addresses = addresses or max(50, blocks // 2)
+
+    def _rnd(self, *key):
+        return random.Random(':'.join(map(str, (self.seed,) + key)))
+
+    def address(self, n):
+        return f"scash1q{hashlib.sha256(f'{self.seed}:addr:{n}'.encode()).hexdigest()[:38]}"
+
+    def txid(self, height, index):
+        filler = hashlib.sha256(f'{self.seed}:{height}:{index}'.encode()).hexdigest()[:40]
+        return f'{height:016x}{index:08x}{filler}'
+
+    def tx_outputs(self, height, index):
+        if index == 0:
+            return [(self.address(height % 7), 50.0)]  # coinbase
+        rnd = self._rnd('tx', height, index)
+        return [(self.address(rnd.randrange(self.addresses)), round(rnd.uniform(0, 3000), 8))
+                for _ in range(rnd.randint(1, 3))]
+
+    def block_txs(self, height):
+        count = self._rnd('block', height).randint(1, 5)
+        return [(self.txid(height, i), round(sum(a for _, a in self.tx_outputs(height, i)), 8))
+                for i in range(count)]
+
+    def block_page(self, height):
+        if not 1 <= height <= self.tip:
+            return None
+        block_hash = hashlib.sha256(f'{self.seed}:block:{height}'.encode()).hexdigest()
+        time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(GENESIS_TIME + height * BLOCK_TIME))
+        return block_html(block_hash, time_str, self.block_txs(height))
+
+    def tx_page(self, txid):
+        height, index = int(txid[:16], 16), int(txid[16:24], 16)
+        if txid != self.txid(height, index) or not 1 <= height <= self.tip:
+            return None
+        return tx_html(self.tx_outputs(height, index))
+
+    def balance(self, address):
+        return self._rnd('balance', address).uniform(0, 100000)
+
+
+class RecordedPages:
+    """回放 PAGE_CACHE_FILE 中的頁面（依路徑比對，不限原本的主機）。"""
+
+    def __init__(self, path):
+        conn = sqlite3.connect(path)
+        self.pages = {}
+        for url, body in conn.execute('SELECT url, body FROM pages'):
+            parts = urlsplit(url)
+            self.pages[parts.path + ('?' + parts.query if parts.query else '')] = body
+        conn.close()
+        heights = [int(m.group(1)) for m in map(_BLOCK_RE.match, self.pages) if m]
+        self.tip = max(heights, default=0)
+
+    def _get(self, path):
+        body = self.pages.get(path)
+        return zlib.decompress(body).decode('utf-8') if body is not None else None
+
+    def block_page(self, height):
+        return self._get(f'/?search={height}')
+
+    def tx_page(self, txid):
+        return self._get(f'/tx/{txid}')
+
+    def balance(self, address):
+        return random.Random(address).uniform(0, 100000)
+
+
+class StubExplorer:
+    """頁面來源加上延遲、錯誤與限流的注入設定，並統計各類請求數。"""
+
+    def __init__(self, pages, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0.0, seed=1):
+        self.pages = pages
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = rate_limit
+        self.last_refill = time.monotonic()
+        self.counts = {}
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _admit(self):
+        """回傳 None 表示正常處理，否則為要回傳的錯誤狀態碼。"""
+        with self.lock:
+            if self.error_rate and self.rnd.random() < self.error_rate:
+                return 503
+            if self.rate_limit:
+                now = time.monotonic()
+                self.tokens = min(self.rate_limit, self.tokens + (now - self.last_refill) * self.rate_limit)
+                self.last_refill = now
+                if self.tokens < 1:
+                    return 429
+                self.tokens -= 1
+        return None
+
+    def respond(self, path):
+        """回傳 (狀態碼, 內容)。"""
+        status = self._admit()
+        delay = self.latency + (self.rnd.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if status is not None:
+            self._count(status)
+            return status, ''
+        m = _BLOCK_RE.match(path)
+        if m:
+            self._count('block')
+            return 200, self.pages.block_page(int(m.group(1))) or NOT_FOUND_PAGE
+        m = _TX_RE.match(path)
+        if m:
+            self._count('tx')
+            body = self.pages.tx_page(m.group(1))
+            return (200, body) if body is not None else (404, NOT_FOUND_PAGE)
+        m = _ADDRESS_RE.search(path)
+        if m and 'utxolookup' in path:
+            self._count('address')
+            return 200, address_html(self.pages.balance(m.group(1)))
+        self._count(404)
+        return 404, NOT_FOUND_PAGE
+
+
+def make_server(explorer, host='127.0.0.1', port=0):
+    """建立（未啟動的）HTTP 伺服器；port 為 0 時由系統指派，實際埠號見 server.server_address。"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支援 keep-alive，與真實瀏覽器的連線行為一致
+        disable_nagle_algorithm = True  # 標頭與內容分開送出時避免 Nagle + 延遲 ACK 造成每個請求多等 40ms
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            status, body = explorer.respond(self.path)
+            data = body.encode('utf-8')
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', '1')
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--blocks', type=int, default=500, help='產生的假區塊數（鏈高度）')
+    parser.add_argument('--seed', type=int, default=1, help='假資料的亂數種子')
+    parser.add_argument('--cache', help='改為回放此頁面快取檔（PAGE_CACHE_FILE）中的頁面')
+    parser.add_argument('--latency', type=float, default=0, help='每個回應的延遲毫秒數')
+    parser.add_argument('--jitter', type=float, default=0, help='延遲的隨機變動範圍（±毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='回傳 HTTP 503 的比例（0~1）')
+    parser.add_argument('--rate-limit', type=float, default=0, help='每秒可處理的請求數，超過時回傳 429（0 為不限）')
+    args = parser.parse_args()
+    pages = RecordedPages(args.cache) if args.cache else GeneratedChain(args.blocks, args.seed)
+    explorer = StubExplorer(pages, args.latency, args.jitter, args.error_rate, args.rate_limit, args.seed)
+    server = make_server(explorer, args.host, args.port)
+    print(f"替身瀏覽器已啟動: http://{args.host}:{args.port}（區塊 1 ~ {pages.tip}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"請求統計: {explorer.counts}")
+
+
+if __name__ == "__main__":
+    main()
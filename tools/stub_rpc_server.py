@@ -0,0 +1,124 @@
+"""
+本機測試用的 JSON-RPC 替身節點，回傳預先準備的區塊 JSON。
+
+用法：
+    python tools/stub_rpc_server.py [--port 18332] [--blocks blocks.json | --generate 200]
+
+blocks.json 為 getblock <hash> 2 結果的陣列（依高度排列，第一個為高度 0）；
+未指定時以 --generate 產生指定數量的假區塊。支援 getblockcount、getblockhash、
+getblock（verbosity 1/2）、getrawtransaction（verbose）與批次請求，
+將 config.py 的 DATA_SOURCE 設為 'rpc'、RPC_URL 指向此伺服器即可離線測試掃描。
+"""
+import argparse
+import hashlib
+import json
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def generate_blocks(count, seed=1):
+    rnd = random.Random(seed)
+    blocks = []
+    prev = '00' * 32
+    for height in range(count):
+        txs = []
+        for index in range(rnd.randint(1, 5)):
+            txid = hashlib.sha256(f"{height}:{index}".encode()).hexdigest()
+            if index == 0:
+                vout = [{'value': 50.0, 'n': 0,
+                         'scriptPubKey': {'address': f"scash1qminer{height % 7:033d}"}}]
+            else:
+                vout = [{'value': round(rnd.uniform(0, 2000), 8), 'n': n,
+                         'scriptPubKey': {'address': f"scash1q{rnd.randint(1, 60):038d}"}}
+                        for n in range(rnd.randint(1, 3))]
+            txs.append({'txid': txid, 'vout': vout})
+        block_hash = hashlib.sha256(f"block:{height}:{prev}".encode()).hexdigest()
+        blocks.append({'hash': block_hash, 'height': height, 'previousblockhash': prev,
+                       'time': 1700000000 + height * 600, 'tx': txs})
+        prev = block_hash
+    return blocks
+
+
+class StubNode:
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.by_hash = {b['hash']: b for b in blocks}
+        self.txs = {tx['txid']: tx for b in blocks for tx in b['tx']}
+
+    def dispatch(self, method, params):
+        if method == 'getblockcount':
+            return len(self.blocks) - 1
+        if method == 'getbestblockhash':
+            return self.blocks[-1]['hash']
+        if method == 'getblockhash':
+            height = params[0]
+            if not 0 <= height < len(self.blocks):
+                raise LookupError(-8, 'Block height out of range')
+            return self.blocks[height]['hash']
+        if method == 'getblock':
+            block = self.by_hash.get(params[0])
+            if block is None:
+                raise LookupError(-5, 'Block not found')
+            verbosity = params[1] if len(params) > 1 else 1
+            if verbosity == 2:
+                return block
+            return dict(block, tx=[tx['txid'] for tx in block['tx']])
+        if method == 'getrawtransaction':
+            tx = self.txs.get(params[0])
+            if tx is None:
+                raise LookupError(-5, 'No such mempool or blockchain transaction')
+            return tx
+        raise LookupError(-32601, 'Method not found')
+
+    def handle(self, request):
+        try:
+            result = self.dispatch(request.get('method'), request.get('params') or [])
+            return {'result': result, 'error': None, 'id': request.get('id')}
+        except LookupError as e:
+            code, message = e.args
+            return {'result': None, 'error': {'code': code, 'message': message},
+                    'id': request.get('id')}
+
+
+def make_handler(node):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if isinstance(body, list):
+                reply = [node.handle(r) for r in body]
+            else:
+                reply = node.handle(body)
+            data = json.dumps(reply).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18332)
+    parser.add_argument('--blocks', help='getblock verbosity 2 結果的 JSON 陣列檔')
+    parser.add_argument('--generate', type=int, default=200, help='未指定 --blocks 時產生的區塊數')
+    args = parser.parse_args()
+    if args.blocks:
+        with open(args.blocks, encoding='utf-8') as f:
+            blocks = json.load(f)
+    else:
+        blocks = generate_blocks(args.generate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StubNode(blocks)))
+    print(f"替身節點已啟動: http://{args.host}:{args.port}（區塊 0 ~ {len(blocks) - 1}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()